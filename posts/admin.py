@@ -1,5 +1,24 @@
-from django.contrib import admin
-from . import models
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
+from django.db.models.expressions import RawSQL
+
+from . import models, search, sharding
+
+
+class ShardFilter(admin.SimpleListFilter):
+    """Фильтр «шард»: список постов админки - запрос к одной базе, по
+    умолчанию к основной"""
+
+    title = 'шард'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in sharding.shards()[1:]]
+
+    def queryset(self, request, queryset):
+        if self.value() in sharding.shards():
+            return queryset.using(self.value())
+        return queryset
 
 
 @admin.register(models.Post)
@@ -12,9 +31,11 @@ class PostAdmin(admin.ModelAdmin):
     list_display :
         перечисляем поля, которые должны отображаться в админке
     search_fields :
-        добавляем интерфейс для поиска по тексту постов
+        добавляем интерфейс для поиска по тексту постов; в SQLite поиск
+        идет по полнотекстовому индексу posts.search
     list_filter :
-        добавляем возможность фильтрации по дате
+        добавляем возможность фильтрации по дате, а при нескольких
+        шардах - выбор шарда
     empty_value_display :
         это свойство сработает для всех колонок: где пусто -
         там будет эта строка"""
@@ -24,6 +45,50 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
 
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        if sharding.enabled():
+            list_filter = (*list_filter, ShardFilter)
+        return list_filter
+
+    def get_search_results(self, request, queryset, search_term):
+        expression = search.match_expression(search_term)
+        if not expression or not search.available():
+            return super().get_search_results(
+                request, queryset, search_term)
+        queryset = queryset.filter(
+            pk__in=RawSQL(search.matching_ids_sql(), (expression,)))
+        if sharding.enabled():
+            self.report_other_shards(request, queryset)
+        return queryset, False
+
+    def report_other_shards(self, request, queryset):
+        """Сообщает, сколько постов нашлось в шардах, кроме открытого"""
+        others = [queryset.using(alias) for alias in sharding.shards()
+                  if alias != queryset.db]
+        counts = sharding.gather(others, lambda other: other.count())
+        found = ', '.join(f'{other.db} - {count}' for other, count in zip(
+            others, counts) if count)
+        if found:
+            self.message_user(
+                request, f'Найдено в других шардах: {found}. Выберите шард '
+                'в фильтре, чтобы увидеть эти посты.', messages.INFO)
+
+    def get_object(self, request, object_id, from_field=None):
+        # id постов уникальны во всех шардах
+        obj = super().get_object(request, object_id, from_field)
+        if obj is not None or from_field is not None:
+            return obj
+        for alias in sharding.shards()[1:]:
+            try:
+                obj = self.get_queryset(request).using(alias).filter(
+                    pk=object_id).first()
+            except (ValidationError, ValueError):
+                return None
+            if obj is not None:
+                return obj
+        return None
+
 
 @admin.register(models.Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class PostsConfig(AppConfig):
-    name = 'posts'()
+    name = 'posts'
     verbose_name = 'Посты'
+
+    def ready(self):
+        # подключаем обработчики сигналов моделей
+        from . import signals  # noqa: F401
+        from .sqlite import configure_connection
+        connection_created.connect(configure_connection)
@@ -0,0 +1,175 @@
+import math
+import statistics
+import time
+from contextlib import contextmanager
+from importlib import import_module
+
+from django.core.cache import cache
+from django.template.base import Template
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from . import fragments
+from .query_budget import record_queries
+
+# Модули маршрутов, которые обходит бенчмарк, и их пространства имен.
+URL_MODULES = (
+    ('posts.urls', None),
+    ('users.urls', None),
+    ('about.urls', 'about'),
+)
+
+METRICS = ('p50', 'p95', 'p99')
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга"""
+    ordered = sorted(values)
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+class RenderTimer:
+    """Время рендеринга шаблонов: учитываются только внешние вызовы
+    Template.render, вложенные include входят в них"""
+
+    def __init__(self):
+        self.duration = 0.0
+        self._depth = 0
+
+    @contextmanager
+    def record(self):
+        original = Template.render
+        timer = self
+
+        def render(template, context):
+            if timer._depth:
+                return original(template, context)
+            timer._depth += 1
+            start = time.perf_counter()
+            try:
+                return original(template, context)
+            finally:
+                timer._depth -= 1
+                timer.duration += time.perf_counter() - start
+
+        Template.render = render
+        try:
+            yield self
+        finally:
+            Template.render = original
+
+
+def routes(samples):
+    """Пары (имя маршрута, URL) для всех именованных маршрутов модулей
+    URL_MODULES. Параметры маршрутов берутся из словаря samples."""
+    result = []
+    for module_name, namespace in URL_MODULES:
+        for pattern in import_module(module_name).urlpatterns:
+            if not pattern.name:
+                continue
+            name = f'{namespace}:{pattern.name}' if namespace \
+                else pattern.name
+            kwargs = {key: samples[key] for key in pattern.pattern.converters}
+            result.append((name, reverse(name, kwargs=kwargs)))
+    return result
+
+
+def measure(client, url, cold=False):
+    """Один запрос к url: время ответа, число запросов к базе, время
+    в базе и время рендеринга шаблонов в секундах"""
+    if cold:
+        cache.clear()
+    with record_queries() as queries, RenderTimer().record() as render:
+        start = time.perf_counter()
+        response = client.get(url)
+        duration = time.perf_counter() - start
+    return {
+        'status': response.status_code,
+        'latency': duration,
+        'queries': queries.count,
+        'db_time': queries.duration,
+        'render_time': render.duration,
+    }
+
+
+def run(client, route_list, repeat, warmup=0, cold=False):
+    """Замеряет каждый маршрут repeat раз после warmup прогревочных
+    запросов и возвращает сводку в миллисекундах по имени маршрута"""
+    results = {}
+    for name, url in route_list:
+        for _ in range(warmup):
+            measure(client, url, cold)
+        samples = [measure(client, url, cold) for _ in range(repeat)]
+        latencies = [sample['latency'] * 1000 for sample in samples]
+        results[name] = {
+            'url': url,
+            'status': samples[-1]['status'],
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'queries': max(sample['queries'] for sample in samples),
+            'db_time': round(statistics.median(
+                sample['db_time'] * 1000 for sample in samples), 3),
+            'render_time': round(statistics.median(
+                sample['render_time'] * 1000 for sample in samples), 3),
+        }
+    return results
+
+
+def compare(results, baseline, threshold, metric='p95', min_delta=1.0):
+    """Список регрессий относительно baseline: метрика metric выросла
+    больше чем в (1 + threshold) раз и не меньше чем на min_delta мс или
+    выросло число запросов"""
+    problems = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        limit = max(previous[metric] * (1 + threshold),
+                    previous[metric] + min_delta)
+        if current[metric] > limit:
+            problems.append(
+                f'{name}: {metric} {current[metric]:.1f} мс, '
+                f'в базовом замере {previous[metric]:.1f} мс')
+        if current['queries'] > previous['queries']:
+            problems.append(
+                f'{name}: {current["queries"]} запросов, '
+                f'в базовом замере {previous["queries"]}')
+    return problems
+
+
+def _render_cards_one_by_one(posts):
+    # как карточки рендерились раньше: поиск шаблона и три reverse()
+    # на каждый пост
+    for post in posts:
+        group = post.group
+        urls = {
+            'profile': reverse('profile', args=[post.author.username]),
+            'group': reverse('group_posts', args=[group.slug])
+            if group else '',
+            'post': reverse('post', args=[post.author.username, post.pk]),
+        }
+        render_to_string(
+            fragments.CARD_TEMPLATE, {'post': post, 'urls': urls})
+
+
+CARD_RENDERERS = (
+    ('before', _render_cards_one_by_one),
+    ('after', fragments.render_cards),
+)
+
+
+def card_render_time(posts, repeat):
+    """Медианное время рендеринга одной карточки в микросекундах:
+    по отдельности (before) и всей страницей render_cards (after)"""
+    results = {}
+    for name, render in CARD_RENDERERS:
+        render(posts)
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            render(posts)
+            samples.append((time.perf_counter() - start) / len(posts))
+        results[name] = round(statistics.median(samples) * 10 ** 6, 1)
+    return results
@@ -0,0 +1,130 @@
+"""Условные GET-запросы (If-None-Match/If-Modified-Since) для лент и
+страницы поста.
+
+Валидаторы дешевле страницы: у лент это поколения данных из кеша, у
+поста - один запрос с полями карточки и временем последнего
+комментария."""
+import hashlib
+import math
+import time
+from functools import wraps
+
+from django.db.models import Max
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from . import feed_cache, page_cache, thumbnails
+from .fragments import PENDING_MARKER
+from .models import Post
+from .natural_keys import groups, users
+
+# Last-Modified с точностью до секунды: более свежие изменения
+# заголовком не описываются, чтобы правка в ту же секунду не дала 304
+MODIFIED_RESOLUTION = 1
+
+
+def _etag(request, *parts):
+    # страница зависит и от пользователя: меню, кнопки, форма комментария
+    user = request.user
+    parts = (*parts, user.pk if user.is_authenticated else None)
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def _modified(request, timestamp):
+    # If-Modified-Since не отличает пользователей, поэтому Last-Modified
+    # есть только у страниц для гостей
+    if (timestamp is None or request.user.is_authenticated
+            or time.time() - timestamp < MODIFIED_RESOLUTION):
+        return None
+    return math.ceil(timestamp)
+
+
+def _pending(response):
+    return not response.streaming and PENDING_MARKER.encode() in (
+        response.content)
+
+
+def conditional(etag_func, last_modified_func=None):
+    """Как django.views.decorators.http.condition, но функции получают
+    request и аргументы представления и возвращают готовые ETag и
+    timestamp. Страница берется из кеша страниц (page_cache.respond)
+    только после проверки валидаторов. Страницы с заглушкой миниатюры не
+    получают валидаторов: готовая миниатюра не меняет поколения данных."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            etag = etag_func(request, *args, **kwargs)
+            last_modified = None
+            if last_modified_func is not None:
+                last_modified = last_modified_func(request, *args, **kwargs)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = page_cache.respond(request, view, args, kwargs)
+                if response.status_code != 200 or _pending(response):
+                    return response
+            if etag is not None:
+                response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            return response
+        # PageCacheMiddleware оставляет кеш страниц этой обертке
+        wrapper.conditional = True
+        return wrapper
+    return decorator
+
+
+def feed_etag(request, *args, **kwargs):
+    return _etag(request, page_cache.version())
+
+
+def feed_last_modified(request, *args, **kwargs):
+    return _modified(request, feed_cache.last_modified())
+
+
+def _post_state(request, username, post_id):
+    """Поля карточки поста и время последнего комментария одним
+    запросом к шарду автора, группа - из кеша; результат запоминается
+    на время запроса"""
+    if not hasattr(request, '_post_state'):
+        author = users.get(username)
+        state = None
+        if author is not None:
+            state = Post.objects.for_author(author).filter(
+                pk=post_id).annotate(
+                last_comment=Max('comments__created')).values_list(
+                'pub_date', 'last_comment', 'text', 'image',
+                'comment_count', 'group_id').first()
+        if state is not None and state[-1] is not None:
+            group = groups.get_by_pk(state[-1])
+            state += (group.slug, group.title) if group else ()
+        request._post_state = state
+    return request._post_state
+
+
+def post_etag(request, username, post_id):
+    state = _post_state(request, username, post_id)
+    if state is None:
+        return None
+    image = state[3]
+    # готовая миниатюра заменяет заглушку на странице
+    thumbnail = bool(image) and thumbnails.lookup(image) is not None
+    return _etag(request, state, thumbnail)
+
+
+def post_last_modified(request, username, post_id):
+    """Время последнего изменения данных лент, не раньше публикации поста
+    и его последнего комментария.
+
+    Своего времени изменения у поста нет, а правки, удаление комментариев
+    и переименование группы меняют поколение данных и вместе с ним
+    feed_cache.last_modified(). Поэтому заголовок может устареть из-за
+    чужого поста, но не пропустит изменение этого."""
+    state = _post_state(request, username, post_id)
+    if state is None:
+        return None
+    pub_date, last_comment = state[:2]
+    latest = max(pub_date, last_comment or pub_date).timestamp()
+    return _modified(request, max(latest, feed_cache.last_modified()))
@@ -0,0 +1,85 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import sharding
+from .models import AuthorStats, Comment, Follow, Post
+
+BATCH_SIZE = 500
+
+
+def change_comment_count(post_id, delta, using=DEFAULT_DB_ALIAS):
+    """Атомарно меняет счетчик комментариев поста на delta в базе
+    using - шарде поста"""
+    posts = Post.objects.using(using).filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comment_count__gte=-delta)
+    posts.update(comment_count=F('comment_count') + delta)
+
+
+def rebuild_comment_counts():
+    """Пересчитывает comment_count всех постов одним UPDATE в каждом
+    шарде: комментарии лежат в шарде своего поста"""
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by()
+    count = comments.values('post').annotate(total=Count('pk'))
+    return sum(posts.update(comment_count=Coalesce(
+        Subquery(count.values('total')[:1]), 0))
+        for posts in sharding.per_shard(Post.objects.all()))
+
+
+def change_author_stat(author_id, field, delta):
+    """Атомарно меняет счетчик field в AuthorStats автора на delta"""
+    stats = AuthorStats.objects.filter(author_id=author_id)
+    change = {field: F(field) + delta}
+    if delta < 0:
+        # строки нет - уменьшать нечего; не создаем ее, чтобы не вернуть
+        # статистику пользователя, удаляемого каскадом вместе с постами
+        stats.filter(**{f'{field}__gte': -delta}).update(**change)
+    elif not stats.update(**change):
+        AuthorStats.objects.bulk_create(
+            [AuthorStats(author_id=author_id)], ignore_conflicts=True)
+        stats.update(**change)
+
+
+def _count(queryset, field):
+    rows = queryset.filter(**{field: OuterRef('pk')}).order_by()
+    count = rows.values(field).annotate(total=Count('pk'))
+    return Coalesce(Subquery(count.values('total')[:1]), 0)
+
+
+def _sharded_post_counts():
+    """Число постов каждого автора по всем шардам"""
+    posts = Post.objects.order_by().values_list('author').annotate(
+        total=Count('pk'))
+    counts = Counter()
+    for rows in sharding.gather(sharding.per_shard(posts), list):
+        for author_id, total in rows:
+            counts[author_id] += total
+    return counts
+
+
+def rebuild_author_stats():
+    """Пересчитывает AuthorStats всех пользователей.
+
+    С одним шардом все счетчики считает один UPDATE, с несколькими
+    посты считаются в каждом шарде и записываются пакетами."""
+    user_ids = get_user_model().objects.values_list('pk', flat=True)
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(author_id=pk) for pk in user_ids.iterator()),
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+    follows = {
+        'follower_count': _count(Follow.objects, 'author'),
+        'following_count': _count(Follow.objects, 'user'),
+    }
+    if not sharding.enabled():
+        return AuthorStats.objects.update(
+            post_count=_count(Post.objects, 'author'), **follows)
+    updated = AuthorStats.objects.update(post_count=0, **follows)
+    AuthorStats.objects.bulk_update(
+        [AuthorStats(author_id=author_id, post_count=total)
+         for author_id, total in _sharded_post_counts().items()],
+        ['post_count'], batch_size=BATCH_SIZE)
+    return updated
@@ -0,0 +1,172 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import transaction
+
+from . import replicas, stale_cache
+from .pagination import CursorPage, page_key, paginate
+
+# поколение всех данных лент (посты и комментарии), отдельно - набора
+# постов, от которого зависят только счетчики записей, и подписок, от
+# которых зависят счетчики в профилях
+FEED_GENERATION = 'feed:generation'
+POSTS_GENERATION = 'posts:generation'
+FOLLOW_GENERATION = 'follow:generation'
+GENERATIONS = (FEED_GENERATION, POSTS_GENERATION, FOLLOW_GENERATION)
+# время последней смены любого поколения, для заголовка Last-Modified
+MODIFIED = 'feed:modified'
+# поколения и время изменения, с которыми снята копия реплики
+REPLICA_SNAPSHOT = 'replica:snapshot'
+
+
+def timeout():
+    # записи не устаревают по времени: любое изменение постов или
+    # комментариев меняет поколение, и запись с прежним поколением больше
+    # не отдается
+    return getattr(settings, 'FEED_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def generation(key=FEED_GENERATION):
+    """Текущее поколение данных лент, а для чтения с реплики - поколение,
+    с которым снята ее копия"""
+    if replicas.read_alias() == replicas.REPLICA:
+        return _replica_snapshot()[0][key]
+    return _generation(key)
+
+
+def _generation(key):
+    value = cache.get(key)
+    if value is None:
+        # после вытеснения ключа начинаем с текущего времени в мкс, чтобы
+        # новое поколение не совпало ни с одним из уже использованных
+        cache.add(key, int(time.time() * 1000000), None)
+        value = cache.get(key)
+    return value
+
+
+def bump_generation(key=FEED_GENERATION):
+    try:
+        cache.incr(key)
+    except ValueError:
+        _generation(key)
+    cache.set(MODIFIED, time.time(), None)
+
+
+def last_modified():
+    """Время последнего изменения данных лент или подписок (timestamp).
+
+    Если оно вытеснено из кеша, изменением считается текущий момент."""
+    if replicas.read_alias() == replicas.REPLICA:
+        return _replica_snapshot()[1]
+    value = cache.get(MODIFIED)
+    if value is None:
+        cache.add(MODIFIED, time.time(), None)
+        value = cache.get(MODIFIED)
+    return value
+
+
+def _replica_snapshot():
+    state = cache.get(REPLICA_SNAPSHOT)
+    if state is None:
+        # состояние копии неизвестно: новые поколения, как в generation(),
+        # не совпадут ни с одним поколением в кеше
+        now = time.time()
+        cache.add(REPLICA_SNAPSHOT, (
+            dict.fromkeys(GENERATIONS, int(now * 1000000)), now), None)
+        state = cache.get(REPLICA_SNAPSHOT)
+    return state
+
+
+def snapshot_state():
+    """Поколения и время изменения основной базы. snapshot_replica
+    запоминает их до копирования: запись, закоммиченная во время
+    копирования, сменит поколение уже после этого."""
+    return {key: _generation(key) for key in GENERATIONS}, last_modified()
+
+
+def set_replica_snapshot(state):
+    """Отмечает, что реплика содержит данные состояния state: ее кеши
+    пересчитываются только для поколений, изменившихся с прошлой копии"""
+    cache.set(REPLICA_SNAPSHOT, state, None)
+
+
+def _bump(keys):
+    for key in keys:
+        bump_generation(key)
+
+
+def invalidate(posts_changed=False):
+    """Сбрасывает кеш всех лент, а при posts_changed - и счетчики записей.
+
+    Поколение меняется сразу и еще раз после коммита транзакции: иначе
+    запрос, прочитавший данные до коммита, мог бы сохранить их под новым
+    поколением."""
+    keys = (FEED_GENERATION, POSTS_GENERATION)
+    if not posts_changed:
+        keys = keys[:1]
+    _invalidate(keys)
+
+
+def invalidate_follows():
+    """Сбрасывает страницы, показывающие подписки и их счетчики"""
+    _invalidate((FOLLOW_GENERATION,))
+
+
+def _invalidate(keys):
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def count(feed, queryset):
+    """Количество записей в ленте feed, посчитанное один раз на поколение
+    набора постов"""
+    return stale_cache.get_or_set(
+        'feed_count:%s:%s' % (feed, replicas.read_alias()), queryset.count,
+        hard_ttl=timeout(), version=generation(POSTS_GENERATION))
+
+
+def make_key(feed, key, alias):
+    """Ключ страницы ленты: номер страницы или позиция курсора key после
+    разбора параметров (page_key), а не сами параметры. Иначе любое новое
+    значение ?page= или ?cursor= создавало бы запись в кеше на сутки.
+
+    База чтения alias входит в ключ: реплика отстает от основной базы, и
+    ее страницы не должны вытеснять страницы основной базы."""
+    digest = hashlib.md5(repr(key).encode()).hexdigest()
+    return 'feed:%s:%s:%s' % (feed, alias, digest)
+
+
+def _snapshot(page):
+    page.object_list = list(page.object_list)
+    if isinstance(page, CursorPage):
+        return page
+    return (page.object_list, page.number,
+            page.paginator.count, page.paginator.per_page)
+
+
+def _restore(snapshot):
+    if isinstance(snapshot, CursorPage):
+        return snapshot
+    object_list, number, count, per_page = snapshot
+    paginator = Paginator(object_list, per_page)
+    # количество записей уже известно, COUNT(*) не нужен
+    paginator.count = count
+    return Page(object_list, number, paginator)
+
+
+def get_page(feed, request, queryset, **kwargs):
+    """Страница ленты feed из кеша по ключу (лента, база чтения, страница)
+    и версии - поколению данных.
+
+    Если страницы нужного поколения в кеше нет, ее строит через paginate
+    один запрос, остальные ждут его результат. Разобранная страница
+    запоминается в request.page_key для кеша страниц."""
+    kwargs.setdefault('count', lambda: count(feed, queryset))
+    request.page_key = page_key(request, kwargs['count'])
+    return _restore(stale_cache.get_or_set(
+        make_key(feed, request.page_key, replicas.read_alias()),
+        lambda: _snapshot(paginate(request, queryset, **kwargs)),
+        hard_ttl=timeout(), version=generation()))
@@ -0,0 +1,55 @@
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow
+
+# id авторов хранятся отсортированным массивом 64-битных чисел:
+# 8 байт на подписку в кеше, проверка подписки - двоичный поиск
+TYPECODE = 'q'
+
+
+def timeout():
+    return getattr(settings, 'FOLLOWING_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def cache_key(user_id):
+    return 'following:%s' % user_id
+
+
+def _stamp(user):
+    # id может достаться новому пользователю после удаления старого или
+    # отката транзакции, date_joined отличает их записи в кеше
+    return user.date_joined.timestamp()
+
+
+def following_ids(user):
+    """Отсортированный массив id авторов, на которых подписан user"""
+    if not user.is_authenticated:
+        return array(TYPECODE)
+    cached = cache.get(cache_key(user.pk))
+    if cached is not None and cached[0] == _stamp(user):
+        ids = array(TYPECODE)
+        ids.frombytes(cached[1])
+        return ids
+    ids = array(TYPECODE, sorted(set(Follow.objects.filter(
+        user=user).values_list('author_id', flat=True))))
+    cache.set(cache_key(user.pk), (_stamp(user), ids.tobytes()), timeout())
+    return ids
+
+
+def is_following(user, author_id):
+    ids = following_ids(user)
+    index = bisect_left(ids, author_id)
+    return index < len(ids) and ids[index] == author_id
+
+
+def invalidate(user_id):
+    """Сбрасывает набор подписок сразу и еще раз после коммита, чтобы
+    параллельный запрос не закешировал данные до коммита"""
+    key = cache_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,137 @@
+import hashlib
+from functools import lru_cache
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template import Context, RequestContext
+from django.template.loader import get_template
+from django.urls import get_script_prefix, get_urlconf, reverse
+from django.utils.http import RFC3986_SUBDELIMS
+from django.utils.safestring import mark_safe
+
+CARD_TEMPLATE = 'include/post_card.html'
+ACTIONS_TEMPLATE = 'include/post_actions.html'
+# место в закешированной карточке для кнопок, зависящих от пользователя
+ACTIONS_MARKER = '<!--post-actions-->'
+# карточки с заглушкой вместо миниатюры не кешируются
+PENDING_MARKER = 'thumbnail-pending'
+
+
+def timeout():
+    return getattr(settings, 'POST_CARD_CACHE_TIMEOUT', 60 * 60 * 24 * 7)
+
+
+def card_version(post):
+    """Версия содержимого карточки: меняется вместе с любым полем,
+    которое выводит include/post_card.html"""
+    group = post.group
+    fields = (
+        post.text, post.pub_date.isoformat(), str(post.image),
+        post.comment_count, post.author.username,
+        group.slug if group else '', group.title if group else '',
+    )
+    return hashlib.md5(repr(fields).encode()).hexdigest()
+
+
+def card_key(post):
+    return 'post_card:%s:%s' % (post.pk, card_version(post))
+
+
+# метки аргументов в шаблонах адресов карточки
+_USERNAME = 'card-username'
+_SLUG = 'card-slug'
+_POST_ID = 987654321
+
+
+@lru_cache(maxsize=None)
+def _url_templates(prefix, urlconf):
+    # prefix и urlconf - часть ключа кеша: от них зависит результат
+    return {
+        'profile': reverse('profile', args=[_USERNAME], urlconf=urlconf),
+        'group': reverse('group_posts', args=[_SLUG], urlconf=urlconf),
+        'post': reverse(
+            'post', args=[_USERNAME, _POST_ID], urlconf=urlconf),
+    }
+
+
+def _quote(value):
+    # как reverse() экранирует значения аргументов
+    return quote(str(value), safe=RFC3986_SUBDELIMS + '/~:@')
+
+
+def card_urls(posts):
+    """Адреса профиля автора, группы и поста для каждой карточки.
+
+    reverse() вызывается по разу на маршрут и процесс, в готовые адреса
+    подставляются значения - вместо трех {% url %} на карточку."""
+    templates = _url_templates(get_script_prefix(), get_urlconf())
+    result = []
+    for post in posts:
+        username = _quote(post.author.username)
+        group = post.group
+        result.append({
+            'profile': templates['profile'].replace(_USERNAME, username),
+            'group': templates['group'].replace(
+                _SLUG, _quote(group.slug)) if group else '',
+            'post': templates['post'].replace(
+                str(_POST_ID), str(post.pk)).replace(_USERNAME, username),
+        })
+    return result
+
+
+def render_cards(posts):
+    """HTML карточек posts без кеша: шаблон загружается один раз на
+    вызов, а не на карточку, и все карточки рендерятся в одном
+    контексте"""
+    template = get_template(CARD_TEMPLATE).template
+    context = Context(autoescape=template.engine.autoescape)
+    result = []
+    for post, urls in zip(posts, card_urls(posts)):
+        with context.push(post=post, urls=urls):
+            result.append(template.render(context))
+    return result
+
+
+def render_actions(posts, request):
+    """HTML кнопок карточек posts для пользователя запроса.
+
+    Контекстные процессоры выполняются один раз на вызов, а не на
+    каждую карточку, как при render_to_string."""
+    if not posts:
+        return []
+    template = get_template(ACTIONS_TEMPLATE).template
+    context = RequestContext(request, autoescape=template.engine.autoescape)
+    result = []
+    with context.bind_template(template):
+        for post in posts:
+            with context.push(post=post):
+                result.append(template.render(context))
+    return result
+
+
+def attach_cards(posts, request):
+    """Прикрепляет к постам страницы готовый HTML карточек (post.card_html).
+
+    Карточки читаются одним cache.get_many, отсутствующие рендерятся и
+    записываются одним set_many. Кнопка «Редактировать» в кеш не попадает
+    и подставляется для постов текущего пользователя, а на страницах из
+    кеша целых страниц - меткой для каждого поста."""
+    user = request.user
+    holes = getattr(request, 'page_cache', False)
+    keys = {card_key(post): post for post in posts}
+    cached = cache.get_many(keys)
+    missing = {key: post for key, post in keys.items() if key not in cached}
+    for key, html in zip(missing, render_cards(missing.values())):
+        cached[key] = html
+    cache.set_many({key: cached[key] for key in missing
+                    if PENDING_MARKER not in cached[key]}, timeout())
+    with_actions = [
+        post for post in posts
+        if holes or user.is_authenticated and post.author_id == user.pk]
+    actions = dict(zip(
+        map(id, with_actions), render_actions(with_actions, request)))
+    for key, post in keys.items():
+        post.card_html = mark_safe(cached[key].replace(
+            ACTIONS_MARKER, actions.get(id(post), '')))
+    return posts
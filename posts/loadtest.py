@@ -0,0 +1,222 @@
+"""Генератор смешанной нагрузки для команды loadtest.
+
+Клиентская часть использует только стандартную библиотеку: рабочие
+процессы запускаются через spawn и не настраивают Django."""
+import http.client
+import math
+import random
+import socketserver
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from multiprocessing import get_context
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+# Доли операций по умолчанию: чтение лент и постов и запись постов,
+# комментариев и подписок.
+DEFAULT_MIX = {
+    'index': 45,
+    'follow_index': 20,
+    'post': 10,
+    'new_post': 5,
+    'add_comment': 15,
+    'profile_follow': 5,
+}
+
+
+def _index(targets, rng):
+    return 'GET', '/', None
+
+
+def _follow_index(targets, rng):
+    return 'GET', '/follow/', None
+
+
+def _post(targets, rng):
+    username, post_id = rng.choice(targets['posts'])
+    return 'GET', f'/{username}/{post_id}/', None
+
+
+def _new_post(targets, rng):
+    return 'POST', '/new/', {'text': f'Нагрузочный пост {rng.random()}'}
+
+
+def _add_comment(targets, rng):
+    username, post_id = rng.choice(targets['posts'])
+    return 'POST', f'/{username}/{post_id}/comment/', {'text': 'Нагрузка'}
+
+
+def _profile_follow(targets, rng):
+    return 'GET', f'/{rng.choice(targets["authors"])}/follow/', None
+
+
+def _profile_unfollow(targets, rng):
+    return 'GET', f'/{rng.choice(targets["authors"])}/unfollow/', None
+
+
+OPERATIONS = {
+    'index': _index,
+    'follow_index': _follow_index,
+    'post': _post,
+    'new_post': _new_post,
+    'add_comment': _add_comment,
+    'profile_follow': _profile_follow,
+    'profile_unfollow': _profile_unfollow,
+}
+
+
+def parse_mix(text):
+    """Разбирает смесь вида index=50,new_post=10 в словарь весов"""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f'Неизвестная операция {name}')
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError('Пустая смесь операций')
+    return mix
+
+
+class Session:
+    """HTTP-клиент одного пользователя: хранит cookies и берет
+    CSRF-токен со страницы новой записи перед первым POST"""
+
+    def __init__(self, address, cookies=None, timeout=30):
+        self.address = address
+        self.cookies = dict(cookies or {})
+        self.timeout = timeout
+
+    def request(self, method, path, data=None):
+        headers = {}
+        body = None
+        if method == 'POST':
+            if 'csrftoken' not in self.cookies:
+                self.request('GET', '/new/')
+            data = dict(data, csrfmiddlewaretoken=self.cookies.get(
+                'csrftoken', ''))
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(
+                f'{name}={value}' for name, value in self.cookies.items())
+        connection = http.client.HTTPConnection(
+            *self.address, timeout=self.timeout)
+        try:
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            response.read()
+        finally:
+            connection.close()
+        for header in response.msg.get_all('Set-Cookie') or ():
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return response.status
+
+
+def client_loop(address, cookies, targets, mix, deadline, max_requests,
+                seed):
+    """Цикл одного клиента до deadline (time.time()) или max_requests
+    запросов. Возвращает список (операция, статус, задержка в с)."""
+    rng = random.Random(seed)
+    session = Session(address, cookies)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    samples = []
+    while time.time() < deadline and len(samples) < max_requests:
+        name = rng.choices(names, weights)[0]
+        method, path, data = OPERATIONS[name](targets, rng)
+        start = time.perf_counter()
+        try:
+            status = session.request(method, path, data)
+        except OSError:
+            status = 0
+        samples.append((name, status, time.perf_counter() - start))
+    return samples
+
+
+def _run_threads(address, sessions, targets, mix, deadline, max_requests,
+                 seed):
+    with ThreadPoolExecutor(max_workers=max(len(sessions), 1)) as pool:
+        futures = [
+            pool.submit(client_loop, address, cookies, targets, mix,
+                        deadline, max_requests, seed + index)
+            for index, cookies in enumerate(sessions)
+        ]
+        return [sample for future in futures for sample in future.result()]
+
+
+def run_clients(address, sessions, targets, mix, duration,
+                max_requests=math.inf, processes=1, seed=0):
+    """Запускает по клиенту на каждый набор cookies из sessions: потоками
+    в текущем процессе или поровну в processes рабочих процессах"""
+    deadline = time.time() + duration
+    if processes <= 1:
+        return _run_threads(
+            address, sessions, targets, mix, deadline, max_requests, seed)
+    with ProcessPoolExecutor(
+            max_workers=processes, mp_context=get_context('spawn')) as pool:
+        futures = [
+            pool.submit(_run_threads, address, sessions[index::processes],
+                        targets, mix, deadline, max_requests,
+                        seed + index * len(sessions))
+            for index in range(processes)
+        ]
+        return [sample for future in futures for sample in future.result()]
+
+
+def _percentile(ordered, percent):
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+def summarize(samples, elapsed):
+    """Пропускная способность, перцентили задержки в мс и статусы ответов
+    по каждой операции и в целом"""
+    by_name = defaultdict(list)
+    for name, status, latency in samples:
+        by_name[name].append((status, latency))
+    by_name['total'] = [(status, latency) for _, status, latency in samples]
+    report = {}
+    for name, rows in sorted(by_name.items()):
+        latencies = sorted(latency * 1000 for _, latency in rows)
+        statuses = Counter(str(status) for status, _ in rows)
+        report[name] = {
+            'requests': len(rows),
+            'rps': round(len(rows) / elapsed, 2) if elapsed else 0,
+            'errors': sum(
+                1 for status, _ in rows if status == 0 or status >= 500),
+            'statuses': dict(sorted(statuses.items())),
+        }
+        if latencies:
+            report[name].update({
+                'p50': round(_percentile(latencies, 50), 3),
+                'p95': round(_percentile(latencies, 95), 3),
+                'p99': round(_percentile(latencies, 99), 3),
+            })
+    return report
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    # очередь соединений больше, чем число клиентов
+    request_queue_size = 128
+
+
+def serve(application, host='127.0.0.1', port=0):
+    """Запускает application в многопоточном wsgiref-сервере в фоновом
+    потоке. Возвращает сервер; адрес - server.server_address."""
+    server = ThreadingWSGIServer((host, port), QuietHandler)
+    server.set_app(application)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
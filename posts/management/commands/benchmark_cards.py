@@ -0,0 +1,29 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время рендеринга одной карточки поста: по '
+            'отдельности и всей страницей сразу')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, default=10,
+            help='Число карточек на странице')
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if options['posts'] < 1 or options['repeat'] < 1:
+            raise CommandError('--posts и --repeat должны быть положительными')
+        posts = list(Post.objects.select_related('author', 'group')
+                     .order_by('-pub_date')[:options['posts']])
+        if not posts:
+            raise CommandError(
+                'В базе нет постов, заполните ее seed_yatube')
+        results = benchmark.card_render_time(posts, options['repeat'])
+        results['cards'] = len(posts)
+        self.stdout.write(json.dumps(results, indent=2))
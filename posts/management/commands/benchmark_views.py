@@ -0,0 +1,96 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.test import Client
+
+from posts import benchmark
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время ответа всех именованных страниц posts, users '
+            'и about и сравнивает его с базовым замером')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--user',
+            help='От чьего имени открывать страницы, по умолчанию - '
+                 'пользователь с наибольшим числом подписок')
+        parser.add_argument(
+            '--anonymous', action='store_true',
+            help='Открывать страницы без входа на сайт')
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом')
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+        parser.add_argument(
+            '--baseline', help='JSON с базовым замером для сравнения')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый рост метрики, доля от базового замера')
+        parser.add_argument(
+            '--min-delta', type=float, default=1.0,
+            help='Рост метрики меньше этого числа мс не считается '
+                 'регрессией')
+        parser.add_argument(
+            '--metric', choices=benchmark.METRICS, default='p95')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть положительным')
+        post = Post.objects.select_related('author').order_by(
+            '-comment_count', '-pk').first()
+        group = Group.objects.annotate(
+            total=Count('posts')).order_by('-total').first()
+        if post is None or group is None:
+            raise CommandError(
+                'В базе нет постов или групп, заполните ее seed_yatube')
+        samples = {
+            'username': post.author.username,
+            'post_id': post.pk,
+            'slug': group.slug,
+        }
+        client = Client()
+        if not options['anonymous']:
+            client.force_login(self.get_user(options['user']))
+        # follow/unfollow и другие страницы могут менять данные: все
+        # изменения откатываются после замера
+        with transaction.atomic():
+            results = benchmark.run(
+                client, benchmark.routes(samples), options['repeat'],
+                options['warmup'], options['cold'])
+            transaction.set_rollback(True)
+        report = json.dumps(results, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(report + '\n')
+        else:
+            self.stdout.write(report)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as baseline:
+                problems = benchmark.compare(
+                    results, json.load(baseline), options['threshold'],
+                    options['metric'], options['min_delta'])
+            if problems:
+                raise CommandError(
+                    'Регрессия производительности:\n' + '\n'.join(problems))
+            self.stdout.write('Регрессий относительно базового замера нет')
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {username} не найден')
+        user = User.objects.annotate(
+            total=Count('follower')).order_by('-total', 'pk').first()
+        if user is None:
+            raise CommandError('В базе нет пользователей')
+        return user
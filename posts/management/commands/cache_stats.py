@@ -0,0 +1,19 @@
+import json
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Выводит счетчики общего кеша в JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alias', default='default')
+
+    def handle(self, *args, **options):
+        cache = caches[options['alias']]
+        if not hasattr(cache, 'stats'):
+            raise CommandError(
+                f'Кеш {options["alias"]} не ведет статистику, включите '
+                f'yatube.sqlite_cache переменной YATUBE_SHARED_CACHE')
+        self.stdout.write(json.dumps(cache.stats(), sort_keys=True))
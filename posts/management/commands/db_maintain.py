@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from posts import sqlite
+
+
+class Command(BaseCommand):
+    help = ('Обслуживает базу SQLite: контрольная точка WAL, ANALYZE, '
+            'инкрементальная очистка и отчет о размере и фрагментации')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--vacuum', action='store_true',
+            help='Полностью перестроить файл (VACUUM), база на это время '
+                 'блокируется')
+        parser.add_argument(
+            '--report-only', action='store_true',
+            help='Только вывести отчет, ничего не меняя')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда работает только с SQLite')
+        result = {}
+        with connection.cursor() as cursor:
+            if not options['report_only']:
+                if options['vacuum']:
+                    sqlite.vacuum(cursor)
+                    result['vacuum'] = True
+                result['freed_pages'] = sqlite.incremental_vacuum(cursor)
+                cursor.execute('ANALYZE')
+                result['analyze'] = True
+                busy, log, checkpointed = sqlite.checkpoint(cursor)
+                result['checkpoint'] = {
+                    'busy': bool(busy),
+                    'wal_pages': log,
+                    'checkpointed_pages': checkpointed,
+                }
+            result['report'] = sqlite.report(
+                cursor, connection.settings_dict['NAME'])
+        self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2))
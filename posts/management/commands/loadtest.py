@@ -0,0 +1,109 @@
+import json
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import got_request_exception
+from django.db import OperationalError
+from django.db.models import Count
+from django.test import Client
+
+from posts import loadtest
+from posts.models import Post
+
+User = get_user_model()
+
+
+class LockCounter:
+    """Считает запросы, упавшие с «database is locked» на сервере"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, sender, **kwargs):
+        error = sys.exc_info()[1]
+        if isinstance(error, OperationalError) and 'locked' in str(error):
+            with self._lock:
+                self.count += 1
+
+
+class Command(BaseCommand):
+    help = ('Нагружает приложение из yatube/wsgi.py параллельными '
+            'клиентами со смесью чтения и записи')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients', type=int, default=8,
+            help='Число одновременных клиентов, у каждого свой '
+                 'пользователь')
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='В скольких процессах запускать клиентов')
+        parser.add_argument('--duration', type=float, default=30)
+        parser.add_argument(
+            '--requests', type=int,
+            help='Максимум запросов на одного клиента')
+        parser.add_argument(
+            '--mix',
+            default=','.join(
+                f'{name}={weight}'
+                for name, weight in loadtest.DEFAULT_MIX.items()),
+            help='Веса операций: ' + ', '.join(loadtest.OPERATIONS))
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+
+    def handle(self, *args, **options):
+        try:
+            mix = loadtest.parse_mix(options['mix'])
+        except ValueError as error:
+            raise CommandError(error)
+        users = list(User.objects.annotate(
+            total=Count('follower')).order_by('-total', 'pk')[
+            :options['clients']])
+        posts = list(Post.objects.order_by('-pk').values_list(
+            'author__username', 'pk')[:1000])
+        if len(users) < options['clients'] or not posts:
+            raise CommandError(
+                'Мало пользователей или нет постов, заполните базу '
+                'командой seed_yatube')
+        targets = {
+            'posts': posts,
+            'authors': sorted({username for username, _ in posts}),
+        }
+        sessions = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            sessions.append({
+                settings.SESSION_COOKIE_NAME:
+                    client.cookies[settings.SESSION_COOKIE_NAME].value,
+            })
+
+        from yatube.wsgi import application
+
+        locked = LockCounter()
+        got_request_exception.connect(locked)
+        server = loadtest.serve(application)
+        try:
+            started = time.monotonic()
+            samples = loadtest.run_clients(
+                server.server_address, sessions, targets, mix,
+                options['duration'], options['requests'] or float('inf'),
+                options['processes'], options['seed'])
+            elapsed = time.monotonic() - started
+        finally:
+            server.shutdown()
+            server.server_close()
+            got_request_exception.disconnect(locked)
+        report = loadtest.summarize(samples, elapsed)
+        report['total']['database_locked'] = locked.count
+        report = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(report + '\n')
+        else:
+            self.stdout.write(report)
@@ -0,0 +1,95 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from posts import feed_cache, sharding
+from posts.models import Comment, Post, TimelineEntry
+
+BATCH_SIZE = 500
+
+
+def plan():
+    """{(шард, нужный шард): [id авторов]} для авторов, чьи посты лежат
+    не на своем шарде"""
+    moves = defaultdict(list)
+    for alias in sharding.shards():
+        author_ids = Post.objects.using(alias).order_by().values_list(
+            'author_id', flat=True).distinct()
+        for author_id in author_ids:
+            target = sharding.shard_for(author_id)
+            if target != alias:
+                moves[alias, target].append(author_id)
+    return moves
+
+
+def move(author_id, source, target, batch_size=BATCH_SIZE):
+    """Переносит посты автора и комментарии к ним из source в target.
+
+    Сначала записи копируются с прежними id, потом удаляются из source.
+    Прерванный перенос можно повторить: уже скопированные записи
+    пропускаются. Сигналы не отправляются, счетчики не меняются."""
+    posts = Post.objects.using(source).filter(
+        author_id=author_id).order_by('pk').iterator()
+    moved = [0, 0]
+    while True:
+        chunk = list(islice(posts, batch_size))
+        if not chunk:
+            break
+        comments = list(Comment.objects.using(source).filter(
+            post__in=[post.pk for post in chunk]))
+        with transaction.atomic(using=target):
+            Post.objects.using(target).bulk_create(
+                chunk, batch_size=batch_size, ignore_conflicts=True)
+            Comment.objects.using(target).bulk_create(
+                comments, batch_size=batch_size, ignore_conflicts=True)
+        moved[0] += len(chunk)
+        moved[1] += len(comments)
+    with transaction.atomic(using=source):
+        if source == DEFAULT_DB_ALIAS:
+            # ленты подписок ссылаются на посты основной базы
+            TimelineEntry.objects.filter(author_id=author_id).delete()
+        with connections[source].cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {Comment._meta.db_table} WHERE post_id IN '
+                f'(SELECT id FROM {Post._meta.db_table} '
+                f'WHERE author_id = %s)', [author_id])
+            cursor.execute(
+                f'DELETE FROM {Post._meta.db_table} WHERE author_id = %s',
+                [author_id])
+    return moved
+
+
+class Command(BaseCommand):
+    help = ('Переносит посты и комментарии авторов на их шарды после '
+            'изменения POST_SHARDS')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, сколько авторов нужно перенести')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        moves = plan()
+        for (source, target), author_ids in sorted(moves.items()):
+            if options['dry_run']:
+                self.stdout.write(
+                    f'{source} -> {target}: авторов {len(author_ids)}')
+                continue
+            posts = comments = 0
+            for author_id in author_ids:
+                moved = move(author_id, source, target,
+                             options['batch_size'])
+                posts += moved[0]
+                comments += moved[1]
+            self.stdout.write(
+                f'{source} -> {target}: авторов {len(author_ids)}, '
+                f'постов {posts}, комментариев {comments}')
+        if not moves:
+            self.stdout.write('Все посты на своих шардах')
+        elif not options['dry_run']:
+            for key in (feed_cache.FEED_GENERATION,
+                        feed_cache.POSTS_GENERATION):
+                feed_cache.bump_generation(key)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import rebuild_author_stats, rebuild_comment_counts
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики постов'
+
+    def handle(self, *args, **options):
+        updated = rebuild_comment_counts()
+        self.stdout.write(f'Пересчитано постов: {updated}')
+        updated = rebuild_author_stats()
+        self.stdout.write(f'Пересчитано авторов: {updated}')
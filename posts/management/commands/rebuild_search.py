@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from posts import search, sharding
+from posts.models import Group
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов'
+
+    def handle(self, *args, **options):
+        if not search.available():
+            raise CommandError('Полнотекстовый индекс есть только в SQLite')
+        for alias in sharding.shards():
+            with transaction.atomic(using=alias):
+                if alias != DEFAULT_DB_ALIAS:
+                    # индекс шарда берет названия групп из их копий
+                    sharding.copy_rows(Group, alias)
+                search.rebuild(connections[alias])
+            self.stdout.write(f'Полнотекстовый индекс {alias} перестроен')
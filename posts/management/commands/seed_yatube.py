@@ -0,0 +1,267 @@
+import io
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from posts import feed_cache, thumbnails, timeline
+from posts.counters import rebuild_author_stats, rebuild_comment_counts
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+WORDS = (
+    'утро вечер город река дорога книга письмо друг кот собака море лес '
+    'поезд дом окно снег дождь солнце чай кофе музыка фильм работа отпуск '
+    'встреча разговор история путь новость мысль идея проект вопрос ответ '
+    'сегодня вчера завтра снова наконец очень почти совсем тихо быстро '
+    'новый старый большой маленький красивый странный добрый '
+    'пишу читаю вижу помню думаю люблю жду иду смотрю слушаю'
+).split()
+
+# столько разных картинок создается для постов с изображениями: одна
+# картинка на много постов, как и миниатюра для нее
+IMAGE_POOL = 20
+
+
+def power_law_weights(count, exponent):
+    """Накопленные веса закона Ципфа: k-й по популярности объект
+    выбирается с вероятностью, пропорциональной 1 / k ** exponent"""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, count + 1)))
+
+
+def chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Временно отключает auto_now_add, чтобы сохранить заданные даты"""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами, комментариями и подписками для нагрузочных замеров')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument(
+            '--images', type=float, default=0.0,
+            help='Доля постов с картинкой, от 0 до 1')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределить даты публикации')
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного распределения постов и подписчиков '
+                 'по авторам и комментариев по постам')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Префикс имен пользователей и адресов групп')
+        parser.add_argument(
+            '--password', default='yatube-seed',
+            help='Пароль всех созданных пользователей')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь')
+        if not 0 <= options['images'] <= 1:
+            raise CommandError('--images - доля от 0 до 1')
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix} уже есть, '
+                f'укажите другой --prefix')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.exponent = options['exponent']
+        self.now = timezone.now()
+        self.period = timedelta(days=options['days']).total_seconds()
+        started = time.monotonic()
+        with transaction.atomic():
+            users = self.create_users(
+                options['users'], prefix, options['password'])
+            groups = self.create_groups(options['groups'], prefix)
+            images = self.create_images(prefix) if options['images'] else []
+            post_ids, post_times = self.create_posts(
+                options['posts'], users, groups, images, options['images'])
+            self.create_comments(
+                options['comments'], users, post_ids, post_times)
+            self.create_follows(options['follows'], users)
+            rebuild_comment_counts()
+            rebuild_author_stats()
+            timeline.rebuild()
+            feed_cache.invalidate(posts_changed=True)
+        for name in images:
+            thumbnails.schedule(name)
+        self.stdout.write(
+            f'Создано за {time.monotonic() - started:.1f} с: '
+            f'пользователей {len(users)}, групп {len(groups)}, '
+            f'постов {len(post_ids)}')
+
+    def bulk_create(self, model, objects):
+        # размер одного INSERT Django подбирает под ограничения базы,
+        # batch_size ограничивает число объектов в памяти
+        for chunk in chunks(objects, self.batch_size):
+            model.objects.bulk_create(chunk)
+
+    def new_ids(self, model, last_id):
+        return array('q', model.objects.filter(pk__gt=last_id).order_by(
+            'pk').values_list('pk', flat=True).iterator())
+
+    def last_id(self, model):
+        last = model.objects.order_by('-pk').values_list('pk', flat=True)
+        return last.first() or 0
+
+    def random_time(self):
+        return self.now.timestamp() - self.rng.random() * self.period
+
+    def text(self, min_words, max_words):
+        count = self.rng.randint(min_words, max_words)
+        return ' '.join(self.rng.choices(WORDS, k=count)).capitalize()
+
+    def create_users(self, count, prefix, password):
+        last_id = self.last_id(User)
+        password = make_password(password)
+        self.bulk_create(User, (
+            User(username=f'{prefix}_{i}', password=password,
+                 first_name=f'Автор{i}', last_name=prefix)
+            for i in range(count)))
+        users = list(self.new_ids(User, last_id))
+        # порядок популярности не совпадает с порядком id
+        self.rng.shuffle(users)
+        self.stdout.write(f'Пользователи: {len(users)}')
+        return users
+
+    def create_groups(self, count, prefix):
+        last_id = self.last_id(Group)
+        self.bulk_create(Group, (
+            Group(title=f'Группа {prefix} {i}', slug=f'{prefix}-{i}',
+                  description=self.text(5, 20))
+            for i in range(count)))
+        return list(self.new_ids(Group, last_id))
+
+    def create_images(self, prefix):
+        from PIL import Image
+
+        names = []
+        for i in range(IMAGE_POOL):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            content = io.BytesIO()
+            Image.new('RGB', (1200, 800), color).save(content, 'JPEG')
+            names.append(default_storage.save(
+                f'posts/{prefix}_{i}.jpg', ContentFile(content.getvalue())))
+        return names
+
+    def create_posts(self, count, users, groups, images, image_share):
+        last_id = self.last_id(Post)
+        author_weights = power_law_weights(len(users), self.exponent)
+        group_weights = power_law_weights(len(groups), self.exponent)
+        times = array('d', sorted(
+            self.random_time() for _ in range(count)))
+
+        def posts():
+            authors = self.rng.choices(
+                users, cum_weights=author_weights, k=count)
+            for author, timestamp in zip(authors, times):
+                group = None
+                # примерно каждый пятый пост без группы
+                if groups and self.rng.random() < 0.8:
+                    group = self.rng.choices(
+                        groups, cum_weights=group_weights)[0]
+                image = ''
+                if images and self.rng.random() < image_share:
+                    image = self.rng.choice(images)
+                yield Post(
+                    text=self.text(3, 60),
+                    author_id=author,
+                    group_id=group,
+                    image=image,
+                    pub_date=datetime.fromtimestamp(
+                        timestamp, timezone.utc),
+                )
+
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            self.bulk_create(Post, posts())
+        post_ids = self.new_ids(Post, last_id)
+        self.stdout.write(f'Посты: {len(post_ids)}')
+        return post_ids, times
+
+    def create_comments(self, count, users, post_ids, post_times):
+        if not post_ids:
+            return
+        order = list(range(len(post_ids)))
+        self.rng.shuffle(order)
+        post_weights = power_law_weights(len(order), self.exponent)
+        now = self.now.timestamp()
+
+        def comments():
+            for index in self.rng.choices(
+                    order, cum_weights=post_weights, k=count):
+                posted = post_times[index]
+                created = posted + self.rng.random() * (now - posted)
+                yield Comment(
+                    post_id=post_ids[index],
+                    author_id=self.rng.choice(users),
+                    text=self.text(1, 12)[:100],
+                    created=datetime.fromtimestamp(
+                        created, timezone.utc),
+                )
+
+        with explicit_dates(Comment._meta.get_field('created')):
+            self.bulk_create(Comment, comments())
+        self.stdout.write(f'Комментарии: {count}')
+
+    def create_follows(self, count, users):
+        # пар подписчик - автор не больше, чем n * (n - 1)
+        count = min(count, len(users) * (len(users) - 1))
+        # популярность у подписчиков не связана с числом постов автора:
+        # иначе размер материализованных лент растет как произведение
+        # двух степенных распределений
+        authors_by_fame = users[:]
+        self.rng.shuffle(authors_by_fame)
+        weights = power_law_weights(len(users), self.exponent)
+        pairs = set()
+        while len(pairs) < count:
+            authors = self.rng.choices(
+                authors_by_fame, cum_weights=weights, k=count - len(pairs))
+            for author in authors:
+                user = self.rng.choice(users)
+                if user != author:
+                    pairs.add((user, author))
+        self.bulk_create(Follow, (
+            Follow(user_id=user, author_id=author)
+            for user, author in sorted(pairs)))
+        self.stdout.write(f'Подписки: {len(pairs)}')
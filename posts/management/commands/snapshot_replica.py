@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from posts import feed_cache, replicas
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файл реплики для чтения, '
+            'однократно или каждые --interval секунд')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target',
+            help='Файл копии, по умолчанию NAME базы replica')
+        parser.add_argument(
+            '--interval', type=float,
+            help='Повторять копирование с этим интервалом в секундах')
+
+    def handle(self, *args, **options):
+        target = options['target']
+        if target is None:
+            if not replicas.enabled():
+                raise CommandError(
+                    'Реплика не настроена: задайте YATUBE_READ_REPLICA '
+                    'или --target')
+            target = settings.DATABASES[replicas.REPLICA]['NAME']
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда работает только с SQLite')
+        while True:
+            self.snapshot(connection, target)
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def snapshot(self, connection, target):
+        start = time.perf_counter()
+        connection.ensure_connection()
+        # поколения основной базы не меняются: кеши реплики версии берут
+        # из снятого состояния, и пересчитываются только изменившиеся
+        state = feed_cache.snapshot_state()
+        pages = replicas.snapshot(connection.connection, target)
+        feed_cache.set_replica_snapshot(state)
+        self.stdout.write(
+            f'Скопировано страниц: {pages} за '
+            f'{time.perf_counter() - start:.3f} с')
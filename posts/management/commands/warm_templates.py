@@ -0,0 +1,61 @@
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template import TemplateSyntaxError, engines
+
+from posts import template_cache
+
+
+def template_names(directory):
+    for root, _, files in os.walk(directory):
+        for name in files:
+            yield os.path.relpath(
+                os.path.join(root, name), directory).replace(os.sep, '/')
+
+
+class Command(BaseCommand):
+    help = ('Компилирует все шаблоны проекта и сохраняет их в '
+            'TEMPLATE_CACHE_FILE для быстрого старта процессов')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', help='Файл вместо TEMPLATE_CACHE_FILE')
+
+    def handle(self, *args, **options):
+        path = options['output'] or template_cache.cache_file()
+        if not path:
+            raise CommandError('Задайте TEMPLATE_CACHE_FILE или --output')
+        engine = engines['django'].engine
+        loader = next(template_cache.loaders(), None)
+        if loader is None:
+            # кешированные шаблоны выключены (DEBUG): файл все равно
+            # собирается загрузчиками движка
+            loader = template_cache.Loader(engine, engine.loaders)
+        loader.reset()
+        errors = []
+        for directory in self.directories(engine):
+            for name in template_names(directory):
+                try:
+                    loader.get_template(name)
+                except TemplateSyntaxError as error:
+                    errors.append(f'{name}: {error}')
+        if errors:
+            raise CommandError(
+                'Ошибки в шаблонах:\n' + '\n'.join(errors))
+        template_cache.write(path, loader.compiled)
+        self.stdout.write(
+            f'Шаблонов: {len(loader.compiled)}, без изменений: '
+            f'{loader.hits}, файл: {path}')
+
+    def directories(self, engine):
+        """Папки шаблонов проекта: DIRS и templates приложений проекта,
+        без шаблонов Django и сторонних пакетов"""
+        result = list(engine.dirs)
+        for app_config in apps.get_app_configs():
+            directory = os.path.join(app_config.path, 'templates')
+            if (app_config.path.startswith(str(settings.BASE_DIR))
+                    and os.path.isdir(directory)):
+                result.append(directory)
+        return result
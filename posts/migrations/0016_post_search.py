@@ -0,0 +1,63 @@
+from django.db import migrations
+
+FTS_TABLE = 'posts_post_fts'
+
+SCHEMA = [
+    f'''CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        text, group_title, tokenize = 'unicode61 remove_diacritics 2')''',
+    f'''CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text, group_title) VALUES (
+            new.id, new.text,
+            COALESCE((SELECT title FROM posts_group
+                      WHERE id = new.group_id), ''));
+    END''',
+    f'''CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF text, group_id
+    ON posts_post BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, text, group_title) VALUES (
+            new.id, new.text,
+            COALESCE((SELECT title FROM posts_group
+                      WHERE id = new.group_id), ''));
+    END''',
+    f'''CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON posts_post BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END''',
+    f'''CREATE TRIGGER {FTS_TABLE}_group_au AFTER UPDATE OF title
+    ON posts_group BEGIN
+        UPDATE {FTS_TABLE} SET group_title = new.title WHERE rowid IN (
+            SELECT id FROM posts_post WHERE group_id = new.id);
+    END''',
+    f'''INSERT INTO {FTS_TABLE}(rowid, text, group_title)
+        SELECT p.id, p.text, COALESCE(g.title, '')
+        FROM posts_post AS p
+        LEFT JOIN posts_group AS g ON g.id = p.group_id''',
+]
+
+DROP_SCHEMA = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_group_au',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def run(statements):
+    # полнотекстовый индекс FTS5 есть только в SQLite
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(SCHEMA), run(DROP_SCHEMA)),
+    ]
@@ -0,0 +1,37 @@
+from importlib import import_module
+
+from django.db import DEFAULT_DB_ALIAS, migrations
+
+post_search = import_module('posts.migrations.0016_post_search')
+
+
+def run(statements):
+    # на основной базе индекс создан миграцией 0016, а на шардах она не
+    # выполняется: миграции данных идут только в основную базу
+    def operation(apps, schema_editor):
+        connection = schema_editor.connection
+        if (connection.vendor != 'sqlite'
+                or connection.alias == DEFAULT_DB_ALIAS):
+            return
+        if statements is post_search.SCHEMA:
+            # триггеры индекса берут название группы из базы шарда
+            Group = apps.get_model('posts', 'Group')
+            Group.objects.using(connection.alias).bulk_create(
+                Group.objects.using(DEFAULT_DB_ALIAS).all(),
+                ignore_conflicts=True)
+        for sql in statements:
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_authorstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run(post_search.SCHEMA), run(post_search.DROP_SCHEMA),
+            hints={'shards': True}),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .sharding import ShardQuerySet
+
 USER_MODEL = get_user_model()
 
 
@@ -56,7 +58,9 @@ class Post(models.Model):
     author:
         автор поста
     group:
-        принадлежность поста к группе"""
+        принадлежность поста к группе
+    comment_count:
+        количество комментариев, поддерживается сигналами Comment"""
 
     text = models.TextField(
         "Содержание",
@@ -72,6 +76,11 @@ class Post(models.Model):
         related_name="posts", verbose_name="Группа", help_text='Выбери группу'
     )
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    comment_count = models.PositiveIntegerField(
+        'Количество комментариев', default=0, editable=False
+    )
+
+    objects = ShardQuerySet.as_manager()
 
     def __str__(self):
         return self.text
@@ -79,6 +88,15 @@ class Post(models.Model):
     class Meta:
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # индексы под сортировку лент по дате: общей, сообщества и автора
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_pub_date_idx'),
+            models.Index(
+                fields=['group', 'pub_date'], name='post_group_pub_date_idx'),
+            models.Index(
+                fields=['author', 'pub_date'],
+                name='post_author_pub_date_idx'),
+        ]
 
 
 class Comment(models.Model):
@@ -144,3 +162,73 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        indexes = [
+            models.Index(
+                fields=['user', 'author'], name='follow_user_author_idx'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок (fan-out on write): по строке на
+    каждую пару подписчик - пост автора, на которого он подписан.
+
+    Properties
+    ----------
+    user:
+        владелец ленты (подписчик)
+    post:
+        пост в ленте
+    author:
+        автор поста, нужен чтобы быстро чистить ленту при отписке
+    pub_date:
+        копия даты публикации поста для сортировки по индексу"""
+
+    user = models.ForeignKey(
+        USER_MODEL, on_delete=models.CASCADE, related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='timeline_entries'
+    )
+    author = models.ForeignKey(
+        USER_MODEL, on_delete=models.CASCADE, related_name='+'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Лента подписок'
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'),
+            models.Index(
+                fields=['user', 'author'], name='timeline_user_author_idx'),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счетчики автора для боковой панели профиля.
+
+    Properties
+    ----------
+    author:
+        автор
+    post_count:
+        количество постов автора
+    follower_count:
+        количество подписчиков автора
+    following_count:
+        на скольких авторов подписан сам автор"""
+
+    author = models.OneToOneField(
+        USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+        related_name='stats'
+    )
+    post_count = models.PositiveIntegerField('Записей', default=0)
+    follower_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
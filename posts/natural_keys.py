@@ -0,0 +1,110 @@
+"""Кеш поиска объектов по естественному ключу: групп по slug и
+пользователей по username.
+
+Найденный объект хранится в кеше до изменения или удаления (сигналы в
+posts/signals.py), отсутствующий - недолго, чтобы перебор
+несуществующих адресов не доходил до базы."""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router, transaction
+from django.http import Http404
+
+from .models import Group
+
+# значение в кеше для отсутствующего объекта
+MISSING = 0
+
+
+def timeout():
+    return getattr(settings, 'NATURAL_KEY_CACHE_TIMEOUT', 60 * 60)
+
+
+def missing_timeout():
+    return getattr(settings, 'NATURAL_KEY_MISSING_TIMEOUT', 30)
+
+
+class NaturalKeyCache:
+    """Объекты model по уникальному полю field через кеш.
+
+    fields ограничивает загружаемые поля: в кеш не попадают, например,
+    хеши паролей пользователей. Ключ хранится и по pk объекта, чтобы при
+    переименовании сбросить запись и под прежним значением."""
+
+    def __init__(self, model, field, fields=None):
+        self.model = model
+        self.field = field
+        self.fields = fields
+        self.prefix = 'natural:%s.%s' % (
+            model._meta.label_lower, field)
+
+    def cache_key(self, value):
+        digest = hashlib.md5(str(value).encode()).hexdigest()
+        return '%s:%s' % (self.prefix, digest)
+
+    def pk_key(self, pk):
+        return '%s:pk:%s' % (self.prefix, pk)
+
+    def _queryset(self):
+        # из основной базы: запись из отстающей реплики жила бы в кеше
+        # до следующего изменения объекта
+        queryset = self.model._default_manager.using(
+            router.db_for_write(self.model))
+        if self.fields:
+            queryset = queryset.only(*self.fields)
+        return queryset
+
+    def get(self, value):
+        """Объект с field == value или None"""
+        key = self.cache_key(value)
+        instance = cache.get(key)
+        if instance is not None:
+            return instance or None
+        instance = self._queryset().filter(**{self.field: value}).first()
+        if instance is None:
+            cache.set(key, MISSING, missing_timeout())
+            return None
+        self._store(instance)
+        return instance
+
+    def get_by_pk(self, pk):
+        """Объект по pk или None: значение поля берется из записи по pk"""
+        value = cache.get(self.pk_key(pk))
+        if value is not None:
+            return self.get(value)
+        instance = self._queryset().filter(pk=pk).first()
+        if instance is not None:
+            self._store(instance)
+        return instance
+
+    def _store(self, instance):
+        value = getattr(instance, self.field)
+        cache.set_many({self.cache_key(value): instance,
+                        self.pk_key(instance.pk): value}, timeout())
+
+    def get_or_404(self, value):
+        instance = self.get(value)
+        if instance is None:
+            raise Http404('No %s matches the given query.'
+                          % self.model._meta.object_name)
+        return instance
+
+    def invalidate(self, instance):
+        """Сбрасывает записи объекта под текущим и прежним значением
+        сразу и еще раз после коммита"""
+        keys = [self.cache_key(getattr(instance, self.field)),
+                self.pk_key(instance.pk)]
+        previous = cache.get(self.pk_key(instance.pk))
+        if previous is not None:
+            keys.append(self.cache_key(previous))
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+groups = NaturalKeyCache(Group, 'slug')
+users = NaturalKeyCache(
+    get_user_model(), 'username',
+    fields=('id', 'username', 'first_name', 'last_name', 'date_joined',
+            'is_active'))
@@ -0,0 +1,230 @@
+"""Кеш целых HTML-страниц с «дырками» для частей, зависящих от
+пользователя.
+
+Страница хранится одна на представление с аргументами из адреса и
+страницу ленты, для всех посетителей. Шаблоны отмечают
+пользовательские части тегом {% hole %}: в кеш попадает только метка с
+именем и аргументами, а при каждом ответе метка заменяется результатом
+функции из HOLES для текущего пользователя."""
+import hashlib
+import re
+from urllib.parse import quote, unquote
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.html import escape
+
+from . import feed_cache, following, pagination, replicas, stale_cache
+from .forms import CommentForm
+from .fragments import PENDING_MARKER
+from .models import Post
+
+User = get_user_model()
+
+HOLE_RE = re.compile(r'<!--hole:([^>]*?)-->(.*?)<!--/hole-->', re.DOTALL)
+
+HOLES = {}
+
+# страницы, которые кеширует PageCacheMiddleware (имена из urls.py)
+CACHED_VIEWS = frozenset(('index', 'group_posts', 'profile', 'post'))
+
+# параметры запроса, от которых зависит страница; остальные (?utm=...)
+# на нее не влияют и в ключ не входят
+PAGE_PARAMS = ('page', 'cursor')
+
+
+def timeout():
+    # изменения, которые не меняют поколение (например, название группы
+    # в админке), видны не позже чем через это время
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 5)
+
+
+def hole(name):
+    """Регистрирует функцию (request, *args), заполняющую дырку name"""
+    def register(function):
+        HOLES[name] = function
+        return function
+    return register
+
+
+def open_marker(name, args):
+    return '<!--hole:%s-->' % ':'.join(
+        quote(str(value), safe='') for value in (name, *args))
+
+
+def close_marker():
+    return '<!--/hole-->'
+
+
+def strip_holes(html):
+    """HTML без содержимого дырок: оно зависит от пользователя"""
+    return HOLE_RE.sub(lambda match: '<!--hole:%s--><!--/hole-->'
+                       % match.group(1), html)
+
+
+def fill_holes(html, request):
+    """Заполняет дырки для пользователя запроса и убирает метки"""
+    # внутри заполнения теги {% hole %} выводят содержимое как есть
+    request.page_cache = False
+
+    def fill(match):
+        name, *args = [unquote(part) for part in match.group(1).split(':')]
+        return HOLES[name](request, *args)
+    return HOLE_RE.sub(fill, html)
+
+
+@hole('nav')
+def _nav(request):
+    return render_to_string('include/nav.html', request=request)
+
+
+@hole('menu')
+def _menu(request, index, follow):
+    return render_to_string('include/menu.html', {
+        'index': bool(index), 'follow': bool(follow)}, request=request)
+
+
+@hole('user_name')
+def _user_name(request):
+    return escape(request.user)
+
+
+@hole('user_full_name')
+def _user_full_name(request):
+    # у анонимного пользователя имени нет, как и в шаблоне
+    user = request.user
+    return escape(user.get_full_name() if user.is_authenticated else '')
+
+
+def _post(post_id, author_id, username):
+    # шаблонам дырок нужны только номер поста и автор: объекты
+    # собираются из аргументов метки без запросов к базе
+    return Post(pk=int(post_id),
+                author=User(pk=int(author_id), username=username))
+
+
+@hole('post_actions')
+def _post_actions(request, post_id, author_id, username):
+    return render_to_string('include/post_actions.html', {
+        'post': _post(post_id, author_id, username)}, request=request)
+
+
+@hole('comment_form')
+def _comment_form(request, post_id, author_id, username):
+    return render_to_string('include/comment_form.html', {
+        'post': _post(post_id, author_id, username),
+        'form': CommentForm(),
+    }, request=request)
+
+
+@hole('follow_button')
+def _follow_button(request, author_id, username):
+    return render_to_string('include/follow_button.html', {
+        'profile': User(pk=int(author_id), username=username),
+        'following': following.is_following(request.user, int(author_id)),
+    }, request=request)
+
+
+def _page_params(request):
+    return tuple((name, request.GET[name])
+                 for name in PAGE_PARAMS if name in request.GET)
+
+
+def make_key(request, alias):
+    """Ключ страницы: представление, его аргументы из адреса и параметры
+    страницы ленты. Строка запроса целиком в ключ не входит, иначе
+    каждый ?x=1, ?x=2 создавал бы новую копию страницы.
+
+    Реплика отстает от основной базы: ее страницы хранятся отдельно."""
+    match = request.resolver_match
+    parts = (match.view_name, match.args, sorted(match.kwargs.items()),
+             _page_params(request))
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return 'page:%s:%s' % (alias, digest)
+
+
+def version():
+    return (feed_cache.generation(),
+            feed_cache.generation(feed_cache.FOLLOW_GENERATION))
+
+
+def _snapshot(response):
+    """Содержимое ответа без дырок или сам ответ, если его нельзя
+    кешировать.
+
+    Cookie и заголовки ответа не кешируются: каждый ответ собирается
+    заново, и middleware (сессии, CSRF) добавляют к нему свои cookie для
+    текущего посетителя. Поэтому проверять их здесь, до middleware,
+    бессмысленно. Безопасность кеша держится на дырках: все, что зависит
+    от пользователя, включая токен CSRF в форме комментария, выводится
+    внутри {% hole %} и в кеш не попадает."""
+    if (response.status_code != 200 or response.streaming
+            or 'text/html' not in response.get('Content-Type', '')):
+        return response
+    html = response.content.decode(response.charset)
+    return strip_holes(html), response['Content-Type']
+
+
+def _cacheable(request, snapshot):
+    """Кешируется только страница, запрошенная теми же параметрами, что
+    в ссылках пагинатора: ?page=abc или ?page=999999 показывают чужую
+    страницу и копий в кеше не создают. Страница с заглушкой миниатюры
+    не кешируется: иначе заглушка осталась бы на ней до смены поколения
+    данных."""
+    if not isinstance(snapshot, tuple) or PENDING_MARKER in snapshot[0]:
+        return False
+    # представления без ленты (страница поста) параметров не принимают
+    key = getattr(request, 'page_key', None)
+    queries = pagination.page_queries(key) if key else {()}
+    return _page_params(request) in queries
+
+
+def respond(request, view, args, kwargs):
+    """Ответ представления view из общего кеша страниц, если кеш для
+    запроса включил PageCacheMiddleware.
+
+    Версия - поколения данных лент и подписок: после любого изменения
+    постов, комментариев или подписок страница строится заново.
+    Пересчитывает страницу один запрос, остальные ждут его результат;
+    прежняя копия отдается, только пока пересчитывается страница с
+    истекшим сроком свежести."""
+    if not getattr(request, 'page_cache', False):
+        return view(request, *args, **kwargs)
+    snapshot = stale_cache.get_or_set(
+        make_key(request, replicas.read_alias()),
+        lambda: _snapshot(view(request, *args, **kwargs)),
+        timeout(), version=version(),
+        cacheable=lambda snapshot: _cacheable(request, snapshot))
+    if isinstance(snapshot, tuple):
+        html, content_type = snapshot
+        return HttpResponse(
+            fill_holes(html, request), content_type=content_type)
+    if not snapshot.streaming:
+        snapshot.content = fill_holes(
+            snapshot.content.decode(snapshot.charset), request)
+    return snapshot
+
+
+class PageCacheMiddleware:
+    """Отдает GET-запросы к CACHED_VIEWS из общего кеша страниц.
+
+    Представления с условными запросами (conditional) сначала проверяют
+    If-None-Match и отвечают 304 без страницы: им middleware только
+    включает кеш, а страницу из кеша берет сам conditional."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.method not in ('GET', 'HEAD')
+                or request.resolver_match.url_name not in CACHED_VIEWS):
+            return None
+        request.page_cache = True
+        if getattr(view_func, 'conditional', False):
+            return None
+        return respond(request, view_func, view_args, view_kwargs)
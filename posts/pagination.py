@@ -0,0 +1,224 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+# Показывать по 10 записей на странице.
+POSTS_PER_PAGE = 10
+
+# Сколько соседних страниц показывать по обе стороны от текущей и по
+# краям навигации.
+PAGE_WINDOW = 3
+PAGE_WINDOW_ENDS = 1
+
+# Ключ сортировки лент: сначала новые записи, при равной дате - большие id.
+FEED_KEY = ('pub_date', 'id')
+
+
+def encode_cursor(direction, pub_date, pk):
+    """Упаковывает позицию в ленте в непрозрачную строку для ?cursor="""
+    raw = json.dumps([direction, pub_date.isoformat(), pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает курсор. Для испорченного курсора возвращает None,
+    чтобы показать первую страницу, как это делает Paginator.get_page"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, pub_date, pk = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+    pub_date = parse_datetime(pub_date) if isinstance(pub_date, str) else None
+    if direction not in ('next', 'prev') or pub_date is None \
+            or not isinstance(pk, int):
+        return None
+    return direction, pub_date, pk
+
+
+class CountedPaginator(Paginator):
+    """Paginator, берущий количество записей из функции count - например,
+    из закешированного счетчика ленты - вместо COUNT(*) по запросу"""
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._count = count
+
+    @cached_property
+    def count(self):
+        return self._count()
+
+
+def page_window(page, on_each_side=PAGE_WINDOW, on_ends=PAGE_WINDOW_ENDS):
+    """Номера страниц для навигации: первые и последние on_ends страниц и
+    on_each_side страниц вокруг текущей. None обозначает пропуск."""
+    number, num_pages = page.number, page.paginator.num_pages
+    window = set(range(
+        max(number - on_each_side, 1),
+        min(number + on_each_side, num_pages) + 1))
+    window.update(range(1, min(on_ends, num_pages) + 1))
+    window.update(range(max(num_pages - on_ends + 1, 1), num_pages + 1))
+    result = []
+    for i in sorted(window):
+        if result and i - result[-1] > 1:
+            result.append(None)
+        result.append(i)
+    return result
+
+
+class CursorPage:
+    """Страница ленты при пагинации по курсору (pub_date, id).
+
+    В отличие от django.core.paginator.Page не знает ни номера страницы,
+    ни общего количества записей - поэтому не требует COUNT(*) и OFFSET."""
+
+    is_cursor = True
+    paginator = None
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<CursorPage of %s items>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Пагинатор по ключу (дата, id): каждая страница - один индексный
+    диапазон `WHERE (pub_date, id) < (...) ORDER BY ... LIMIT n`."""
+
+    def __init__(self, queryset, per_page, key=FEED_KEY):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.date_field, self.id_field = key
+
+    def _ordered(self, descending=True):
+        prefix = '-' if descending else ''
+        return self.queryset.order_by(
+            prefix + self.date_field, prefix + self.id_field)
+
+    def _after(self, pub_date, pk, lookup):
+        return (
+            Q(**{'%s__%s' % (self.date_field, lookup): pub_date})
+            | Q(**{
+                self.date_field: pub_date,
+                '%s__%s' % (self.id_field, lookup): pk,
+            })
+        )
+
+    def _cursor(self, direction, obj):
+        return encode_cursor(
+            direction,
+            getattr(obj, self.date_field),
+            getattr(obj, self.id_field))
+
+    def get_page(self, token):
+        cursor = decode_cursor(token)
+        limit = self.per_page + 1
+        if cursor is None:
+            rows = list(self._ordered()[:limit])
+            has_next, has_previous = len(rows) > self.per_page, False
+        elif cursor[0] == 'next':
+            _, pub_date, pk = cursor
+            rows = list(self._ordered().filter(
+                self._after(pub_date, pk, 'lt'))[:limit])
+            has_next, has_previous = len(rows) > self.per_page, True
+        else:
+            _, pub_date, pk = cursor
+            rows = list(self._ordered(descending=False).filter(
+                self._after(pub_date, pk, 'gt'))[:limit])
+            has_previous, has_next = len(rows) > self.per_page, True
+            rows = rows[:self.per_page][::-1]
+        rows = rows[:self.per_page]
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self._cursor('next', rows[-1])
+        if rows and has_previous:
+            previous_cursor = self._cursor('prev', rows[0])
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+
+def _use_cursor(request):
+    if 'page' in request.GET:
+        return False
+    return 'cursor' in request.GET or getattr(
+        settings, 'POSTS_CURSOR_PAGINATION', False)
+
+
+def page_key(request, count, per_page=POSTS_PER_PAGE):
+    """Страница, которую paginate вернет для запроса: ('page', номер) или
+    ('cursor', позиция). Разные записи одной страницы (?page=01,
+    ?page=abc, ?page=999999, испорченный курсор) дают одно значение.
+    count - функция количества записей, как у paginate."""
+    if _use_cursor(request):
+        position = decode_cursor(request.GET.get('cursor'))
+        if position is not None:
+            direction, pub_date, pk = position
+            position = direction, pub_date.isoformat(), pk
+        return 'cursor', position
+    paginator = CountedPaginator((), per_page, count)
+    return 'page', paginator.get_page(request.GET.get('page')).number
+
+
+def page_queries(key):
+    """Параметры запроса, которыми ссылки пагинатора задают страницу key
+    (значение page_key): набор кортежей пар (имя, значение). Другие
+    записи той же страницы (?page=01, ?page=999999) в набор не входят."""
+    kind, position = key
+    if kind == 'cursor':
+        if position is None:
+            return {()}
+        direction, pub_date, pk = position
+        token = encode_cursor(direction, parse_datetime(pub_date), pk)
+        return {(('cursor', token),)}
+    queries = {(('page', str(position)),)}
+    if position == 1:
+        queries.add(())
+    return queries
+
+
+def paginate(request, queryset, per_page=POSTS_PER_PAGE, key=FEED_KEY,
+             count=None):
+    """Возвращает страницу ленты для запроса.
+
+    Параметр ?page= всегда включает обычную постраничную навигацию.
+    ?cursor= (или настройка POSTS_CURSOR_PAGINATION при отсутствии ?page=)
+    включает пагинацию по курсору. Функция count, если задана, заменяет
+    COUNT(*) при постраничной навигации."""
+    if _use_cursor(request):
+        return CursorPaginator(queryset, per_page, key).get_page(
+            request.GET.get('cursor'))
+    page_number = request.GET.get('page')
+    date_field, id_field = key
+    queryset = queryset.order_by('-' + date_field, '-' + id_field)
+    if count is None:
+        paginator = Paginator(queryset, per_page)
+    else:
+        paginator = CountedPaginator(queryset, per_page, count)
+    return paginator.get_page(page_number)
@@ -0,0 +1,136 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .query_budgets import QUERY_BUDGETS
+
+logger = logging.getLogger(__name__)
+
+# одинаковый запрос, повторенный столько раз за один запрос к странице,
+# считается признаком N+1
+REPEAT_THRESHOLD = 3
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*%s|\s*\?|\s*,)+\s*\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+# управление транзакциями - не обращение к данным: BEGIN в работе и
+# SAVEPOINT внутри TestCase не должны менять счет запросов страницы
+_TRANSACTION = re.compile(
+    r'^\s*(?:BEGIN|SAVEPOINT|RELEASE|ROLLBACK TO)\b', re.IGNORECASE)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def normalize_sql(sql):
+    """Приводит SQL к шаблону без значений параметров, чтобы запросы,
+    отличающиеся только id, попали в одну группу"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """Обертка для connection.execute_wrapper, записывающая все запросы"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if _TRANSACTION.match(sql):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration in self.queries)
+
+    def repeated(self, threshold=REPEAT_THRESHOLD):
+        """Шаблоны запросов, выполненные не меньше threshold раз"""
+        patterns = Counter(normalize_sql(sql) for sql, _ in self.queries)
+        return [
+            (pattern, count) for pattern, count in patterns.most_common()
+            if count >= threshold
+        ]
+
+
+@contextmanager
+def record_queries():
+    recorder = QueryRecorder()
+    # во всех базах: страницы лент читают с реплики (posts.replicas)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+def check_budget(url_name, recorder):
+    """Список нарушений бюджета запросов для страницы url_name"""
+    problems = []
+    budget = QUERY_BUDGETS.get(url_name)
+    if budget is not None and recorder.count > budget:
+        problems.append(
+            f'{url_name}: {recorder.count} запросов при бюджете {budget}')
+    for pattern, count in recorder.repeated():
+        problems.append(f'{url_name}: N+1, {count} раз: {pattern}')
+    return problems
+
+
+class QueryBudgetMiddleware:
+    """Считает запросы каждого представления и проверяет бюджеты из
+    posts/query_budgets.py.
+
+    Включается настройкой QUERY_BUDGET_ENABLED. При QUERY_BUDGET_STRICT
+    нарушение бюджета вызывает исключение, иначе пишется в лог."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        match = request.resolver_match
+        if match is None:
+            return response
+        response['X-Query-Count'] = str(recorder.count)
+        problems = check_budget(match.view_name, recorder)
+        if problems and getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded('\n'.join(problems))
+        for problem in problems:
+            logger.warning(problem)
+        return response
+
+
+class QueryBudgetTestMixin:
+    """Помощник для TestCase: проверяет, что запрос к странице укладывается
+    в бюджет и не содержит повторяющихся запросов"""
+
+    def assertWithinQueryBudget(self, client, url_name, url, data=None,
+                                method='get'):
+        with record_queries() as recorder:
+            response = getattr(client, method)(url, data)
+        problems = check_budget(url_name, recorder)
+        if url_name not in QUERY_BUDGETS:
+            problems.append(f'{url_name}: бюджет запросов не задан')
+        if problems:
+            raise self.failureException('\n'.join(problems))
+        return response
@@ -0,0 +1,24 @@
+# Максимальное число SQL-запросов на один запрос к странице, по имени URL.
+# Бюджет не зависит от количества постов на странице: рост числа запросов
+# вместе с размером страницы - это N+1, его ловит QueryBudgetMiddleware
+# и тесты posts/tests/test_query_budget.py.
+QUERY_BUDGETS = {
+    # posts/urls.py
+    'index': 4,
+    'follow_index': 4,
+    'profile_follow': 11,
+    'profile_unfollow': 9,
+    'group_posts': 5,
+    'new_post': 8,
+    'profile': 5,
+    # включая запрос валидаторов для If-None-Match (posts.conditional)
+    'post': 5,
+    'post_edit': 8,
+    'add_comment': 8,
+    'search': 4,
+    # users/urls.py
+    'signup': 2,
+    # about/urls.py
+    'about:author': 2,
+    'about:tech': 2,
+}
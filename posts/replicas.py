@@ -0,0 +1,129 @@
+"""Чтение лент и страниц постов с реплики базы.
+
+Реплика - копия основной базы под псевдонимом replica, которую
+периодически обновляет manage.py snapshot_replica. Запросы GET к
+страницам из READ_VIEWS читают с нее, все записи идут в основную базу.
+Пользователь, который только что что-то записал, читает из основной
+базы REPLICA_STICKY_SECONDS секунд (cookie STICKY_COOKIE) и сразу видит
+свой пост или комментарий.
+
+Реплика отстает от основной базы, поэтому кеши лент и страниц хранят
+данные реплики отдельно (read_alias() входит в их ключи), а их версии -
+поколения данных, с которыми snapshot_replica сняла копию."""
+import re
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+READ_VIEWS = frozenset(
+    ('index', 'group_posts', 'profile', 'post', 'follow_index'))
+STICKY_COOKIE = 'primary_until'
+
+_WRITE = re.compile(r'^\s*(?:INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+# база для чтения в текущем запросе; Django 2.2 обслуживает запрос
+# целиком в одном потоке
+_state = threading.local()
+
+
+def enabled():
+    return REPLICA in settings.DATABASES
+
+
+def sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+
+
+def read_alias():
+    """Псевдоним базы, из которой читает текущий запрос"""
+    return REPLICA if getattr(_state, 'replica', False) else DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    """Направляет чтение моделей posts на реплику, пока этого требует
+    ReplicaMiddleware. Пользователи и сессии всегда читаются из основной
+    базы: только что созданный аккаунт может еще не попасть в копию."""
+
+    app_labels = frozenset(('posts',))
+
+    def db_for_read(self, model, **hints):
+        if (getattr(_state, 'replica', False)
+                and model._meta.app_label in self.app_labels):
+            return REPLICA
+        # связанные объекты читаются из базы объекта (hints['instance'])
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплика - копия той же базы
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != REPLICA
+
+
+def _is_sticky(request):
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaMiddleware:
+    """Включает чтение с реплики для GET к READ_VIEWS и закрепляет за
+    основной базой пользователя, выполнившего запись.
+
+    Работает, только если в DATABASES есть реплика."""
+
+    def __init__(self, get_response):
+        if not enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        wrote = []
+
+        def watch(execute, sql, params, many, context):
+            if not wrote and _WRITE.match(sql):
+                wrote.append(True)
+            return execute(sql, params, many, context)
+
+        _state.replica = False
+        try:
+            with connections[DEFAULT_DB_ALIAS].execute_wrapper(watch):
+                response = self.get_response(request)
+        finally:
+            _state.replica = False
+        if wrote:
+            seconds = sticky_seconds()
+            response.set_cookie(
+                STICKY_COOKIE, str(int(time.time() + seconds)),
+                max_age=seconds, httponly=True)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _state.replica = (
+            request.method in ('GET', 'HEAD')
+            and request.resolver_match.url_name in READ_VIEWS
+            and not _is_sticky(request))
+
+
+def snapshot(source, target):
+    """Копирует базу source в файл target через backup API SQLite.
+
+    Копия согласованная: backup читает источник в одной транзакции, а
+    читатели реплики в режиме WAL видят прежние данные до конца
+    копирования. Возвращает число скопированных страниц."""
+    destination = sqlite3.connect(target)
+    try:
+        source.backup(destination)
+        return destination.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        destination.close()
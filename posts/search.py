@@ -0,0 +1,141 @@
+import base64
+import binascii
+import heapq
+import json
+import re
+from itertools import islice
+
+from django.db import connection, connections
+from django.db.models import Q
+
+from . import sharding
+from .pagination import POSTS_PER_PAGE, CursorPage, CursorPaginator
+
+# Полнотекстовый индекс SQLite FTS5 по тексту поста и названию группы.
+# rowid строки индекса равен id поста. Индекс поддерживается триггерами
+# из миграции 0016_post_search, поэтому учитывает и bulk_create/update.
+# У каждого шарда (posts.sharding) свой индекс его постов, миграция
+# 0018_shard_search.
+FTS_TABLE = 'posts_post_fts'
+
+# Веса колонок для bm25: совпадение в тексте важнее совпадения в группе.
+TEXT_WEIGHT = 1.0
+GROUP_WEIGHT = 0.5
+
+_TOKEN = re.compile(r'\w+')
+
+_INDEX_SELECT = '''
+    SELECT p.id, p.text, COALESCE(g.title, '')
+    FROM posts_post AS p LEFT JOIN posts_group AS g ON g.id = p.group_id
+'''
+
+
+def available(conn=connection):
+    """FTS5 есть только в SQLite"""
+    return conn.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Переводит пользовательский запрос в выражение MATCH: каждое слово
+    берется в кавычки (операторы FTS5 в запросе не действуют) и ищется
+    как префикс. Пустая строка - если в запросе нет слов."""
+    return ' '.join(f'"{token}"*' for token in _TOKEN.findall(query))
+
+
+def rebuild(conn=connection):
+    """Заново заполняет индекс по всем постам"""
+    with conn.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE}(rowid, text, group_title) '
+            + _INDEX_SELECT)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def matching_ids_sql():
+    """Подзапрос id постов, подходящих под выражение MATCH, - для
+    queryset.filter(pk__in=RawSQL(...))"""
+    return f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+
+
+def encode_cursor(score, pk):
+    raw = json.dumps([score, pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Позиция (score, id) в выдаче или None для испорченного курсора"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        score, pk = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+    if not isinstance(score, (int, float)) or not isinstance(pk, int):
+        return None
+    return float(score), pk
+
+
+def _matches(queryset, expression, position, limit):
+    """Первые limit строк (score, id) индекса базы queryset после
+    позиции position"""
+    sql = f'''
+        SELECT score, rowid FROM (
+            SELECT rowid, bm25({FTS_TABLE}, %s, %s) AS score
+            FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)
+    '''
+    params = [TEXT_WEIGHT, GROUP_WEIGHT, expression]
+    if position is not None:
+        sql += ' WHERE score > %s OR (score = %s AND rowid > %s)'
+        params += [position[0], position[0], position[1]]
+    sql += ' ORDER BY score, rowid LIMIT %s'
+    params.append(limit)
+    with connections[queryset.db].cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        return db_cursor.fetchall()
+
+
+def search(queryset, query, cursor=None, per_page=POSTS_PER_PAGE):
+    """Страница результатов поиска, упорядоченная по bm25.
+
+    Пагинация по ключу (score, id): следующая страница начинается сразу
+    после последней строки предыдущей, без OFFSET. Индекс каждого шарда
+    запрашивается отдельно, строки сливаются по ключу; bm25 считается по
+    статистике своего шарда."""
+    expression = match_expression(query)
+    if not expression:
+        return CursorPage([], None, None)
+    if not available():
+        return _search_without_index(queryset, query, cursor, per_page)
+    position = decode_cursor(cursor)
+    querysets = sharding.per_shard(queryset)
+    found = sharding.gather(querysets, lambda shard: _matches(
+        shard, expression, position, per_page + 1))
+    rows = list(islice(heapq.merge(*(
+        [(score, pk, index) for score, pk in shard_rows]
+        for index, shard_rows in enumerate(found))), per_page + 1))
+    ids = {}
+    for _, pk, index in rows[:per_page]:
+        ids.setdefault(index, []).append(pk)
+    posts = {}
+    for shard_posts in sharding.gather(
+            [querysets[index].filter(pk__in=pks)
+             for index, pks in ids.items()], list):
+        posts.update((post.pk, post) for post in shard_posts)
+    object_list = [posts[pk] for _, pk, _ in rows[:per_page] if pk in posts]
+    next_cursor = None
+    if len(rows) > per_page:
+        score, pk, _ = rows[per_page - 1]
+        next_cursor = encode_cursor(score, pk)
+    return CursorPage(object_list, next_cursor, None)
+
+
+def _search_without_index(queryset, query, cursor, per_page):
+    """Поиск без FTS5 (не SQLite): все слова запроса в тексте поста или
+    названии группы, новые посты первыми"""
+    for token in _TOKEN.findall(query):
+        queryset = queryset.filter(
+            Q(text__icontains=token) | Q(group__title__icontains=token))
+    return CursorPaginator(sharding.feed(queryset), per_page).get_page(cursor)
@@ -0,0 +1,338 @@
+"""Шардирование постов и комментариев по автору.
+
+Посты автора лежат в одной из баз POST_SHARDS, выбранной по его id
+(jump consistent hash), комментарии - в базе своего поста. Основная база
+- шард 0, в ней же остаются пользователи, группы, подписки и прочие
+таблицы (шарды получают только копии групп, replicate). Поэтому запросы
+к шарду не соединяются с этими таблицами: ShardQuerySet заменяет
+select_related на prefetch_related из основной базы, а каскады и
+проверки внешних ключей между базами SQLite не работают (у шардов
+PRAGMA foreign_keys = OFF).
+
+Ленты из многих авторов (ScatterQuerySet) запрашивают каждый шард
+отдельно в пуле потоков и сливают отсортированные результаты. С одним
+шардом, по умолчанию, все запросы идут как раньше."""
+import heapq
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from django.db.models import prefetch_related_objects
+
+# модели на шардах: посты по автору, комментарии вместе с постом
+SHARDED_MODELS = frozenset(('posts.post', 'posts.comment'))
+# диапазон id у каждого шарда: записи сохраняют id при переносе между
+# шардами и остаются уникальными во всех базах
+ID_RANGE = 2 ** 40
+
+_lock = threading.Lock()
+_executor = None
+
+
+def shards():
+    return getattr(settings, 'POST_SHARDS', [DEFAULT_DB_ALIAS])
+
+
+def enabled():
+    return len(shards()) > 1
+
+
+def jump_hash(key, buckets):
+    """Номер корзины для key (Lamping, Veach). При добавлении корзины
+    меняют корзину только 1/buckets ключей."""
+    key &= 0xFFFFFFFFFFFFFFFF
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_for(author_id):
+    aliases = shards()
+    return aliases[jump_hash(author_id, len(aliases))]
+
+
+def _is_shard(alias):
+    return alias != DEFAULT_DB_ALIAS and alias in shards()
+
+
+def prepare(alias):
+    """Сдвигает счетчики id таблиц шарда alias в его диапазон"""
+    if not _is_shard(alias):
+        return
+    start = shards().index(alias) * ID_RANGE
+    with connections[alias].cursor() as cursor:
+        for label in SHARDED_MODELS:
+            table = label.replace('.', '_')
+            cursor.execute(
+                'INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s '
+                'WHERE NOT EXISTS '
+                '(SELECT 1 FROM sqlite_sequence WHERE name = %s)',
+                [table, start, table])
+            cursor.execute(
+                'UPDATE sqlite_sequence SET seq = %s '
+                'WHERE name = %s AND seq < %s', [start, table, start])
+
+
+def _related_lookups(queryset):
+    """select_related запроса в виде путей для prefetch_related"""
+    related = queryset.query.select_related
+    if related is True:
+        return [field.name for field in queryset.model._meta.concrete_fields
+                if field.is_relation]
+    lookups = []
+
+    def walk(tree, prefix):
+        for name, nested in tree.items():
+            lookups.append(prefix + name)
+            walk(nested, prefix + name + '__')
+
+    walk(related or {}, '')
+    return lookups
+
+
+def shard_safe(queryset):
+    """queryset, у которого для запроса к шарду select_related заменен
+    на prefetch_related: авторов и группы на шарде не найти, их
+    загружают отдельным запросом из основной базы"""
+    if queryset.query.select_related and _is_shard(queryset.db):
+        return queryset.select_related(None).prefetch_related(
+            *_related_lookups(queryset))
+    return queryset
+
+
+class ShardQuerySet(models.QuerySet):
+    """QuerySet постов: выбор шарда автора и shard_safe при выполнении"""
+
+    def for_author(self, author):
+        """Посты автора author (объект или id) из его шарда"""
+        author_id = getattr(author, 'pk', author)
+        alias = shard_for(author_id)
+        # основную базу выбирает роутер: чтение может идти с реплики
+        queryset = self if alias == DEFAULT_DB_ALIAS else self.using(alias)
+        return queryset.filter(author=author_id)
+
+    def _fetch_all(self):
+        if (self._result_cache is None and self.query.select_related
+                and _is_shard(self.db)):
+            self._prefetch_related_lookups += tuple(
+                _related_lookups(self))
+            self.query.select_related = False
+        super()._fetch_all()
+
+
+class ShardRouter:
+    """Направляет посты в шард автора, комментарии - в шард поста.
+
+    Запросы без объекта-подсказки (Post.objects.filter) идут в основную
+    базу, то есть в шард 0: другие шарды запрашиваются явно через
+    ShardQuerySet.for_author и ScatterQuerySet."""
+
+    def _shard(self, model, instance):
+        label = instance._meta.label_lower
+        if label == 'posts.post':
+            if instance.author_id is None:
+                return instance._state.db
+            if instance._state.adding or not instance._state.db:
+                return shard_for(instance.author_id)
+            return instance._state.db
+        if label == 'posts.comment':
+            post_field = instance._meta.get_field('post')
+            if post_field.is_cached(instance):
+                return self._shard(model, post_field.get_cached_value(
+                    instance))
+            return instance._state.db
+        if (model._meta.label_lower == 'posts.post'
+                and label == settings.AUTH_USER_MODEL.lower()):
+            return shard_for(instance.pk)
+        return None
+
+    def _route(self, model, instance=None, **hints):
+        if instance is None:
+            return None
+        if model._meta.label_lower in SHARDED_MODELS:
+            return self._shard(model, instance)
+        # автор или группа поста из шарда - в основной базе
+        if _is_shard(instance._state.db):
+            return DEFAULT_DB_ALIAS
+        return None
+
+    db_for_read = _route
+    db_for_write = _route
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not _is_shard(db):
+            return None
+        # на шарде нужны все таблицы posts, хотя данные есть только у
+        # постов и комментариев: каскадное удаление поста ищет связанные
+        # записи в его базе. Миграции данных (без model_name) читают
+        # пользователей и на шардах не выполняются, если не помечены
+        # подсказкой shards.
+        return app_label == 'posts' and (
+            model_name is not None or hints.get('shards', False))
+
+
+def _save_copy(instance, alias):
+    model = type(instance)
+    fields = {field.attname: getattr(instance, field.attname)
+              for field in model._meta.concrete_fields
+              if not field.primary_key}
+    # update и bulk_create не посылают сигналов модели
+    rows = model.objects.using(alias)
+    if not rows.filter(pk=instance.pk).update(**fields):
+        rows.bulk_create([model(pk=instance.pk, **fields)])
+
+
+def replicate(instance, deleted=False):
+    """Повторяет сохранение или удаление строки основной базы на всех
+    шардах. Шардам нужны копии групп: название группы поста берут
+    триггеры полнотекстового индекса и поиск без него, а удаление группы
+    обнуляет group_id постов шарда."""
+    for alias in shards():
+        if not _is_shard(alias):
+            continue
+        if deleted:
+            type(instance).objects.using(alias).filter(
+                pk=instance.pk).delete()
+        else:
+            _save_copy(instance, alias)
+
+
+def copy_rows(model, alias):
+    """Заменяет строки model в шарде alias копиями из основной базы"""
+    pks = []
+    for instance in model.objects.using(DEFAULT_DB_ALIAS).iterator():
+        _save_copy(instance, alias)
+        pks.append(instance.pk)
+    model.objects.using(alias).exclude(pk__in=pks).delete()
+
+
+def _pool():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'SHARD_QUERY_WORKERS', 8),
+                thread_name_prefix='shards')
+    return _executor
+
+
+def _call(function, queryset):
+    try:
+        return function(queryset)
+    finally:
+        # у потока пула свое соединение с каждой базой
+        connections[queryset.db].close()
+
+
+def gather(querysets, function):
+    """function(queryset) для каждого запроса: параллельно в пуле, если
+    запросы идут в разные базы, иначе в текущем потоке (и в его
+    транзакции)"""
+    if len({queryset.db for queryset in querysets}) < 2:
+        return [function(queryset) for queryset in querysets]
+    # базу выбирает роутер в потоке запроса: ReplicaMiddleware хранит
+    # свое состояние в нем
+    futures = [_pool().submit(_call, function, queryset.using(queryset.db))
+               for queryset in querysets]
+    return [future.result() for future in futures]
+
+
+class ScatterQuerySet:
+    """Объединение одинаково упорядоченных запросов к разным шардам.
+
+    Поддерживает то, что нужно Paginator и CursorPaginator: count(),
+    filter(), order_by() и срезы. Срез [a:b] берет первые b записей
+    каждого шарда и сливает их k-way merge по ключу сортировки.
+    select_related выполняется один раз для готовой страницы."""
+
+    ordered = True
+
+    def __init__(self, querysets, related=None):
+        if related is None:
+            related = _related_lookups(querysets[0]) if querysets else []
+            querysets = [queryset.select_related(None)
+                         for queryset in querysets]
+        self.querysets = querysets
+        self.related = related
+
+    def _clone(self, querysets):
+        return ScatterQuerySet(querysets, self.related)
+
+    def filter(self, *args, **kwargs):
+        return self._clone([queryset.filter(*args, **kwargs)
+                            for queryset in self.querysets])
+
+    def order_by(self, *fields):
+        return self._clone([queryset.order_by(*fields)
+                            for queryset in self.querysets])
+
+    def none(self):
+        return self._clone([])
+
+    def count(self):
+        return sum(gather(self.querysets, lambda queryset: queryset.count()))
+
+    def _sort_key(self):
+        ordering = self.querysets[0].query.order_by \
+            or self.querysets[0].model._meta.ordering
+        descending = {field.startswith('-') for field in ordering}
+        if not ordering or len(descending) != 1:
+            raise ValueError(
+                'Нужна сортировка в одном направлении, а не %r' % (
+                    ordering,))
+        return attrgetter(*(field.lstrip('-') for field in ordering)), \
+            descending.pop()
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self[key:key + 1][0]
+        if not self.querysets:
+            return []
+        start, stop = key.start or 0, key.stop
+        querysets = self.querysets
+        if stop is not None:
+            querysets = [queryset[:stop] for queryset in querysets]
+        sort_key, reverse = self._sort_key()
+        merged = heapq.merge(*gather(querysets, list),
+                             key=sort_key, reverse=reverse)
+        rows = list(islice(merged, start, stop))
+        if self.related:
+            prefetch_related_objects(rows, *self.related)
+        return rows
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+def per_shard(queryset):
+    """queryset для каждого шарда; основную базу выбирает роутер"""
+    return [queryset if alias == DEFAULT_DB_ALIAS else queryset.using(alias)
+            for alias in shards()]
+
+
+def feed(queryset):
+    """Лента queryset со всех шардов"""
+    if not enabled():
+        return queryset
+    return ScatterQuerySet(per_shard(queryset))
+
+
+def authors_feed(queryset, author_ids):
+    """Посты авторов author_ids: каждый шард получает только своих"""
+    by_shard = defaultdict(list)
+    for author_id in author_ids:
+        by_shard[shard_for(author_id)].append(author_id)
+    return ScatterQuerySet([
+        (queryset if alias == DEFAULT_DB_ALIAS else queryset.using(alias))
+        .filter(author_id__in=ids)
+        for alias, ids in by_shard.items()])
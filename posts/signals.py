@@ -0,0 +1,150 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import (
+    post_delete, post_migrate, post_save, pre_save)
+from django.dispatch import receiver
+
+from . import (
+    feed_cache, following, natural_keys, sharding, thumbnails, timeline)
+from .counters import change_author_stat, change_comment_count
+from .models import USER_MODEL, Comment, Follow, Group, Post
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, using, **kwargs):
+    if created:
+        change_comment_count(instance.post_id, 1, using)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, using, **kwargs):
+    # срабатывает и при каскадном удалении комментариев
+    change_comment_count(instance.post_id, -1, using)
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        change_author_stat(instance.author_id, 'post_count', 1)
+        # при нескольких шардах лента подписок собирается из шардов
+        # (sharding.authors_feed), а не из TimelineEntry
+        if not sharding.enabled():
+            timeline.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    change_author_stat(instance.author_id, 'post_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def post_image_saved(sender, instance, **kwargs):
+    # миниатюра готовится в фоне после коммита, до первого показа поста
+    if instance.image and thumbnails.lookup(instance.image) is None:
+        thumbnails.schedule(instance.image)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    # profile_follow и profile_unfollow меняют подписки через
+    # get_or_create и delete, поэтому счетчики обновляются здесь
+    if created:
+        change_author_stat(instance.author_id, 'follower_count', 1)
+        change_author_stat(instance.user_id, 'following_count', 1)
+        following.invalidate(instance.user_id)
+        if not sharding.enabled():
+            timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    change_author_stat(instance.author_id, 'follower_count', -1)
+    change_author_stat(instance.user_id, 'following_count', -1)
+    following.invalidate(instance.user_id)
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, **kwargs):
+    feed_cache.invalidate(posts_changed=True)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, **kwargs):
+    feed_cache.invalidate()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, using, **kwargs):
+    natural_keys.groups.invalidate(instance)
+    # название группы выводится в карточках постов всех лент
+    feed_cache.invalidate()
+    if sharding.enabled() and using == DEFAULT_DB_ALIAS:
+        sharding.replicate(
+            instance, deleted=kwargs['signal'] is post_delete)
+
+
+# поля автора, которые выводятся в карточках постов и их ссылках
+AUTHOR_CARD_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=USER_MODEL)
+def user_renaming(sender, instance, update_fields=None, **kwargs):
+    instance._card_fields_changed = False
+    if instance._state.adding or update_fields and not set(
+            update_fields) & set(AUTHOR_CARD_FIELDS):
+        return
+    previous = sender.objects.filter(pk=instance.pk).values_list(
+        *AUTHOR_CARD_FIELDS).first()
+    instance._card_fields_changed = previous is not None and previous != tuple(
+        getattr(instance, field) for field in AUTHOR_CARD_FIELDS)
+
+
+@receiver(post_save, sender=USER_MODEL)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    # вход на сайт обновляет только last_login, которого нет в кеше
+    if update_fields and not set(update_fields) & set(
+            natural_keys.users.fields):
+        return
+    natural_keys.users.invalidate(instance)
+    if getattr(instance, '_card_fields_changed', False):
+        # посты в кеше лент хранят автора с прежним именем, а счетчики
+        # записей - под ключом прежнего профиля
+        feed_cache.invalidate(posts_changed=True)
+
+
+@receiver(post_delete, sender=USER_MODEL)
+def user_deleted(sender, instance, **kwargs):
+    natural_keys.users.invalidate(instance)
+    if sharding.enabled():
+        # каскад удалил посты и комментарии только из основной базы.
+        # Удаление комментариев уменьшает счетчики их постов
+        # (comment_deleted)
+        Post.objects.for_author(instance).delete()
+        for alias in sharding.shards():
+            if alias != DEFAULT_DB_ALIAS:
+                Comment.objects.using(alias).filter(
+                    author_id=instance.pk).delete()
+    # у удаленного автора без постов и подписок профиль тоже пропадает
+    feed_cache.invalidate()
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, **kwargs):
+    feed_cache.invalidate_follows()
+
+
+@receiver(post_migrate)
+def database_reset(sender, **kwargs):
+    # migrate и flush меняют данные в обход сигналов моделей
+    feed_cache.bump_generation(feed_cache.FEED_GENERATION)
+    feed_cache.bump_generation(feed_cache.POSTS_GENERATION)
+    feed_cache.bump_generation(feed_cache.FOLLOW_GENERATION)
+
+
+@receiver(post_migrate)
+def shard_migrated(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    sharding.prepare(using)
@@ -0,0 +1,193 @@
+"""Настройка соединений SQLite и повтор записи при блокировке базы.
+
+Каждое новое соединение получает PRAGMA из settings.SQLITE_PRAGMAS: WAL
+позволяет читать во время записи, busy_timeout - ждать блокировку
+вместо немедленной ошибки. Но SQLite возвращает «database is locked»
+без ожидания, если транзакция, начавшаяся с чтения, пытается писать во
+время чужой записи. Поэтому записи из представлений начинают транзакцию
+с BEGIN IMMEDIATE и ждут блокировку заранее, а если она так и не
+получена - повторяются целиком в новой транзакции (retry_on_locked)."""
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import (
+    DEFAULT_DB_ALIAS, OperationalError, connections, transaction)
+
+logger = logging.getLogger(__name__)
+
+PRAGMAS = {
+    # действует только для новой базы, существующую переводит
+    # db_maintain --vacuum; идет первой, пока WAL не записал заголовок
+    'auto_vacuum': 'INCREMENTAL',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # отрицательное значение - размер в КиБ, а не в страницах
+    'cache_size': -64 * 1024,
+}
+
+# сколько раз повторять запись и начальная пауза, которая удваивается
+RETRY_ATTEMPTS = 5
+RETRY_DELAY = 0.05
+
+
+def pragmas(settings_dict=None):
+    """PRAGMA соединения: общие из SQLITE_PRAGMAS и ключ PRAGMAS в
+    настройках конкретной базы (например, у шардов posts.sharding)"""
+    own = (settings_dict or {}).get('PRAGMAS', {})
+    return {**PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {}), **own}
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Обработчик connection_created"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas(connection.settings_dict).items():
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+
+
+def is_locked(error):
+    return isinstance(error, OperationalError) and (
+        'locked' in str(error) or 'busy' in str(error))
+
+
+@contextmanager
+def immediate(using=None):
+    """atomic(using), который сразу берет блокировку записи базы
+    (BEGIN IMMEDIATE). Внутри уже открытой транзакции - обычный
+    atomic()."""
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    def begin():
+        connection.cursor().execute('BEGIN IMMEDIATE')
+
+    connection._start_transaction_under_autocommit = begin
+    try:
+        with transaction.atomic(using=using):
+            # BEGIN уже выполнен, дальше транзакция обычная
+            del connection._start_transaction_under_autocommit
+            yield
+    finally:
+        connection.__dict__.pop('_start_transaction_under_autocommit', None)
+
+
+def retry_on_locked(function):
+    """Выполняет запись function в транзакции и повторяет ее с растущей
+    случайной паузой, пока база заблокирована другой записью.
+
+    Транзакция открывается в основной базе. Если function пишет и в
+    другие базы (шарды posts.sharding), она открывает в них транзакции
+    сама, иначе неудачная попытка оставит там уже записанные строки и
+    повтор создаст дубликаты. Блокировка держится все время function:
+    рендеринг страниц и запись файлов в нее не входят."""
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        delay = RETRY_DELAY
+        for attempt in range(1, RETRY_ATTEMPTS + 1):
+            try:
+                with immediate():
+                    return function(*args, **kwargs)
+            except OperationalError as error:
+                if not is_locked(error) or attempt == RETRY_ATTEMPTS:
+                    raise
+                logger.info('База заблокирована, попытка %s: %s',
+                            attempt, getattr(function, '__qualname__', ''))
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay *= 2
+    return wrapper
+
+
+def _pragma(cursor, name):
+    cursor.execute('PRAGMA %s' % name)
+    return cursor.fetchone()[0]
+
+
+def checkpoint(cursor):
+    """Переносит WAL в базу и обрезает файл журнала. Возвращает
+    (занято ли, страниц в журнале, перенесено страниц)."""
+    cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return cursor.fetchone()
+
+
+def incremental_vacuum(cursor):
+    """Возвращает системе свободные страницы, если база создана с
+    auto_vacuum=INCREMENTAL. Возвращает число освобожденных страниц или
+    None, если режим выключен."""
+    if _pragma(cursor, 'auto_vacuum') != 2:
+        return None
+    before = _pragma(cursor, 'freelist_count')
+    cursor.execute('PRAGMA incremental_vacuum')
+    cursor.fetchall()
+    return before - _pragma(cursor, 'freelist_count')
+
+
+def vacuum(cursor):
+    """Полная перестройка файла; заодно включает auto_vacuum=INCREMENTAL
+    у существующей базы"""
+    cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    cursor.execute('VACUUM')
+
+
+# порядок обхода дерева задает path, страница «не на месте», если она
+# не следует в файле сразу за предыдущей
+_TABLE_STATS = '''
+    SELECT name, COUNT(*), SUM(payload), SUM(unused),
+           SUM(CASE WHEN pageno != previous + 1 THEN 1 ELSE 0 END)
+    FROM (
+        SELECT name, pageno, payload, unused,
+               LAG(pageno) OVER (PARTITION BY name ORDER BY path)
+                   AS previous
+        FROM dbstat
+    )
+    GROUP BY name
+    ORDER BY COUNT(*) DESC
+'''
+
+
+def report(cursor, path=None):
+    """Размер базы и журнала, свободные страницы и по каждой таблице и
+    индексу: страницы, полезные и пустые байты, доля страниц не по
+    порядку (фрагментация)"""
+    page_size = _pragma(cursor, 'page_size')
+    page_count = _pragma(cursor, 'page_count')
+    free = _pragma(cursor, 'freelist_count')
+    result = {
+        'journal_mode': _pragma(cursor, 'journal_mode'),
+        'auto_vacuum': ('none', 'full', 'incremental')[
+            _pragma(cursor, 'auto_vacuum')],
+        'page_size': page_size,
+        'page_count': page_count,
+        'size_bytes': page_size * page_count,
+        'free_pages': free,
+        'free_share': round(free / page_count, 4) if page_count else 0,
+    }
+    if path:
+        wal = path + '-wal'
+        result['wal_bytes'] = os.path.getsize(wal) \
+            if os.path.exists(wal) else 0
+    try:
+        cursor.execute(_TABLE_STATS)
+    except OperationalError:
+        # SQLite собран без dbstat
+        return result
+    result['tables'] = {
+        name: {
+            'pages': pages,
+            'payload_bytes': payload,
+            'unused_bytes': unused,
+            'fragmentation': round(out_of_order / pages, 4),
+        }
+        for name, pages, payload, unused, out_of_order in cursor.fetchall()
+    }
+    return result
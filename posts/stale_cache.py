@@ -0,0 +1,83 @@
+"""Кеш с защитой от лавины пересчетов (stale-while-revalidate).
+
+Значение хранится вместе со сроком свежести (мягкий TTL) и версией, а в
+кеше живет до жесткого TTL. Устаревшее значение пересчитывает только
+запрос, взявший блокировку через cache.add, остальные в это время
+получают старое значение. Значение другой версии не отдается никогда:
+если его нет или версия сменилась, запросы без блокировки недолго ждут
+результат и лишь потом считают сами."""
+import time
+
+from django.core.cache import cache
+
+# во сколько раз жесткий TTL больше мягкого, если он не задан
+HARD_TTL_FACTOR = 10
+# блокировка снимается сама, если пересчитывающий запрос упал
+LOCK_TIMEOUT = 30
+# сколько ждать чужой пересчет, когда отдать нечего, и как часто
+# проверять кеш
+WAIT_TIMEOUT = 2.0
+WAIT_INTERVAL = 0.05
+
+_MISSING = object()
+
+
+def lock_key(key):
+    return 'lock:%s' % key
+
+
+def _fresh(entry, version, now):
+    _, fresh_until, entry_version = entry
+    return entry_version == version and (
+        fresh_until is None or now < fresh_until)
+
+
+def _wait(key, version, using):
+    """Значение версии version, сохраненное запросом с блокировкой, или
+    _MISSING"""
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = using.get(key)
+        if entry is not None and entry[2] == version:
+            return entry[0]
+        if using.get(lock_key(key)) is None:
+            break
+    return _MISSING
+
+
+def get_or_set(key, compute, soft_ttl=None, hard_ttl=None, version=None,
+               using=None, cacheable=None):
+    """Значение по ключу key; compute() вызывается не более чем одним
+    запросом одновременно.
+
+    soft_ttl - сколько секунд значение считается свежим (None - пока не
+    сменится version), hard_ttl - сколько оно хранится и может отдаваться
+    устаревшим. Значение другой версии не отдается: после инвалидации
+    запросы ждут пересчет, а не получают прежние данные. Значения, для
+    которых cacheable(value) ложно, не сохраняются."""
+    using = using or cache
+    if hard_ttl is None and soft_ttl is not None:
+        hard_ttl = soft_ttl * HARD_TTL_FACTOR
+    entry = using.get(key)
+    now = time.time()
+    if entry is not None and _fresh(entry, version, now):
+        return entry[0]
+    lock = lock_key(key)
+    if not using.add(lock, 1, LOCK_TIMEOUT):
+        if entry is not None and entry[2] == version:
+            return entry[0]
+        value = _wait(key, version, using)
+        if value is not _MISSING:
+            return value
+        lock = None
+    try:
+        value = compute()
+        if cacheable is None or cacheable(value):
+            fresh_until = None if soft_ttl is None \
+                else time.time() + soft_ttl
+            using.set(key, (value, fresh_until, version), hard_ttl)
+    finally:
+        if lock is not None:
+            using.delete(lock)
+    return value
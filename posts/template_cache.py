@@ -0,0 +1,183 @@
+"""Скомпилированные шаблоны на диске.
+
+Новый процесс сервера разбирает base.html, include и шаблоны страниц
+заново при первом запросе к каждой странице. Команда warm_templates
+заранее компилирует шаблоны проекта и сохраняет деревья узлов в файл
+TEMPLATE_CACHE_FILE. Loader читает файл при запуске процесса и берет
+шаблон из него, если совпадают хеш исходника, версия Django и хеш
+библиотек тегов (узлы строят их функции компиляции), иначе компилирует
+шаблон как обычно.
+
+Файл - pickle: он должен создаваться только при деплое, как и код."""
+import hashlib
+import io
+import logging
+import os
+import pickle
+from importlib import import_module
+
+import django
+from django.conf import settings
+from django.template import Template, TemplateDoesNotExist, engines
+from django.template.backends.django import DjangoTemplates
+from django.template.loaders import base, cached
+from django.template.smartif import OPERATORS, TokenBase
+
+logger = logging.getLogger(__name__)
+
+
+def cache_file():
+    return getattr(settings, 'TEMPLATE_CACHE_FILE', None)
+
+
+def libraries_digest(engine):
+    """Хеш исходников встроенных и подключаемых библиотек тегов движка"""
+    digest = hashlib.sha256()
+    for path in sorted({*engine.builtins, *engine.libraries.values()}):
+        digest.update(path.encode())
+        with open(import_module(path).__file__, 'rb') as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+def source_key(origin, source, libraries):
+    """Ключ шаблона: путь, хеш исходника, версия Django и хеш библиотек
+    тегов libraries"""
+    digest = hashlib.sha256(source.encode()).hexdigest()
+    return '%s:%s:%s:%s' % (
+        origin.name, digest, django.get_version(), libraries)
+
+
+def _operator(operator_id, first, second):
+    operator = OPERATORS[operator_id]()
+    operator.first, operator.second = first, second
+    return operator
+
+
+class _Pickler(pickle.Pickler):
+    def reducer_override(self, obj):
+        # операторы {% if %} - экземпляры классов, созданных внутри
+        # функций smartif, и pickle не находит эти классы по имени
+        if isinstance(obj, TokenBase) and obj.id in OPERATORS:
+            return _operator, (obj.id, obj.first, obj.second)
+        return NotImplemented
+
+
+def dumps(template):
+    # движок и загрузчики процесса не сохраняются: узлы ссылаются на
+    # них через template.engine и общий объект origin
+    engine, loader = template.engine, template.origin.loader
+    template.engine = template.origin.loader = None
+    try:
+        buffer = io.BytesIO()
+        _Pickler(buffer, pickle.HIGHEST_PROTOCOL).dump(template)
+        return buffer.getvalue()
+    finally:
+        template.engine, template.origin.loader = engine, loader
+
+
+def loads(data, origin, engine):
+    template = pickle.loads(data)
+    template.engine = engine
+    template.origin.loader = origin.loader
+    return template
+
+
+def read(path):
+    """{ключ: (имя шаблона, pickle)} из файла path, пустой словарь, если файла
+    нет или он поврежден"""
+    try:
+        with open(path, 'rb') as source:
+            return pickle.load(source)
+    except FileNotFoundError:
+        return {}
+    except Exception:
+        logger.exception('Не удалось прочитать шаблоны из %s', path)
+        return {}
+
+
+def write(path, templates):
+    """Атомарно записывает {ключ: шаблон} в path"""
+    data = {key: (template.origin.template_name, dumps(template))
+            for key, template in templates.items()}
+    temporary = '%s.%s.tmp' % (path, os.getpid())
+    with open(temporary, 'wb') as target:
+        pickle.dump(data, target, pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+
+
+class _PersistedCompiler(base.Loader):
+    # стоит в MRO после cached.Loader: тот вызывает super().get_template
+    # только для шаблонов, которых еще нет в памяти процесса
+    def get_template(self, template_name, skip=None):
+        tried = []
+        for origin in self.get_template_sources(template_name):
+            if skip is not None and origin in skip:
+                tried.append((origin, 'Skipped'))
+                continue
+            try:
+                source = self.get_contents(origin)
+            except TemplateDoesNotExist:
+                tried.append((origin, 'Source does not exist'))
+                continue
+            return self.compile(origin, source)
+        raise TemplateDoesNotExist(template_name, tried=tried)
+
+
+class Loader(cached.Loader, _PersistedCompiler):
+    """cached.Loader, который берет скомпилированные шаблоны из файла
+    TEMPLATE_CACHE_FILE. Все шаблоны процесса собираются в self.compiled
+    для записи командой warm_templates."""
+
+    def __init__(self, engine, loaders):
+        super().__init__(engine, loaders)
+        path = cache_file()
+        self.persisted = read(path) if path else {}
+        self.libraries = libraries_digest(engine)
+        self.compiled = {}
+        self.hits = 0
+
+    def compile(self, origin, source):
+        key = source_key(origin, source, self.libraries)
+        template = None
+        if key in self.persisted:
+            try:
+                template = loads(self.persisted[key][1], origin, self.engine)
+            except Exception:
+                logger.exception('Не удалось загрузить шаблон %s', key)
+            else:
+                self.hits += 1
+        if template is None:
+            template = Template(
+                source, origin, origin.template_name, self.engine)
+        self.compiled[key] = template
+        return template
+
+    def reset(self):
+        super().reset()
+        self.compiled.clear()
+        self.hits = 0
+
+
+def loaders():
+    """Загрузчики Loader движков DjangoTemplates"""
+    for engine in engines.all():
+        if isinstance(engine, DjangoTemplates):
+            for loader in engine.engine.template_loaders:
+                if isinstance(loader, Loader):
+                    yield loader
+
+
+def preload():
+    """Загружает в память процесса шаблоны из TEMPLATE_CACHE_FILE, чтобы
+    первые запросы к страницам их не компилировали. Возвращает число
+    загруженных шаблонов."""
+    count = 0
+    for loader in loaders():
+        for name in sorted({name for name, _ in loader.persisted.values()}):
+            try:
+                loader.get_template(name)
+            except TemplateDoesNotExist:
+                continue
+            count += 1
+    return count
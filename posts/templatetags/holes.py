@@ -0,0 +1,42 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts import page_cache
+
+register = template.Library()
+
+
+class HoleNode(template.Node):
+    def __init__(self, nodelist, name, args):
+        self.nodelist = nodelist
+        self.name = name
+        self.args = args
+
+    def render(self, context):
+        content = self.nodelist.render(context)
+        request = context.get('request')
+        if not getattr(request, 'page_cache', False):
+            return content
+        args = [arg.resolve(context) for arg in self.args]
+        return mark_safe(
+            page_cache.open_marker(self.name.resolve(context), args)
+            + content + page_cache.close_marker())
+
+
+@register.tag
+def hole(parser, token):
+    """Часть страницы, зависящая от пользователя.
+
+    {% hole <имя> [аргументы...] %}...{% endhole %}
+
+    На страницах из кеша целых страниц содержимое заменяется функцией
+    page_cache.HOLES[<имя>] с этими аргументами, на остальных выводится
+    как есть."""
+    nodelist = parser.parse(('endhole',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 2:
+        raise template.TemplateSyntaxError(
+            '%r tag requires a hole name.' % tokens[0])
+    return HoleNode(nodelist, parser.compile_filter(tokens[1]),
+                    [parser.compile_filter(arg) for arg in tokens[2:]])
@@ -0,0 +1,11 @@
+from django import template
+
+from posts.pagination import page_window as get_page_window
+
+register = template.Library()
+
+
+@register.filter
+def page_window(page):
+    """Номера страниц вокруг текущей вместо всего page_range"""
+    return get_page_window(page)
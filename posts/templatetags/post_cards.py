@@ -0,0 +1,33 @@
+from django import template
+from django.utils.html import format_html_join
+
+from posts import fragments
+
+register = template.Library()
+
+CARD_WRAPPER = '<div class="card mb-3 mt-1 shadow-sm">{}</div>'
+
+
+def _cards(posts, context):
+    missing = [post for post in posts
+               if not getattr(post, 'card_html', None)]
+    if missing:
+        fragments.attach_cards(missing, context.get('request'))
+    return format_html_join(
+        '\n', CARD_WRAPPER, ((post.card_html,) for post in posts))
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """Карточки постов ленты одним тегом вместо {% for %} с
+    {% include %} на каждый пост.
+
+    Обычно view уже прикрепил карточки (fragments.attach_cards), иначе
+    недостающие рендерятся здесь все сразу."""
+    return _cards(list(posts), context)
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """Карточка одного поста, например на странице поста"""
+    return _cards([post], context)
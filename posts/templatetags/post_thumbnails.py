@@ -0,0 +1,31 @@
+import logging
+
+from django import template
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from posts import thumbnails
+
+logger = logging.getLogger(__name__)
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(image):
+    """Миниатюра для карточки поста, если она уже создана.
+
+    Страница никогда не обрабатывает исходное изображение сама: при
+    отсутствии миниатюры создание ставится в фоновую очередь, а шаблон
+    показывает заглушку."""
+    if not image:
+        return None
+    try:
+        thumbnail = thumbnails.lookup(image)
+        if thumbnail is None:
+            thumbnails.schedule(image)
+    except Exception:
+        # как и теги sorl, ошибки миниатюр не ломают страницу
+        if sorl_settings.THUMBNAIL_DEBUG:
+            raise
+        logger.exception('Не удалось получить миниатюру %s', image)
+        return None
+    return thumbnail
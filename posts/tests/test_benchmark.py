@@ -0,0 +1,78 @@
+import json
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from posts.benchmark import compare, percentile
+from posts.models import Follow, Group, Post, USER_MODEL
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = USER_MODEL.objects.create_user(username='bench_author')
+        cls.reader = USER_MODEL.objects.create_user(username='bench_reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='bench', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group)
+
+    def benchmark(self, **options):
+        stdout = StringIO()
+        call_command(
+            'benchmark_views', repeat=2, warmup=0, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_reports_every_route(self):
+        report = json.loads(self.benchmark())
+        for name in ('index', 'follow_index', 'post', 'post_edit', 'search',
+                     'signup', 'about:author', 'about:tech'):
+            with self.subTest(name=name):
+                self.assertIn(name, report)
+                self.assertEqual(
+                    set(report[name]),
+                    {'url', 'status', 'p50', 'p95', 'p99', 'queries',
+                     'db_time', 'render_time'})
+        self.assertEqual(report['index']['status'], 200)
+        self.assertGreater(report['index']['render_time'], 0)
+        # изменения, сделанные страницами подписки, откатываются
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.author).exists())
+
+    def test_fails_on_regression(self):
+        report = json.loads(self.benchmark())
+        for stats in report.values():
+            stats['p95'] = 0
+            stats['queries'] = 0
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as baseline:
+            json.dump(report, baseline)
+            baseline.flush()
+            with self.assertRaises(CommandError):
+                self.benchmark(baseline=baseline.name, min_delta=0)
+
+    def test_card_render_time(self):
+        stdout = StringIO()
+        call_command('benchmark_cards', repeat=2, stdout=stdout)
+        report = json.loads(stdout.getvalue())
+        self.assertEqual(report['cards'], 1)
+        self.assertGreater(report['before'], 0)
+        self.assertGreater(report['after'], 0)
+
+    def test_compare(self):
+        baseline = {'index': {'p95': 10.0, 'queries': 3}}
+        self.assertEqual(
+            compare({'index': {'p95': 11.5, 'queries': 3}}, baseline, 0.2),
+            [])
+        self.assertEqual(len(compare(
+            {'index': {'p95': 13.0, 'queries': 4}}, baseline, 0.2)), 2)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([5], 95), 5)
@@ -1,8 +1,12 @@
+from unittest import mock
+
 from django.core.cache import cache
-from django.test import TestCase, Client
+from django.template import RequestContext
+from django.test import TestCase, Client, RequestFactory
 from django.urls import reverse
 
-from posts.models import USER_MODEL, Group, Post
+from posts.fragments import attach_cards, card_key, card_urls
+from posts.models import USER_MODEL, Comment, Group, Post
 
 
 class PostsPagesTests(TestCase):
@@ -19,16 +23,121 @@ class PostsPagesTests(TestCase):
             description='Описание тестовой группы',
         )
 
+    def setUp(self):
+        cache.clear()
+
     def test_cache(self):
-        """Тестирование кеширования главной страницы"""
-        response_first = self.guest_client.get(
-            reverse('index'))
-        uncached_post = Post.objects.create(
+        """Главная страница берется из кеша, пока данные не изменились"""
+        Post.objects.create(
+            text='Кешированный пост', group=self.group, author=self.user)
+        self.guest_client.get(reverse('index'))
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Кешированный пост')
+
+    def test_cache_invalidated_by_new_post(self):
+        """Новый пост сразу появляется на закешированных страницах"""
+        urls = (
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.user.username}),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        new_post = Post.objects.create(
             text='Некешированный пост',
             group=self.group,
             author=self.user)
-        self.assertNotContains(response_first, uncached_post.text)
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, new_post.text)
+
+    def test_cache_invalidated_by_comment(self):
+        """Новый комментарий обновляет счетчик на закешированной странице"""
+        post = Post.objects.create(text='Пост', author=self.user)
+        self.guest_client.get(reverse('index'))
+        Comment.objects.create(post=post, author=self.user, text='Текст')
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Комментариев: 1')
+
+    def test_cache_is_page_aware(self):
+        """Вторая страница не отдается из кеша первой"""
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.user) for i in range(15))
+        first = self.guest_client.get(reverse('index'))
+        second = self.guest_client.get(reverse('index'), {'page': 2})
+        self.assertEqual(len(second.context['page']), 5)
+        self.assertNotEqual(
+            list(first.context['page'])[:5], list(second.context['page']))
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = USER_MODEL.objects.create_user(username='card_author')
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.guest_client = Client()
+        cls.post = Post.objects.create(
+            text='Текст карточки', author=cls.author)
+
+    def setUp(self):
         cache.clear()
-        response_second = self.guest_client.get(
-            reverse('index'))
-        self.assertContains(response_second, uncached_post.text)
+        self.post.refresh_from_db()
+
+    def test_card_is_cached(self):
+        """Карточка поста сохраняется в кеш по id и версии содержимого"""
+        self.guest_client.get(reverse('index'))
+        self.assertIn('Текст карточки', cache.get(card_key(self.post)))
+
+    def test_card_changes_with_post(self):
+        """Отредактированный пост получает новую карточку"""
+        self.guest_client.get(reverse('index'))
+        self.post.text = 'Новый текст карточки'
+        self.post.save()
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Новый текст карточки')
+
+    def test_edit_button_not_cached(self):
+        """Кнопка «Редактировать» видна только автору поста"""
+        urls = (
+            reverse('index'),
+            reverse('profile', kwargs={'username': self.author.username}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.author_client.get(url)
+                self.assertContains(response, 'Редактировать')
+                response = self.guest_client.get(url)
+                self.assertNotContains(response, 'Редактировать')
+
+    def test_actions_rendered_in_one_context(self):
+        """Контекстные процессоры для кнопок выполняются один раз на
+        страницу, а не на каждую карточку"""
+        posts = [self.post] + [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(2)]
+        request = RequestFactory().get('/')
+        request.user = self.author
+        bind = RequestContext.bind_template
+        with mock.patch.object(RequestContext, 'bind_template',
+                               autospec=True, side_effect=bind) as patched:
+            attach_cards(posts, request)
+        self.assertEqual(patched.call_count, 1)
+        for post in posts:
+            self.assertIn('Редактировать', post.card_html)
+
+    def test_card_urls_match_reverse(self):
+        """Адреса карточки совпадают с reverse() для любых имен"""
+        author = USER_MODEL(username='a.b+c@d-e_1')
+        group = Group(title='Группа', slug='slug_1-2')
+        post = Post(pk=98765, author=author, group=group)
+        self.assertEqual(card_urls([post]), [{
+            'profile': reverse('profile', args=[author.username]),
+            'group': reverse('group_posts', args=[group.slug]),
+            'post': reverse('post', args=[author.username, post.pk]),
+        }])
+        post.group = None
+        self.assertEqual(card_urls([post])[0]['group'], '')
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from yatube.sqlite_cache import SQLiteCache
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.backend()
+
+    def backend(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_cache_api(self):
+        cache = self.cache
+        cache.set('key', {'value': [1, 2]})
+        self.assertEqual(cache.get('key'), {'value': [1, 2]})
+        self.assertIsNone(cache.get('missing'))
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertTrue(cache.add('new', 'value'))
+        cache.set_many({'a': 1, 'b': 'два'})
+        self.assertEqual(
+            cache.get_many(['a', 'b', 'missing']), {'a': 1, 'b': 'два'})
+        cache.delete_many(['a', 'b'])
+        self.assertEqual(cache.get_many(['a', 'b']), {})
+        self.assertTrue(cache.has_key('key'))
+        cache.delete('key')
+        self.assertFalse(cache.has_key('key'))
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+    def test_expiration(self):
+        self.cache.set('short', 'value', 0.05)
+        self.cache.set('forever', 'value', None)
+        self.assertTrue(self.cache.add('expired', 'old', 0.05))
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertEqual(self.cache.get('forever'), 'value')
+        self.assertTrue(self.cache.add('expired', 'new'))
+        self.assertEqual(self.cache.get('expired'), 'new')
+
+    def test_shared_between_instances(self):
+        """Запись одного процесса сразу видна другому"""
+        other = self.backend()
+        self.cache.set('generation', 1)
+        self.assertEqual(other.get('generation'), 1)
+        other.delete('generation')
+        self.assertIsNone(self.cache.get('generation'))
+
+    def test_incr_is_atomic(self):
+        self.cache.set('counter', 0)
+        caches = [self.backend() for _ in range(4)]
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            for cache in caches:
+                pool.submit(lambda c=cache: [c.incr('counter')
+                                             for _ in range(50)])
+        self.assertEqual(self.cache.get('counter'), 200)
+        self.assertEqual(self.cache.incr('counter', -10), 190)
+
+    def test_lru_eviction(self):
+        cache = self.backend(MAX_ENTRIES=10)
+        for i in range(10):
+            cache.set(f'key{i}', i)
+        # ключ key0 читался последним и не должен быть вытеснен
+        time.sleep(1.1)
+        cache.get('key0')
+        cache.set('key10', 10)
+        self.assertEqual(cache.get('key0'), 0)
+        self.assertIsNone(cache.get('key1'))
+        stats = cache.stats()
+        self.assertLessEqual(stats['entries'], 10)
+        self.assertGreater(stats['evictions'], 0)
+
+    def test_no_entry_limit(self):
+        cache = self.backend(MAX_ENTRIES=None)
+        cache.set_many({f'key{i}': i for i in range(400)})
+        self.assertEqual(cache.stats()['entries'], 400)
+        self.assertEqual(cache.stats()['evictions'], 0)
+
+    def test_size_limit(self):
+        cache = self.backend(MAX_SIZE=10000)
+        for i in range(20):
+            cache.set(f'key{i}', 'x' * 1000)
+        self.assertLessEqual(cache.stats()['bytes'], 10000)
+        self.assertIsNotNone(cache.get('key19'))
+
+    def test_stats(self):
+        self.cache.set('key', 'value')
+        self.cache.get('key')
+        self.cache.get_many(['key', 'missing'])
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+        self.assertEqual(stats['entries'], 1)
+
+    def test_cache_stats_command(self):
+        caches = {'default': {
+            'BACKEND': 'yatube.sqlite_cache.SQLiteCache',
+            'LOCATION': self.path,
+        }}
+        with override_settings(CACHES=caches):
+            stdout = StringIO()
+            call_command('cache_stats', stdout=stdout)
+        self.assertIn('"evictions"', stdout.getvalue())
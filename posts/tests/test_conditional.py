@@ -0,0 +1,143 @@
+import datetime as dt
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+
+from posts import conditional, feed_cache, stale_cache
+from posts.models import USER_MODEL, Comment, Group, Post
+
+
+@mock.patch.object(conditional, 'MODIFIED_RESOLUTION', 0)
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = USER_MODEL.objects.create_user(username='etag_author')
+        cls.post = Post.objects.create(text='Текст', author=cls.author)
+        cls.guest_client = Client()
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.post_url = reverse('post', kwargs={
+            'username': cls.author.username, 'post_id': cls.post.pk})
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_not_modified(self):
+        urls = (
+            reverse('index'),
+            reverse('profile', kwargs={'username': self.author.username}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_feed_modified_by_new_post(self):
+        # прошлое изменение - раньше текущей секунды
+        cache.set(feed_cache.MODIFIED, time.time() - 10, None)
+        response = self.guest_client.get(reverse('index'))
+        Post.objects.create(text='Новый пост', author=self.author)
+        for headers in ({'HTTP_IF_NONE_MATCH': response['ETag']},
+                        {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']}):
+            with self.subTest(headers=headers):
+                self.assertEqual(self.guest_client.get(
+                    reverse('index'), **headers).status_code, 200)
+
+    def test_validators_depend_on_user(self):
+        """ETag разный у гостя и автора, Last-Modified только у гостя"""
+        guest = self.guest_client.get(reverse('index'))
+        author = self.author_client.get(reverse('index'))
+        self.assertNotEqual(guest['ETag'], author['ETag'])
+        self.assertTrue(guest.has_header('Last-Modified'))
+        self.assertFalse(author.has_header('Last-Modified'))
+        response = self.author_client.get(
+            reverse('index'), HTTP_IF_NONE_MATCH=guest['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_follow_index_not_modified(self):
+        etag = self.author_client.get(reverse('follow_index'))['ETag']
+        response = self.author_client.get(
+            reverse('follow_index'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_post_not_modified(self):
+        response = self.guest_client.get(self.post_url)
+        with self.assertNumQueries(1):
+            not_modified = self.guest_client.get(
+                self.post_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        not_modified = self.guest_client.get(
+            self.post_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_post_modified_by_comment(self):
+        response = self.guest_client.get(self.post_url)
+        comment = Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        Comment.objects.filter(pk=comment.pk).update(
+            created=self.post.pub_date + dt.timedelta(seconds=5))
+        self.assertEqual(self.guest_client.get(
+            self.post_url,
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code,
+            200)
+
+    def test_post_modified_by_edit(self):
+        response = self.guest_client.get(self.post_url)
+        Post.objects.filter(pk=self.post.pk).update(text='Правка')
+        self.assertEqual(self.guest_client.get(
+            self.post_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+            200)
+
+    def test_post_last_modified_follows_changes(self):
+        """Правка поста, удаление комментария и переименование группы
+        меняют Last-Modified страницы поста"""
+        group = Group.objects.create(title='Группа', slug='etag-group')
+        comment = Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        changes = {
+            'edit': lambda: Post.objects.get(pk=self.post.pk).save(),
+            'group': lambda: group.save(),
+            'comment': lambda: comment.delete(),
+        }
+        # пост и комментарий опубликованы раньше текущей секунды
+        past = self.post.pub_date - dt.timedelta(seconds=10)
+        Post.objects.filter(pk=self.post.pk).update(
+            group=group, pub_date=past)
+        Comment.objects.filter(pk=comment.pk).update(created=past)
+        for name, change in changes.items():
+            with self.subTest(change=name):
+                # прошлое изменение - раньше текущей секунды
+                cache.set(feed_cache.MODIFIED, time.time() - 10, None)
+                response = self.guest_client.get(self.post_url)
+                change()
+                self.assertEqual(self.guest_client.get(
+                    self.post_url,
+                    HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                ).status_code, 200)
+
+    def test_missing_post(self):
+        url = reverse('post', kwargs={
+            'username': self.author.username, 'post_id': 0})
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_during_recompute_is_current(self):
+        """Пока страницу пересчитывает другой запрос, ответ все равно
+        содержит новые данные и их ETag"""
+        self.guest_client.get(reverse('index'))
+        Post.objects.create(text='Новый пост', author=self.author)
+        with mock.patch.object(cache, 'add', return_value=False), \
+                mock.patch.object(stale_cache, 'WAIT_TIMEOUT', 0.1):
+            response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Новый пост')
+        self.assertEqual(response['ETag'], self.guest_client.get(
+            reverse('index'))['ETag'])
@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.following import following_ids, is_following
+from posts.models import Follow, Post, USER_MODEL
+
+
+class FollowingSetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = USER_MODEL.objects.create_user(username='set_reader')
+        cls.authors = [
+            USER_MODEL.objects.create_user(username=f'set_author_{i}')
+            for i in range(3)
+        ]
+        cls.client_reader = Client()
+        cls.client_reader.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_set_is_sorted_and_cached(self):
+        for author in reversed(self.authors[:2]):
+            Follow.objects.create(user=self.reader, author=author)
+        expected = sorted(author.pk for author in self.authors[:2])
+        self.assertEqual(list(following_ids(self.reader)), expected)
+        with self.assertNumQueries(0):
+            self.assertTrue(is_following(self.reader, self.authors[0].pk))
+            self.assertFalse(is_following(self.reader, self.authors[2].pk))
+
+    def test_follow_views_update_set(self):
+        """Подписка и отписка сразу видны в профиле"""
+        author = self.authors[0]
+        profile = reverse('profile', args=[author.username])
+        self.assertFalse(
+            self.client_reader.get(profile).context['following'])
+        self.client_reader.get(
+            reverse('profile_follow', args=[author.username]))
+        self.assertTrue(self.client_reader.get(profile).context['following'])
+        self.client_reader.get(
+            reverse('profile_unfollow', args=[author.username]))
+        self.assertFalse(
+            self.client_reader.get(profile).context['following'])
+
+    def test_follow_index_without_follows_skips_feed_queries(self):
+        Post.objects.create(text='Пост', author=self.authors[0])
+        following_ids(self.reader)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client_reader.get(reverse('follow_index'))
+        self.assertEqual(len(response.context['page']), 0)
+        self.assertFalse(any(
+            'posts_timelineentry' in query['sql']
+            for query in context.captured_queries))
+
+    def test_set_is_not_shared_with_new_user_with_same_id(self):
+        """Запись в кеше не достается новому пользователю с тем же id"""
+        user = USER_MODEL.objects.create_user(username='set_gone')
+        Follow.objects.create(user=user, author=self.authors[0])
+        self.assertEqual(list(following_ids(user)), [self.authors[0].pk])
+        # подписки и дата регистрации меняются в обход сигналов, как у
+        # нового пользователя, получившего тот же id
+        Follow.objects.filter(user=user).update(author=self.authors[1])
+        USER_MODEL.objects.filter(pk=user.pk).update(
+            date_joined=user.date_joined.replace(year=2000))
+        user.refresh_from_db()
+        self.assertEqual(list(following_ids(user)), [self.authors[1].pk])
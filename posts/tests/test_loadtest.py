@@ -0,0 +1,51 @@
+from urllib.parse import parse_qs
+
+from django.test import SimpleTestCase
+
+from posts import loadtest
+
+
+def application(environ, start_response):
+    """Минимальное WSGI-приложение: выдает CSRF-cookie и проверяет его в
+    POST, как это делает CsrfViewMiddleware"""
+    headers = [('Content-Type', 'text/plain')]
+    status = '200 OK'
+    if environ['REQUEST_METHOD'] == 'POST':
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        form = parse_qs(environ['wsgi.input'].read(length).decode())
+        token = form.get('csrfmiddlewaretoken', [''])[0]
+        status = '302 Found' if token and f'csrftoken={token}' in \
+            environ.get('HTTP_COOKIE', '') else '403 Forbidden'
+    elif environ['PATH_INFO'] == '/new/':
+        headers.append(('Set-Cookie', 'csrftoken=secret; Path=/'))
+    start_response(status, headers)
+    return [b'ok']
+
+
+class LoadTestHarnessTests(SimpleTestCase):
+    def setUp(self):
+        self.server = loadtest.serve(application)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_clients_drive_mix(self):
+        targets = {'posts': [('author', 1)], 'authors': ['author']}
+        samples = loadtest.run_clients(
+            self.server.server_address, [{'sessionid': 'a'}, {}], targets,
+            loadtest.parse_mix('index=1,add_comment=1'), duration=30,
+            max_requests=10)
+        self.assertEqual(len(samples), 20)
+        report = loadtest.summarize(samples, elapsed=2)
+        self.assertEqual(report['total']['requests'], 20)
+        self.assertEqual(report['total']['rps'], 10)
+        self.assertEqual(report['total']['errors'], 0)
+        self.assertEqual(
+            set(report['total']['statuses']) - {'200', '302'}, set())
+        self.assertIn('p99', report['index'])
+
+    def test_parse_mix(self):
+        self.assertEqual(
+            loadtest.parse_mix('index=3, new_post'),
+            {'index': 3.0, 'new_post': 1.0})
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix('drop_table=1')
@@ -1,5 +1,9 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase, Client
-from posts.models import Post, Group, USER_MODEL
+from posts.models import (AuthorStats, Comment, Follow, Group, Post,
+                          USER_MODEL)
 
 
 class PostsModelTest(TestCase):
@@ -55,3 +59,76 @@ class PostsModelTest(TestCase):
         group = PostsModelTest.group
         title = str(group)
         self.assertEqual(title, group.title)
+
+
+class CommentCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(username='counter')
+        cls.post = Post.objects.create(text='Текст', author=cls.user)
+
+    def comment_count(self):
+        self.post.refresh_from_db()
+        return self.post.comment_count
+
+    def test_comment_count_follows_comments(self):
+        """comment_count растет при добавлении и падает при удалении"""
+        first = Comment.objects.create(
+            post=self.post, author=self.user, text='1')
+        Comment.objects.create(post=self.post, author=self.user, text='2')
+        self.assertEqual(self.comment_count(), 2)
+        first.delete()
+        self.assertEqual(self.comment_count(), 1)
+        self.post.comments.all().delete()
+        self.assertEqual(self.comment_count(), 0)
+
+    def test_rebuild_counters(self):
+        """Команда rebuild_counters восстанавливает comment_count"""
+        Comment.objects.create(post=self.post, author=self.user, text='1')
+        Post.objects.update(comment_count=10)
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(self.comment_count(), 1)
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = USER_MODEL.objects.create_user(username='stats_author')
+        cls.reader = USER_MODEL.objects.create_user(username='stats_reader')
+
+    def stats(self, user):
+        return AuthorStats.objects.filter(author=user).values_list(
+            'post_count', 'follower_count', 'following_count').first()
+
+    def test_stats_follow_posts_and_follows(self):
+        """Счетчики меняются при создании и удалении постов и подписок"""
+        post = Post.objects.create(text='Текст', author=self.author)
+        Post.objects.create(text='Текст', author=self.author)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author), (2, 1, 0))
+        self.assertEqual(self.stats(self.reader), (0, 0, 1))
+        post.delete()
+        follow.delete()
+        self.assertEqual(self.stats(self.author), (1, 0, 0))
+        self.assertEqual(self.stats(self.reader), (0, 0, 0))
+
+    def test_user_can_be_deleted(self):
+        """Каскадное удаление постов и подписок не мешает удалить автора"""
+        author = USER_MODEL.objects.create_user(username='stats_deleted')
+        Post.objects.create(text='Текст', author=author)
+        Follow.objects.create(user=self.reader, author=author)
+        author_id = author.pk
+        author.delete()
+        self.assertFalse(AuthorStats.objects.filter(author_id=author_id))
+        self.assertEqual(self.stats(self.reader), (0, 0, 0))
+
+    def test_rebuild_counters(self):
+        """Команда rebuild_counters восстанавливает AuthorStats"""
+        Post.objects.create(text='Текст', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.all().delete()
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(self.stats(self.author), (1, 1, 0))
+        self.assertEqual(self.stats(self.reader), (0, 0, 1))
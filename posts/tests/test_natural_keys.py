@@ -0,0 +1,85 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import USER_MODEL, Group, Post
+from posts.natural_keys import groups, users
+
+
+class NaturalKeyCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(
+            username='natural_user', password='secret')
+        cls.group = Group.objects.create(
+            title='Группа', slug='natural-group', description='Описание')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_found_object_cached(self):
+        self.assertEqual(groups.get('natural-group'), self.group)
+        with self.assertNumQueries(0):
+            self.assertEqual(groups.get('natural-group'), self.group)
+
+    def test_missing_object_cached(self):
+        """Отсутствующий объект ищется в базе один раз, а созданный
+        сразу находится"""
+        self.assertIsNone(users.get('natural_nobody'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(users.get('natural_nobody'))
+        created = USER_MODEL.objects.create_user(username='natural_nobody')
+        self.assertEqual(users.get('natural_nobody'), created)
+
+    def test_rename_invalidates_previous_value(self):
+        group = Group.objects.create(title='Старая', slug='natural-old')
+        groups.get('natural-old')
+        group.slug = 'natural-new'
+        group.save()
+        self.assertIsNone(groups.get('natural-old'))
+        self.assertEqual(groups.get('natural-new').pk, group.pk)
+
+    def test_delete_invalidates(self):
+        group = Group.objects.create(title='Удаляемая', slug='natural-gone')
+        groups.get('natural-gone')
+        Group.objects.filter(pk=group.pk).delete()
+        self.assertIsNone(groups.get('natural-gone'))
+
+    def test_login_keeps_cached_user(self):
+        users.get(self.user.username)
+        self.user.last_login = timezone.now()
+        self.user.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            users.get(self.user.username)
+
+    def test_rename_updates_cached_feeds(self):
+        """Посты переименованного автора в лентах из кеша показывают
+        новое имя и ссылки на новый профиль"""
+        author = USER_MODEL.objects.create_user(username='natural_old')
+        Post.objects.create(text='Пост автора', author=author)
+        client = Client()
+        self.assertContains(client.get(reverse('index')), '@natural_old')
+        author.username = 'natural_renamed'
+        author.save()
+        response = client.get(reverse('index'))
+        self.assertNotContains(response, 'natural_old')
+        self.assertContains(response, reverse(
+            'profile', args=['natural_renamed']))
+
+    def test_password_not_cached(self):
+        user = users.get(self.user.username)
+        self.assertIn('password', user.get_deferred_fields())
+
+    def test_missing_pages_do_not_reach_database(self):
+        client = Client()
+        urls = (
+            reverse('group_posts', kwargs={'slug': 'natural-missing'}),
+            reverse('profile', kwargs={'username': 'natural_missing'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(client.get(url).status_code, 404)
+                with self.assertNumQueries(0):
+                    self.assertEqual(client.get(url).status_code, 404)
@@ -0,0 +1,166 @@
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase
+from django.urls import resolve, reverse
+
+from posts import page_cache
+from posts.models import USER_MODEL, Follow, Post
+
+
+def cached_key(url):
+    request = RequestFactory().get(url)
+    request.resolver_match = resolve(request.path)
+    return page_cache.make_key(request, 'default')
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = USER_MODEL.objects.create_user(
+            username='page_author', first_name='Автор')
+        cls.reader = USER_MODEL.objects.create_user(username='page_reader')
+        cls.post = Post.objects.create(text='Текст поста', author=cls.author)
+        cls.guest_client = Client()
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+        cls.post_url = reverse('post', kwargs={
+            'username': cls.author.username, 'post_id': cls.post.pk})
+        cls.profile_url = reverse(
+            'profile', kwargs={'username': cls.author.username})
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_page_from_cache(self):
+        """Повторный запрос гостя не обращается к базе и шаблонам
+        страницы"""
+        self.guest_client.get(reverse('index'))
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(reverse('index'))
+        self.assertTemplateNotUsed(response, 'index.html')
+        self.assertContains(response, 'Текст поста')
+        self.assertNotContains(response, '<!--hole')
+
+    def test_holes_filled_for_user(self):
+        """Страница, закешированная гостем, показывает автору его
+        кнопки, а гостю - нет"""
+        self.guest_client.get(reverse('index'))
+        response = self.author_client.get(reverse('index'))
+        self.assertTemplateNotUsed(response, 'index.html')
+        self.assertContains(response, 'Пользователь: page_author')
+        self.assertContains(response, 'Редактировать')
+        self.assertContains(response, 'Избранные авторы')
+        response = self.guest_client.get(reverse('index'))
+        self.assertNotContains(response, 'Редактировать')
+        self.assertNotContains(response, 'Избранные авторы')
+        self.assertContains(response, 'Регистрация')
+
+    def test_user_parts_not_cached(self):
+        """Страница, собранная для автора, не показывает гостю его
+        кнопки и форму комментария"""
+        self.author_client.get(self.post_url)
+        response = self.guest_client.get(self.post_url)
+        self.assertTemplateNotUsed(response, 'post.html')
+        self.assertNotContains(response, 'Редактировать')
+        self.assertNotContains(response, 'Добавить комментарий:')
+        self.assertNotContains(response, 'Автор')
+
+    def test_comment_form_hole(self):
+        self.guest_client.get(self.post_url)
+        response = self.reader_client.get(self.post_url)
+        self.assertContains(response, 'Добавить комментарий:')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertContains(response, reverse('add_comment', kwargs={
+            'username': self.author.username, 'post_id': self.post.pk}))
+
+    def test_csrf_token_not_cached(self):
+        """Токен CSRF не попадает в кеш, cookie с ним ставится каждому
+        посетителю"""
+        self.reader_client.get(self.post_url)
+        entry = cache.get(cached_key(self.post_url))
+        html = entry[0][0]
+        self.assertNotIn('csrfmiddlewaretoken', html)
+        response = self.author_client.get(self.post_url)
+        self.assertTemplateNotUsed(response, 'post.html')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertIn(settings.CSRF_COOKIE_NAME, response.cookies)
+
+    def test_follow_invalidates_profile(self):
+        """Подписка меняет кнопку и счетчик на закешированном профиле"""
+        self.reader_client.get(self.profile_url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.reader_client.get(self.profile_url)
+        self.assertContains(response, 'Подписчиков: 1')
+        self.assertContains(response, 'Отписаться')
+        response = self.guest_client.get(self.profile_url)
+        self.assertContains(response, 'Подписчиков: 1')
+        self.assertNotContains(response, 'Отписаться')
+
+    def test_new_post_invalidates_pages(self):
+        self.guest_client.get(reverse('index'))
+        Post.objects.create(text='Новый пост', author=self.author)
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Новый пост')
+
+    def test_not_found_not_cached(self):
+        url = reverse('profile', kwargs={'username': 'page_newcomer'})
+        self.assertEqual(self.guest_client.get(url).status_code, 404)
+        USER_MODEL.objects.create_user(username='page_newcomer')
+        self.assertEqual(self.guest_client.get(url).status_code, 200)
+
+    def test_unrelated_params_share_entry(self):
+        """Параметры запроса, которые представление не читает, не
+        создают новых копий страницы"""
+        self.guest_client.get(reverse('index'))
+        for query in ('?utm_source=mail', '?x=1', '?x=2'):
+            with self.subTest(query=query):
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(reverse('index') + query)
+                self.assertTemplateNotUsed(response, 'index.html')
+        self.assertEqual(cached_key(reverse('index') + '?x=1'),
+                         cached_key(reverse('index')))
+
+    def test_noncanonical_page_not_cached(self):
+        """?page=abc и ?page=999999 показывают существующую страницу, но
+        копии в кеше не получают"""
+        for query in ('?page=abc', '?page=999999', '?page=01',
+                      '?cursor=broken'):
+            with self.subTest(query=query):
+                url = reverse('index') + query
+                self.assertEqual(self.guest_client.get(url).status_code, 200)
+                self.assertIsNone(cache.get(cached_key(url)))
+        url = reverse('index') + '?page=1'
+        self.guest_client.get(url)
+        self.assertIsNotNone(cache.get(cached_key(url)))
+
+    def test_middleware_caches_plain_view(self):
+        """Представление без conditional кеширует сам middleware"""
+        calls = []
+
+        def view(request):
+            calls.append(request)
+            return HttpResponse('<p>страница</p>')
+
+        middleware = page_cache.PageCacheMiddleware(None)
+        for _ in range(2):
+            request = RequestFactory().get(reverse('index'))
+            request.resolver_match = resolve(request.path)
+            request.user = AnonymousUser()
+            response = middleware.process_view(request, view, (), {})
+            self.assertContains(response, 'страница')
+        self.assertEqual(len(calls), 1)
+
+    def test_other_views_not_cached(self):
+        request = RequestFactory().get(reverse('search'))
+        request.resolver_match = resolve(request.path)
+        view = mock.Mock()
+        middleware = page_cache.PageCacheMiddleware(None)
+        self.assertIsNone(middleware.process_view(request, view, (), {}))
+        self.assertFalse(getattr(request, 'page_cache', False))
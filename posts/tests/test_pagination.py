@@ -0,0 +1,170 @@
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Group, Post, USER_MODEL
+from posts import feed_cache
+from posts.pagination import (
+    decode_cursor, encode_cursor, page_key, page_window)
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(username='cursor')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='cursor-slug',
+            description='Описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.user, group=cls.group)
+            for i in range(25)
+        ]
+        cls.guest_client = Client()
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, url):
+        """Проходит ленту по ссылкам «Следующая» и возвращает страницы"""
+        pages = [self.guest_client.get(url, {'cursor': ''}).context['page']]
+        while pages[-1].has_next():
+            response = self.guest_client.get(
+                url, {'cursor': pages[-1].next_cursor})
+            pages.append(response.context['page'])
+        return pages
+
+    def test_cursor_pages_cover_feed(self):
+        """Страницы по курсору отдают всю ленту без повторов и пропусков"""
+        expected = [post.id for post in reversed(self.posts)]
+        urls = (
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.user.username}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                pages = self.walk(url)
+                self.assertEqual([len(page) for page in pages], [10, 10, 5])
+                ids = [post.id for page in pages for post in page]
+                self.assertEqual(ids, expected)
+
+    def test_previous_cursor_returns_same_page(self):
+        """Ссылка «Предыдущая» возвращает на ту же страницу"""
+        first, second = self.walk(reverse('index'))[:2]
+        self.assertFalse(first.has_previous())
+        response = self.guest_client.get(
+            reverse('index'), {'cursor': second.previous_cursor})
+        page = response.context['page']
+        self.assertEqual(list(page), list(first))
+        self.assertFalse(page.has_previous())
+
+    def test_broken_cursor_shows_first_page(self):
+        """Испорченный курсор показывает первую страницу"""
+        response = self.guest_client.get(
+            reverse('index'), {'cursor': 'мусор'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page'][0], self.posts[-1])
+
+    def test_cursor_roundtrip(self):
+        post = self.posts[0]
+        token = encode_cursor('next', post.pub_date, post.id)
+        self.assertEqual(
+            decode_cursor(token), ('next', post.pub_date, post.id))
+
+    @override_settings(POSTS_CURSOR_PAGINATION=True)
+    def test_page_param_is_fallback(self):
+        """При включенном режиме курсора ?page= работает как раньше"""
+        response = self.guest_client.get(reverse('index'))
+        self.assertTrue(response.context['page'].is_cursor)
+        response = self.guest_client.get(reverse('index'), {'page': 3})
+        self.assertEqual(response.context['page'].number, 3)
+        self.assertEqual(len(response.context['page']), 5)
+
+
+class PageKeyTests(SimpleTestCase):
+    def key(self, **params):
+        return page_key(RequestFactory().get('/', params), lambda: 25)
+
+    def test_page_numbers_resolved(self):
+        for page in ('abc', '01', '', '1'):
+            with self.subTest(page=page):
+                self.assertEqual(self.key(page=page), ('page', 1))
+        for page in ('999999', '0', '-5', '3'):
+            with self.subTest(page=page):
+                self.assertEqual(self.key(page=page), ('page', 3))
+
+    def test_cursors_decoded(self):
+        self.assertEqual(self.key(cursor='мусор'), ('cursor', None))
+        self.assertEqual(self.key(cursor=''), ('cursor', None))
+        self.assertEqual(self.key(), ('page', 1))
+
+    def test_junk_params_share_feed_entry(self):
+        keys = {feed_cache.make_key('index', page_key(
+            RequestFactory().get('/', {'page': page}), lambda: 5), 'default')
+            for page in ('abc', '01', '999999', '1')}
+        self.assertEqual(len(keys), 1)
+
+
+class PageWindowTests(SimpleTestCase):
+    def window(self, number, count):
+        return page_window(Paginator(range(count), 1).page(number))
+
+    def test_window(self):
+        self.assertEqual(self.window(1, 1), [1])
+        self.assertEqual(self.window(3, 5), [1, 2, 3, 4, 5])
+        self.assertEqual(self.window(1, 100), [1, 2, 3, 4, None, 100])
+        self.assertEqual(
+            self.window(50, 100),
+            [1, None, 47, 48, 49, 50, 51, 52, 53, None, 100])
+        self.assertEqual(self.window(100, 100), [1, None, 97, 98, 99, 100])
+
+
+class CachedCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(username='counted')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user) for i in range(95))
+        cls.guest_client = Client()
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, url, data):
+        with CaptureQueriesContext(connection) as context:
+            response = self.guest_client.get(url, data)
+        return response, [
+            query['sql'] for query in context.captured_queries
+            if 'COUNT(' in query['sql']
+        ]
+
+    def test_paginator_shows_window(self):
+        """Навигация показывает окно страниц, а не все страницы"""
+        response = self.guest_client.get(reverse('index'), {'page': 5})
+        self.assertContains(response, '?page=10')
+        self.assertContains(response, '?page=1"')
+        self.assertContains(response, '&hellip;')
+        self.assertNotContains(response, '?page=9"')
+
+    def test_count_is_cached_per_feed(self):
+        """Количество постов ленты считается один раз, пока посты не
+        изменились"""
+        url = reverse('index')
+        _, counts = self.count_queries(url, {'page': 2})
+        self.assertEqual(len(counts), 1)
+        response, counts = self.count_queries(url, {'page': 3})
+        self.assertEqual(counts, [])
+        self.assertEqual(response.context['page'].paginator.count, 95)
+        Post.objects.create(text='Еще один', author=self.user)
+        response, counts = self.count_queries(url, {'page': 4})
+        self.assertEqual(len(counts), 1)
+        self.assertEqual(response.context['page'].paginator.count, 96)
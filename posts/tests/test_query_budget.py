@@ -0,0 +1,101 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, USER_MODEL
+from posts.query_budget import (QueryBudgetExceeded, QueryBudgetTestMixin,
+                                normalize_sql, record_queries)
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = USER_MODEL.objects.create_user(username='budget_author')
+        cls.reader = USER_MODEL.objects.create_user(username='budget_reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='budget', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group)
+            for i in range(10)
+        ]
+        for post in cls.posts:
+            Comment.objects.create(post=post, author=cls.reader, text='Да')
+        cls.post = cls.posts[-1]
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_within_budget(self):
+        """Страницы укладываются в бюджеты из posts/query_budgets.py"""
+        post_kwargs = {'username': 'budget_author', 'post_id': self.post.id}
+        pages = {
+            'index': reverse('index'),
+            'follow_index': reverse('follow_index'),
+            'group_posts': reverse('group_posts', args=['budget']),
+            'profile': reverse('profile', args=['budget_author']),
+            'post': reverse('post', kwargs=post_kwargs),
+            'new_post': reverse('new_post'),
+            'post_edit': reverse('post_edit', kwargs=post_kwargs),
+            'search': reverse('search') + '?q=Пост',
+            'signup': reverse('signup'),
+            'about:author': reverse('about:author'),
+            'about:tech': reverse('about:tech'),
+        }
+        for url_name, url in pages.items():
+            with self.subTest(url_name=url_name):
+                self.assertWithinQueryBudget(
+                    self.author_client, url_name, url)
+
+    def test_writes_within_budget(self):
+        """Изменяющие данные представления укладываются в бюджеты"""
+        post_kwargs = {'username': 'budget_author', 'post_id': self.post.id}
+        writes = (
+            ('new_post', reverse('new_post'),
+             {'text': 'Новый', 'group': self.group.id}),
+            ('post_edit', reverse('post_edit', kwargs=post_kwargs),
+             {'text': 'Изменен'}),
+            ('add_comment', reverse('add_comment', kwargs=post_kwargs),
+             {'text': 'Комментарий'}),
+        )
+        for url_name, url, data in writes:
+            with self.subTest(url_name=url_name):
+                self.assertWithinQueryBudget(
+                    self.author_client, url_name, url, data, method='post')
+        for url_name in ('profile_unfollow', 'profile_follow'):
+            with self.subTest(url_name=url_name):
+                self.assertWithinQueryBudget(
+                    self.reader_client, url_name,
+                    reverse(url_name, args=['budget_author']))
+
+    def test_repeated_queries_are_reported(self):
+        """Повтор одного запроса с разными id распознается как N+1"""
+        with record_queries() as recorder:
+            for post in Post.objects.all():
+                post.author.username
+        pattern, count = recorder.repeated()[0]
+        self.assertEqual(count, len(self.posts))
+        self.assertIn('"auth_user"."id" = %s', pattern)
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE a = 'x'  AND b IN (1, 2)"),
+            'SELECT * FROM t WHERE a = ? AND b IN (...)')
+
+    @override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_STRICT=True)
+    def test_middleware_enforces_budget(self):
+        """Middleware считает запросы и в строгом режиме не пропускает
+        превышение бюджета"""
+        response = Client().get(reverse('about:tech'))
+        self.assertEqual(response['X-Query-Count'], '0')
+        with mock.patch.dict('posts.query_budget.QUERY_BUDGETS', index=1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.reader_client.get(reverse('index'))
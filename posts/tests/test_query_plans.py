@@ -0,0 +1,71 @@
+import re
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post, USER_MODEL
+
+# полный проход по таблице без индекса и сортировка во временном B-дереве
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+( AS \w+)?$')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE')
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN - SQLite')
+class QueryPlanTests(TestCase):
+    """Горячие запросы лент не должны сканировать таблицы целиком и
+    сортировать результат во временном B-дереве"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = USER_MODEL.objects.create_user(username='plan_author')
+        cls.reader = USER_MODEL.objects.create_user(username='plan_reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='plan', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.author, group=cls.group)
+            for i in range(15))
+        cls.client_reader = Client()
+        cls.client_reader.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def feed_queries(self, url, data=None):
+        with CaptureQueriesContext(connection) as context:
+            self.client_reader.get(url, data)
+        return [query['sql'] for query in context.captured_queries]
+
+    def test_feed_query_plans(self):
+        urls = (
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.author.username}),
+            reverse('follow_index'),
+        )
+        for url in urls:
+            for data in ({'page': 2}, {'cursor': ''}):
+                for sql in self.feed_queries(url, data):
+                    for step in query_plan(sql):
+                        with self.subTest(url=url, data=data, step=step):
+                            self.assertIsNone(
+                                FULL_SCAN.match(step), f'{step}\n{sql}')
+                            self.assertIsNone(
+                                TEMP_SORT.search(step), f'{step}\n{sql}')
+
+    def test_harness_detects_bad_plan(self):
+        """Проверка распознает полный проход и сортировку без индекса"""
+        plan = query_plan('SELECT * FROM posts_post ORDER BY text')
+        self.assertTrue(any(FULL_SCAN.match(step) for step in plan))
+        self.assertTrue(any(TEMP_SORT.search(step) for step in plan))
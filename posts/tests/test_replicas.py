@@ -0,0 +1,170 @@
+import os
+import sqlite3
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase)
+from django.urls import resolve, reverse
+
+from posts import feed_cache, replicas
+from posts.models import USER_MODEL, Group, Post
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = replicas.ReplicaRouter()
+
+    def tearDown(self):
+        replicas._state.replica = False
+
+    def test_reads(self):
+        self.assertIsNone(self.router.db_for_read(Post))
+        replicas._state.replica = True
+        self.assertEqual(self.router.db_for_read(Post), replicas.REPLICA)
+        # аккаунты и сессии - только из основной базы
+        self.assertIsNone(self.router.db_for_read(USER_MODEL))
+
+    def test_writes_and_migrations(self):
+        replicas._state.replica = True
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+        self.assertFalse(
+            self.router.allow_migrate(replicas.REPLICA, 'posts'))
+
+
+class ReplicaMiddlewareTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(replicas, 'enabled', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+        self.middleware = replicas.ReplicaMiddleware(self.get_response)
+        self.aliases = []
+
+    def view(self, request):
+        self.aliases.append(replicas.read_alias())
+        if request.method == 'POST':
+            Group.objects.create(title='Группа', slug='replica-group')
+        return HttpResponse()
+
+    def get_response(self, request):
+        match = resolve(request.path)
+        request.resolver_match = match
+        self.middleware.process_view(request, self.view, (), match.kwargs)
+        return self.view(request)
+
+    def request(self, method, url, **kwargs):
+        return self.middleware(getattr(self.factory, method)(url, **kwargs))
+
+    def test_feed_reads_replica(self):
+        self.request('get', reverse('index'))
+        self.assertEqual(self.aliases, [replicas.REPLICA])
+        self.assertEqual(replicas.read_alias(), 'default')
+
+    def test_other_pages_read_primary(self):
+        self.request('get', reverse('new_post'))
+        self.request('post', reverse('index'))
+        self.assertEqual(self.aliases, ['default', 'default'])
+
+    def test_reads_stick_to_primary_after_write(self):
+        response = self.request('post', reverse('new_post'))
+        cookie = response.cookies[replicas.STICKY_COOKIE]
+        self.assertGreater(int(cookie.value), time.time())
+        self.factory.cookies[replicas.STICKY_COOKIE] = cookie.value
+        self.request('get', reverse('index'))
+        self.assertEqual(self.aliases[-1], 'default')
+
+    def test_sticky_window_expires(self):
+        self.factory.cookies[replicas.STICKY_COOKIE] = str(
+            int(time.time()) - 1)
+        response = self.request('get', reverse('index'))
+        self.assertEqual(self.aliases, [replicas.REPLICA])
+        self.assertNotIn(replicas.STICKY_COOKIE, response.cookies)
+
+
+class ReplicaCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = USER_MODEL.objects.create_user(username='replica_author')
+        self.post = Post.objects.create(text='Пост', author=author)
+        self.request = RequestFactory().get(reverse('index'))
+
+    def page(self, alias, queryset):
+        with mock.patch.object(replicas, 'read_alias', return_value=alias):
+            return feed_cache.get_page('index', self.request, queryset)
+
+    def test_replica_page_cached_separately(self):
+        """Отставшая страница реплики не подменяет страницу основной базы
+        того же поколения"""
+        self.page(replicas.REPLICA, Post.objects.none())
+        page = self.page('default', Post.objects.all())
+        self.assertEqual(list(page), [self.post])
+        page = self.page(replicas.REPLICA, Post.objects.all())
+        self.assertEqual(list(page), [])
+        with mock.patch.object(cache, 'add', return_value=False):
+            page = self.page('default', Post.objects.none())
+        self.assertEqual(list(page), [self.post])
+
+    def test_snapshot_keeps_unchanged_pages(self):
+        """Новая копия реплики без изменений данных не сбрасывает ни кеши
+        основной базы, ни кеши реплики"""
+        feed_cache.set_replica_snapshot(feed_cache.snapshot_state())
+        self.page('default', Post.objects.all())
+        self.page(replicas.REPLICA, Post.objects.all())
+        generations = feed_cache.snapshot_state()[0]
+        feed_cache.set_replica_snapshot(feed_cache.snapshot_state())
+        self.assertEqual(feed_cache.snapshot_state()[0], generations)
+        for alias in ('default', replicas.REPLICA):
+            with self.subTest(alias=alias):
+                page = self.page(alias, Post.objects.none())
+                self.assertEqual(list(page), [self.post])
+
+    def test_replica_follows_snapshot(self):
+        """Кеш реплики пересчитывается после копии с новыми данными, а
+        до нее отдает страницу прежней копии"""
+        feed_cache.set_replica_snapshot(feed_cache.snapshot_state())
+        self.page(replicas.REPLICA, Post.objects.all())
+        feed_cache.invalidate(posts_changed=True)
+        page = self.page(replicas.REPLICA, Post.objects.none())
+        self.assertEqual(list(page), [self.post])
+        feed_cache.set_replica_snapshot(feed_cache.snapshot_state())
+        page = self.page(replicas.REPLICA, Post.objects.none())
+        self.assertEqual(list(page), [])
+
+
+class SnapshotTests(TransactionTestCase):
+    # backup ждет, пока источник не в транзакции
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.target = os.path.join(directory.name, 'replica.sqlite3')
+
+    def test_snapshot(self):
+        source = sqlite3.connect(':memory:')
+        source.execute('CREATE TABLE t (x)')
+        source.execute('INSERT INTO t VALUES (1)')
+        source.commit()
+        self.assertGreater(replicas.snapshot(source, self.target), 0)
+        copy = sqlite3.connect(self.target)
+        self.assertEqual(copy.execute('SELECT x FROM t').fetchall(), [(1,)])
+        copy.close()
+
+    def test_command(self):
+        Group.objects.create(title='Группа', slug='snapshot-group')
+        output = StringIO()
+        call_command('snapshot_replica', target=self.target, stdout=output)
+        self.assertIn('Скопировано страниц', output.getvalue())
+        # копия не меняет поколений основной базы
+        self.assertEqual(cache.get(feed_cache.REPLICA_SNAPSHOT),
+                         feed_cache.snapshot_state())
+        copy = sqlite3.connect(self.target)
+        self.assertEqual(copy.execute(
+            "SELECT title FROM posts_group WHERE slug = 'snapshot-group'"
+        ).fetchall(), [('Группа',)])
+        copy.close()
@@ -0,0 +1,117 @@
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.admin.sites import site
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Group, Post, USER_MODEL
+
+
+@skipUnless(search.available(), 'FTS5 - SQLite')
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(username='seeker')
+        cls.group = Group.objects.create(
+            title='Кошки', slug='cats', description='Описание')
+        cls.posts = Post.objects.bulk_create(
+            Post(text=f'Заметка {i} про собак', author=cls.user)
+            for i in range(25))
+        cls.cat_post = Post.objects.create(
+            text='Рыжий кот спит', author=cls.user, group=cls.group)
+        cls.guest_client = Client()
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, query, cursor=None):
+        return search.search(Post.objects.all(), query, cursor)
+
+    def test_index_follows_posts(self):
+        """Индекс обновляется при создании, изменении и удалении поста и
+        при переименовании группы"""
+        self.assertEqual(self.found('рыжий').object_list, [self.cat_post])
+        self.assertEqual(self.found('кошки').object_list, [self.cat_post])
+        Post.objects.filter(pk=self.cat_post.pk).update(text='Серый кот')
+        self.assertEqual(self.found('рыжий').object_list, [])
+        Group.objects.filter(pk=self.group.pk).update(title='Коты')
+        self.assertEqual(self.found('коты').object_list, [self.cat_post])
+        Post.objects.filter(pk=self.cat_post.pk).delete()
+        self.assertEqual(self.found('кот').object_list, [])
+
+    def test_keyset_pages(self):
+        """Страницы выдачи не пересекаются и покрывают все совпадения"""
+        seen, cursor = [], None
+        while True:
+            page = self.found('собак', cursor)
+            seen += page.object_list
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(
+            sorted(post.pk for post in seen),
+            sorted(post.pk for post in Post.objects.filter(
+                text__contains='собак')))
+
+    def test_query_syntax_is_escaped(self):
+        """Операторы FTS5 в запросе пользователя не ломают поиск"""
+        for query in ('"', 'NEAR(', 'кот OR', '*', 'text:кот', '-'):
+            with self.subTest(query=query):
+                self.assertEqual(self.guest_client.get(
+                    reverse('search'), {'q': query}).status_code, 200)
+
+    def test_search_page(self):
+        response = self.guest_client.get(reverse('search'), {'q': 'собак'})
+        self.assertEqual(len(response.context['page']), 10)
+        self.assertContains(response, 'cursor=')
+
+    def test_rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.FTS_TABLE}')
+        self.assertEqual(self.found('кот').object_list, [])
+        call_command('rebuild_search', stdout=StringIO())
+        self.assertEqual(self.found('кот').object_list, [self.cat_post])
+
+    def test_admin_uses_index(self):
+        request = RequestFactory().get('/')
+        queryset, use_distinct = site._registry[Post].get_search_results(
+            request, Post.objects.all(), 'рыжий')
+        self.assertEqual(list(queryset), [self.cat_post])
+        self.assertFalse(use_distinct)
+
+
+@mock.patch.object(search, 'available', return_value=False)
+class SearchWithoutIndexTests(TestCase):
+    """Без FTS5 поиск идет по вхождению слов, новые посты первыми"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        user = USER_MODEL.objects.create_user(username='plain_seeker')
+        group = Group.objects.create(title='Кошки', slug='plain-cats')
+        cls.posts = [
+            Post.objects.create(text=f'Рыжий кот {i}', author=user)
+            for i in range(12)]
+        cls.group_post = Post.objects.create(
+            text='Без слов', author=user, group=group)
+
+    def test_fallback(self, available):
+        # регистр совпадает: LIKE в SQLite не сравнивает кириллицу без
+        # учета регистра, а без FTS5 поиск работает на других СУБД
+        page = search.search(Post.objects.all(), 'кот Рыжий')
+        self.assertEqual(page.object_list, self.posts[::-1][:10])
+        page = search.search(Post.objects.all(), 'кот', page.next_cursor)
+        self.assertEqual(page.object_list, self.posts[1::-1])
+        page = search.search(Post.objects.all(), 'Кошки')
+        self.assertEqual(page.object_list, [self.group_post])
+
+    def test_search_page(self, available):
+        response = Client().get(reverse('search'), {'q': 'кот'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page']), 10)
@@ -0,0 +1,44 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count, F
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+from posts.models import USER_MODEL
+
+
+class SeedCommandTests(TestCase):
+    def seed(self, prefix, seed=1):
+        call_command(
+            'seed_yatube', users=20, groups=3, posts=200, comments=300,
+            follows=50, seed=seed, prefix=prefix, batch_size=64,
+            stdout=StringIO())
+        return list(Post.objects.filter(
+            author__username__startswith=f'{prefix}_').order_by(
+            'pk').values_list('text', 'comment_count'))
+
+    def test_seed_creates_consistent_data(self):
+        self.seed('first')
+        self.assertEqual(USER_MODEL.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertEqual(Follow.objects.count(), 50)
+        self.assertFalse(Post.objects.annotate(
+            total=Count('comments')).exclude(comment_count=F('total')))
+        expected = Post.objects.filter(
+            author__following__isnull=False).count()
+        self.assertEqual(TimelineEntry.objects.count(), expected)
+        self.assertFalse(
+            Comment.objects.filter(created__lt=F('post__pub_date')))
+
+    def test_seed_is_deterministic(self):
+        self.assertEqual(self.seed('first'), self.seed('second'))
+        self.assertNotEqual(self.seed('third', seed=2), self.seed('fourth'))
+
+    def test_prefix_must_be_new(self):
+        self.seed('first')
+        with self.assertRaises(CommandError):
+            self.seed('first')
@@ -0,0 +1,291 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, connections
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings)
+from django.urls import reverse
+
+from posts import search, signals, sharding, sqlite, views
+from posts.forms import CommentForm
+from posts.models import USER_MODEL, AuthorStats, Comment, Group, Post
+from posts.pagination import paginate
+
+SHARDS = ['default', 'shard_test']
+
+
+class ShardMappingTests(SimpleTestCase):
+    def test_jump_hash_moves_keys_only_to_new_shard(self):
+        keys = range(1000)
+        before = [sharding.jump_hash(key, 2) for key in keys]
+        after = [sharding.jump_hash(key, 3) for key in keys]
+        moved = [new for old, new in zip(before, after) if old != new]
+        self.assertEqual(set(moved), {2})
+        self.assertAlmostEqual(len(moved) / len(keys), 1 / 3, delta=0.05)
+
+    def test_single_shard_by_default(self):
+        self.assertFalse(sharding.enabled())
+        self.assertEqual(sharding.shard_for(12345), 'default')
+
+
+class ShardRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = sharding.ShardRouter()
+
+    def test_routing(self):
+        with self.settings(POST_SHARDS=SHARDS):
+            author_id = next(pk for pk in range(1, 100)
+                             if sharding.shard_for(pk) == 'shard_test')
+            post = Post(author_id=author_id)
+            self.assertEqual(
+                self.router.db_for_write(Post, instance=post), 'shard_test')
+            # загруженный пост остается в своей базе, комментарий
+            # записывается туда же
+            post._state.adding = False
+            post._state.db = 'shard_test'
+            comment = Comment(post=post)
+            self.assertEqual(
+                self.router.db_for_write(Comment, instance=comment),
+                'shard_test')
+            # автор поста из шарда - в основной базе
+            self.assertEqual(
+                self.router.db_for_read(USER_MODEL, instance=post),
+                'default')
+            self.assertIsNone(self.router.db_for_read(Post))
+
+    def test_migrations(self):
+        with self.settings(POST_SHARDS=SHARDS):
+            allow = self.router.allow_migrate
+            self.assertTrue(allow('shard_test', 'posts', 'post'))
+            self.assertFalse(allow('shard_test', 'auth', 'user'))
+            self.assertFalse(allow('shard_test', 'posts'))
+            self.assertTrue(allow('shard_test', 'posts', shards=True))
+            self.assertIsNone(allow('default', 'posts', 'post'))
+
+    def test_shard_safe(self):
+        queryset = Post.objects.select_related('author', 'group')
+        self.assertIs(sharding.shard_safe(queryset), queryset)
+        with self.settings(POST_SHARDS=SHARDS):
+            queryset = sharding.shard_safe(queryset.using('shard_test'))
+        self.assertFalse(queryset.query.select_related)
+        self.assertEqual(
+            set(queryset._prefetch_related_lookups), {'author', 'group'})
+
+
+class ScatterQuerySetTests(TestCase):
+    """Шарды изображаются запросами к постам разных авторов в одной
+    базе"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.authors = [
+            USER_MODEL.objects.create_user(username=f'shard_author_{i}')
+            for i in range(3)]
+        for i in range(25):
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.authors[i % 3])
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.posts = Post.objects.select_related('author')
+        self.scatter = sharding.ScatterQuerySet([
+            self.posts.filter(author=author) for author in self.authors])
+
+    def ids(self, rows):
+        return [post.pk for post in rows]
+
+    def test_merge(self):
+        expected = self.posts.order_by('-pub_date', '-id')
+        self.assertEqual(self.scatter.count(), 25)
+        self.assertEqual(
+            self.ids(self.scatter.order_by('-pub_date', '-id')[5:15]),
+            self.ids(expected[5:15]))
+
+    def test_related_loaded_for_page(self):
+        rows = self.scatter.order_by('-pub_date', '-id')[:10]
+        with self.assertNumQueries(0):
+            [post.author.username for post in rows]
+
+    def test_pagination(self):
+        for params in ({'page': 2}, {}):
+            with self.subTest(params=params):
+                with self.settings(POSTS_CURSOR_PAGINATION=True):
+                    page = paginate(
+                        self.factory.get('/', params), self.scatter)
+                    expected = paginate(
+                        self.factory.get('/', params), self.posts)
+                self.assertEqual(
+                    self.ids(page.object_list),
+                    self.ids(expected.object_list))
+
+    def test_cursor_pages(self):
+        with self.settings(POSTS_CURSOR_PAGINATION=True):
+            first = paginate(self.factory.get('/'), self.scatter)
+            second = paginate(self.factory.get(
+                '/', {'cursor': first.next_cursor}), self.scatter)
+            back = paginate(self.factory.get(
+                '/', {'cursor': second.previous_cursor}), self.scatter)
+        self.assertEqual(self.ids(back), self.ids(first))
+        self.assertFalse(set(self.ids(first)) & set(self.ids(second)))
+
+    def test_empty(self):
+        scatter = sharding.authors_feed(self.posts, [])
+        self.assertEqual(scatter.count(), 0)
+        self.assertEqual(scatter[:10], [])
+
+
+class RebalanceTests(TestCase):
+    def test_nothing_to_move_with_one_shard(self):
+        output = StringIO()
+        call_command('rebalance_shards', stdout=output)
+        self.assertIn('Все посты на своих шардах', output.getvalue())
+
+
+@override_settings(
+    POST_SHARDS=SHARDS, DATABASE_ROUTERS=['posts.sharding.ShardRouter'])
+class ShardDatabaseTests(TransactionTestCase):
+    """Запись в настоящий второй шард - временную базу SQLite"""
+
+    databases = set(SHARDS)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.databases['shard_test'] = dict(
+            settings.DATABASES['default'],
+            NAME=os.path.join(cls.directory.name, 'shard.sqlite3'),
+            PRAGMAS={'foreign_keys': 'OFF'})
+        super().setUpClass()
+        call_command('migrate', database='shard_test', verbosity=0)
+        # migrate включает проверку внешних ключей, новое соединение
+        # получит PRAGMA шарда
+        connections['shard_test'].close()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['shard_test'].close()
+        del connections.databases['shard_test']
+        cls.directory.cleanup()
+
+    def create_user(self, alias):
+        """Пользователь, чьи посты лежат в шарде alias"""
+        while True:
+            user = USER_MODEL.objects.create_user(
+                username=f'shard_user_{USER_MODEL.objects.count()}')
+            if sharding.shard_for(user.pk) == alias:
+                return user
+
+    def setUp(self):
+        self.author = self.create_user('shard_test')
+        self.reader = self.create_user('default')
+        # как form.save(): шард выбирает роутер по объекту, а
+        # QuerySet.create передал бы save() основную базу
+        self.post = Post(text='Пост', author=self.author)
+        self.post.save()
+
+    def test_retried_comment_not_duplicated(self):
+        """Повтор записи после блокировки не оставляет в шарде комментарий
+        неудачной попытки"""
+        change_comment_count = signals.change_comment_count
+        attempts = []
+
+        def locked_once(*args):
+            attempts.append(args)
+            if len(attempts) == 1:
+                raise OperationalError('database is locked')
+            return change_comment_count(*args)
+
+        form = CommentForm({'text': 'Комментарий'})
+        self.assertTrue(form.is_valid())
+        with mock.patch.object(signals, 'change_comment_count', locked_once), \
+                mock.patch.object(sqlite.time, 'sleep'):
+            views.save_form(form, author=self.reader, post=self.post)
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(
+            Comment.objects.using('shard_test').filter(
+                post=self.post).count(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_deleted_user_comments_removed_from_shards(self):
+        comment = Comment(text='Комментарий', author=self.reader,
+                          post=self.post)
+        comment.save()
+        self.reader.delete()
+        self.assertFalse(
+            Comment.objects.using('shard_test').filter(pk=comment.pk).exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+        response = self.client.get(reverse(
+            'post', args=[self.author.username, self.post.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_search_covers_every_shard(self):
+        """Поиск находит посты всех шардов, в том числе по названию
+        группы, копия которой лежит в шарде"""
+        group = Group.objects.create(title='Кошки', slug='shard-cats')
+        Post(text='Рыжий кот', author=self.author, group=group).save()
+        primary = Post(text='Рыжий пес', author=self.reader)
+        primary.save()
+        queryset = Post.objects.select_related('author', 'group')
+        found = search.search(queryset, 'рыжий')
+        self.assertEqual(
+            {post.text for post in found.object_list},
+            {'Рыжий кот', 'Рыжий пес'})
+        group.title = 'Коты'
+        group.save()
+        found = search.search(queryset, 'коты')
+        self.assertEqual(
+            [post.text for post in found.object_list], ['Рыжий кот'])
+        self.assertEqual(found.object_list[0].group, group)
+        first = search.search(queryset, 'рыжий', per_page=1)
+        second = search.search(
+            queryset, 'рыжий', first.next_cursor, per_page=1)
+        self.assertEqual(
+            {*first.object_list, *second.object_list},
+            {primary, Post.objects.using('shard_test').get(text='Рыжий кот')})
+
+    def test_rebuild_search(self):
+        with connections['shard_test'].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.FTS_TABLE}')
+        self.assertEqual(search.search(Post.objects, 'пост').object_list, [])
+        call_command('rebuild_search', stdout=StringIO())
+        self.assertEqual(
+            search.search(Post.objects, 'пост').object_list, [self.post])
+
+    def test_admin_search(self):
+        """Админка сообщает о совпадениях в других шардах и показывает
+        их в фильтре шарда"""
+        admin = USER_MODEL.objects.create_superuser(
+            'shard_admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        url = reverse('admin:posts_post_changelist')
+        response = self.client.get(url, {'q': 'пост'})
+        self.assertContains(
+            response, 'Найдено в других шардах: shard_test - 1')
+        response = self.client.get(url, {'q': 'пост', 'shard': 'shard_test'})
+        self.assertContains(response, reverse(
+            'admin:posts_post_change', args=[self.post.pk]))
+        response = self.client.get(reverse(
+            'admin:posts_post_change', args=[self.post.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_rebuild_counters(self):
+        """Пересчет счетчиков учитывает посты и комментарии шардов"""
+        Comment(text='Комментарий', author=self.reader, post=self.post).save()
+        Post.objects.using('shard_test').update(comment_count=0)
+        AuthorStats.objects.update(post_count=0)
+        call_command('rebuild_counters', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.author).post_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.reader).post_count, 0)
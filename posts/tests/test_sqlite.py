@@ -0,0 +1,130 @@
+import json
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import (
+    Client, SimpleTestCase, TestCase, TransactionTestCase)
+from django.urls import reverse
+
+from posts import sqlite
+from posts.models import USER_MODEL, Group
+
+
+class PragmaTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA %s' % name)
+            return cursor.fetchone()[0]
+
+    def test_connection_configured(self):
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+
+
+@mock.patch.object(sqlite.time, 'sleep')
+class RetryOnLockedTests(TestCase):
+    def test_retries_until_success(self, sleep):
+        write = mock.Mock(side_effect=[
+            OperationalError('database is locked'),
+            OperationalError('database is locked'),
+            'ok',
+        ])
+        self.assertEqual(sqlite.retry_on_locked(write)(), 'ok')
+        self.assertEqual(write.call_count, 3)
+        first, second = [call[0][0] for call in sleep.call_args_list]
+        self.assertGreater(second / first, 2 * 0.5 / 1.5)
+
+    def test_failed_attempt_rolled_back(self, sleep):
+        attempts = []
+
+        def write():
+            Group.objects.create(title='Группа', slug='retry-group')
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        sqlite.retry_on_locked(write)()
+        self.assertEqual(Group.objects.filter(slug='retry-group').count(), 1)
+
+    def test_other_errors_not_retried(self, sleep):
+        write = mock.Mock(side_effect=OperationalError('no such table'))
+        with self.assertRaises(OperationalError):
+            sqlite.retry_on_locked(write)()
+        self.assertEqual(write.call_count, 1)
+
+    def test_gives_up(self, sleep):
+        write = mock.Mock(side_effect=OperationalError('database is locked'))
+        with self.assertRaises(OperationalError):
+            sqlite.retry_on_locked(write)()
+        self.assertEqual(write.call_count, sqlite.RETRY_ATTEMPTS)
+
+
+class ImmediateTransactionTests(TransactionTestCase):
+    def test_begin_immediate(self):
+        """Вне транзакции блокировка записи берется сразу, вложенный
+        блок - обычная точка сохранения"""
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            statements.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            with sqlite.immediate():
+                with sqlite.immediate():
+                    Group.objects.create(title='Группа', slug='immediate')
+        self.assertEqual(statements[0], 'BEGIN IMMEDIATE')
+        self.assertEqual(statements.count('BEGIN IMMEDIATE'), 1)
+        self.assertNotIn(
+            '_start_transaction_under_autocommit', vars(connection))
+        self.assertTrue(Group.objects.filter(slug='immediate').exists())
+
+    def test_form_page_does_not_lock(self):
+        """Страница формы только читает базу, блокировку записи берет
+        лишь сохранение формы"""
+        client = Client()
+        client.force_login(USER_MODEL.objects.create_user(username='locker'))
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            statements.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            client.get(reverse('new_post'))
+            self.assertNotIn('BEGIN IMMEDIATE', statements)
+            client.post(reverse('new_post'), {'text': 'Пост'})
+        self.assertEqual(statements.count('BEGIN IMMEDIATE'), 1)
+
+
+class DbMaintainTests(TransactionTestCase):
+    # контрольная точка и VACUUM невозможны внутри транзакции теста
+    def run_command(self, *args):
+        output = StringIO()
+        call_command('db_maintain', *args, stdout=output)
+        return json.loads(output.getvalue())
+
+    def test_maintenance(self):
+        result = self.run_command()
+        self.assertTrue(result['analyze'])
+        self.assertIn('checkpoint', result)
+        report = result['report']
+        self.assertEqual(
+            report['size_bytes'], report['page_size'] * report['page_count'])
+        self.assertIn('posts_post', report['tables'])
+
+    def test_report_only(self):
+        result = self.run_command('--report-only')
+        self.assertEqual(list(result), ['report'])
+
+
+class PragmaSettingsTests(SimpleTestCase):
+    def test_settings_override(self):
+        with self.settings(SQLITE_PRAGMAS={'busy_timeout': 100}):
+            pragmas = sqlite.pragmas()
+        self.assertEqual(pragmas['busy_timeout'], 100)
+        self.assertEqual(pragmas['synchronous'], 'NORMAL')
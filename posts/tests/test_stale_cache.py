@@ -0,0 +1,101 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase
+from django.urls import reverse
+
+from posts import stale_cache
+from posts.models import USER_MODEL, Post
+
+
+class StaleCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.compute = mock.Mock(side_effect=['первое', 'второе'])
+
+    def get(self, **kwargs):
+        return stale_cache.get_or_set('key', self.compute, **kwargs)
+
+    def expire(self):
+        value, _, version = cache.get('key')
+        cache.set('key', (value, 0, version))
+
+    def test_fresh_value_is_not_recomputed(self):
+        self.assertEqual(self.get(soft_ttl=60), 'первое')
+        self.assertEqual(self.get(soft_ttl=60), 'первое')
+        self.assertEqual(self.compute.call_count, 1)
+
+    def test_stale_value_is_recomputed(self):
+        self.get(soft_ttl=60)
+        self.expire()
+        self.assertEqual(self.get(soft_ttl=60), 'второе')
+        self.assertIsNone(cache.get(stale_cache.lock_key('key')))
+
+    def test_stale_value_served_while_locked(self):
+        """Пока другой запрос пересчитывает, отдается старое значение"""
+        self.get(soft_ttl=60)
+        self.expire()
+        cache.add(stale_cache.lock_key('key'), 1)
+        self.assertEqual(self.get(soft_ttl=60), 'первое')
+        self.assertEqual(self.compute.call_count, 1)
+
+    def test_other_version_not_served(self):
+        """Значение прежней версии не отдается, даже пока другой запрос
+        пересчитывает"""
+        self.get(version=1)
+        cache.add(stale_cache.lock_key('key'), 1)
+        with mock.patch.object(stale_cache, 'WAIT_TIMEOUT', 0.1):
+            self.assertEqual(self.get(version=2), 'второе')
+        self.assertEqual(self.compute.call_count, 2)
+
+    def test_waits_for_new_version(self):
+        self.get(version=1)
+        cache.add(stale_cache.lock_key('key'), 1)
+
+        def sleep(seconds):
+            cache.set('key', ('пересчитано', None, 2))
+        with mock.patch.object(stale_cache.time, 'sleep', sleep):
+            self.assertEqual(self.get(version=2), 'пересчитано')
+        self.assertEqual(self.compute.call_count, 1)
+
+    def test_miss_while_locked_computes_after_wait(self):
+        cache.add(stale_cache.lock_key('key'), 1)
+        with mock.patch.object(stale_cache, 'WAIT_TIMEOUT', 0.1):
+            self.assertEqual(self.get(soft_ttl=60), 'первое')
+        # чужая блокировка не снимается
+        self.assertIsNotNone(cache.get(stale_cache.lock_key('key')))
+
+    def test_hard_ttl(self):
+        with mock.patch.object(cache, 'set') as cache_set:
+            self.get(soft_ttl=6)
+            self.assertEqual(cache_set.call_args[0][2], 60)
+            self.get(soft_ttl=6, hard_ttl=100)
+            self.assertEqual(cache_set.call_args[0][2], 100)
+
+    def test_lock_released_on_error(self):
+        self.compute.side_effect = ValueError
+        with self.assertRaises(ValueError):
+            self.get(soft_ttl=60)
+        self.assertIsNone(cache.get(stale_cache.lock_key('key')))
+
+
+class StaleFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(username='stale_author')
+        cls.guest_client = Client()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feed_not_stale_after_new_post(self):
+        """Новый пост виден в ленте, даже пока ее пересчитывает другой
+        запрос"""
+        Post.objects.create(text='Старый пост', author=self.user)
+        self.guest_client.get(reverse('index'))
+        Post.objects.create(text='Новый пост', author=self.user)
+        with mock.patch.object(cache, 'add', return_value=False), \
+                mock.patch.object(stale_cache, 'WAIT_TIMEOUT', 0.1):
+            response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Новый пост')
@@ -0,0 +1,80 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.template import Context, Engine
+from django.test import SimpleTestCase, override_settings
+
+from posts import template_cache
+
+TEMPLATES = {
+    'base.html': '<h1>{% block title %}{% endblock %}</h1>',
+    'page.html': (
+        '{% extends "base.html" %}{% block title %}'
+        '{% if user and not hidden or count > 1 %}{{ user|upper }}'
+        '{% endif %}{% endblock %}'),
+}
+
+
+class TemplateCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'templates.pickle')
+
+    def loader(self, templates=TEMPLATES):
+        with override_settings(TEMPLATE_CACHE_FILE=self.path):
+            engine = Engine(loaders=[('posts.template_cache.Loader', [
+                ('django.template.loaders.locmem.Loader', templates)])])
+            return engine.template_loaders[0]
+
+    def render(self, loader, name='page.html', **context):
+        return loader.get_template(name).render(Context(context))
+
+    def test_loads_compiled_templates(self):
+        loader = self.loader()
+        expected = self.render(loader, user='автор', count=2)
+        template_cache.write(self.path, loader.compiled)
+        loader = self.loader()
+        self.assertEqual(
+            self.render(loader, user='автор', count=2), expected)
+        self.assertEqual(expected, '<h1>АВТОР</h1>')
+        # страница и базовый шаблон из {% extends %}
+        self.assertEqual(loader.hits, 2)
+
+    def test_changed_source_is_compiled_again(self):
+        loader = self.loader()
+        self.render(loader)
+        template_cache.write(self.path, loader.compiled)
+        loader = self.loader(dict(TEMPLATES, **{'base.html': '<p></p>'}))
+        self.assertEqual(self.render(loader), '<p></p>')
+        # из файла взят только неизмененный page.html
+        self.assertEqual(loader.hits, 1)
+
+    def test_changed_tag_library_is_compiled_again(self):
+        """После изменения библиотеки тегов узлы из файла не годятся"""
+        loader = self.loader()
+        self.render(loader)
+        template_cache.write(self.path, loader.compiled)
+        with mock.patch.object(
+                template_cache, 'libraries_digest', return_value='changed'):
+            loader = self.loader()
+        self.render(loader)
+        self.assertEqual(loader.hits, 0)
+
+    def test_damaged_file_is_ignored(self):
+        with open(self.path, 'wb') as target:
+            target.write(b'not a pickle')
+        with self.assertLogs('posts.template_cache', 'ERROR'):
+            loader = self.loader()
+        self.assertEqual(self.render(loader, user='a'), '<h1>A</h1>')
+
+    def test_warm_templates(self):
+        output = StringIO()
+        call_command('warm_templates', output=self.path, stdout=output)
+        self.assertIn('Шаблонов:', output.getvalue())
+        names = {name for name, _ in template_cache.read(self.path).values()}
+        self.assertTrue({'base.html', 'index.html', 'include/post_card.html',
+                         'signup.html'} <= names)
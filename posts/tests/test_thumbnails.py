@@ -0,0 +1,147 @@
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import (
+    Client, RequestFactory, TestCase, TransactionTestCase, override_settings)
+from django.urls import resolve, reverse
+from sorl.thumbnail import get_thumbnail
+
+from posts import feed_cache, page_cache, thumbnails
+from posts.fragments import card_key
+from posts.models import Post, USER_MODEL
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def cached_key(url):
+    request = RequestFactory().get(url)
+    request.resolver_match = resolve(request.path)
+    return page_cache.make_key(request, 'default')
+
+
+def run_on_commit():
+    """TestCase не фиксирует транзакцию: задачи после коммита выполняются
+    сразу"""
+    return mock.patch(
+        'posts.thumbnails.transaction.on_commit',
+        side_effect=lambda callback: callback())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = USER_MODEL.objects.create_user(username='painter')
+        cls.guest_client = Client()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        caches['thumbnails'].clear()
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    def test_page_shows_placeholder(self):
+        """Пока миниатюры нет, страница показывает заглушку, не создавая
+        миниатюру сама, и не кеширует такую карточку"""
+        with mock.patch('posts.thumbnails.get_thumbnail') as generate:
+            response = self.guest_client.get(reverse('index'))
+        generate.assert_not_called()
+        self.assertContains(response, 'thumbnail-pending')
+        self.assertIsNone(cache.get(card_key(self.post)))
+
+    def test_page_shows_ready_thumbnail(self):
+        """Миниатюра, созданная фоновым пулом, выводится без обработки
+        исходного изображения"""
+        thumbnail = get_thumbnail(
+            self.post.image,
+            thumbnails.POST_GEOMETRY,
+            **thumbnails.POST_OPTIONS)
+        with mock.patch('posts.thumbnails.get_thumbnail') as generate:
+            response = self.guest_client.get(reverse('index'))
+        generate.assert_not_called()
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, 'thumbnail-pending')
+
+    def test_placeholder_page_not_cached(self):
+        """Страница с заглушкой не попадает в кеш страниц и не получает
+        валидаторов для условных запросов"""
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'thumbnail-pending')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIsNone(cache.get(cached_key(reverse('index'))))
+
+    def test_thumbnail_entry_kept_apart_from_default_cache(self):
+        """Записи KV-хранилища sorl не вытесняются записями основного
+        кеша и не теряются при его очистке"""
+        get_thumbnail(
+            self.post.image,
+            thumbnails.POST_GEOMETRY,
+            **thumbnails.POST_OPTIONS)
+        cache.clear()
+        self.assertIsNotNone(thumbnails.lookup(self.post.image))
+
+    @override_settings(THUMBNAIL_QUEUE_SIZE=0)
+    def test_full_queue_skips_thumbnail(self):
+        """При переполненной очереди задача отбрасывается"""
+        with mock.patch('posts.thumbnails.get_thumbnail') as generate, \
+                self.assertLogs('posts.thumbnails', 'WARNING'), \
+                run_on_commit():
+            thumbnails.schedule(self.post.image)
+        generate.assert_not_called()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailWorkerTests(TransactionTestCase):
+    # пул работает в своем потоке, а TestCase не фиксирует транзакцию
+    def setUp(self):
+        caches['thumbnails'].clear()
+
+    def tearDown(self):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def test_worker_generates_thumbnail(self):
+        """Задача пула создает миниатюру и запись в KV-хранилище sorl,
+        не сбрасывая кеши лент"""
+        user = USER_MODEL.objects.create_user(username='worker_painter')
+        with mock.patch.object(thumbnails, 'schedule'):
+            post = Post.objects.create(
+                text='Пост с картинкой',
+                author=user,
+                image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+            )
+        generation = feed_cache.generation()
+        done = threading.Event()
+
+        def generate(*args, **kwargs):
+            try:
+                return get_thumbnail(*args, **kwargs)
+            finally:
+                done.set()
+        with mock.patch('posts.thumbnails.get_thumbnail', generate):
+            thumbnails.schedule(post.image)
+            self.assertTrue(done.wait(5))
+        self.assertIsNotNone(thumbnails.lookup(post.image))
+        self.assertEqual(feed_cache.generation(), generation)
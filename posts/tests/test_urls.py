@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.test import TestCase, Client
 
 from posts.models import Group, Post, USER_MODEL
@@ -45,6 +46,11 @@ class PostURLTest(TestCase):
             # author=User.objects.create(username='lex'),
         )
 
+    def setUp(self):
+        # шаблоны проверяются только у ответов, собранных представлением,
+        # а не взятых из кеша целых страниц
+        cache.clear()
+
     def test_new_posts_url_guest_client(self):
         """Страница /new/ создания поста не доступна анонимному пользователю"""
         response = self.guest_client.get('/new/')
@@ -1,8 +1,12 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import Client, TestCase
 from django.urls import reverse
 from django import forms
 
-from posts.models import Group, Post, Follow, USER_MODEL
+from posts.models import Group, Post, Follow, TimelineEntry, USER_MODEL
 
 
 class PostPagesTests(TestCase):
@@ -30,6 +34,11 @@ class PostPagesTests(TestCase):
             author=cls.user
         )
 
+    def setUp(self):
+        # шаблоны и контекст проверяются только у ответов, собранных
+        # представлением, а не взятых из кеша целых страниц
+        cache.clear()
+
     # Проверяем используемые шаблоны
     def test_pages_uses_correct_template(self):
         """URL-адрес использует соответствующий шаблон."""
@@ -202,3 +211,37 @@ class PostPagesTests(TestCase):
             reverse('profile_follow', kwargs={'username': self.post.author}))
         follow_count_after = Follow.objects.all().count()
         self.assertEqual(follow_count_after, follow_count)
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = USER_MODEL.objects.create_user(username='reader')
+        cls.author = USER_MODEL.objects.create_user(username='writer')
+        cls.client_reader = Client()
+        cls.client_reader.force_login(cls.reader)
+        cls.old_post = Post.objects.create(
+            text='Старый пост автора', author=cls.author)
+
+    def follow_feed(self):
+        response = self.client_reader.get(reverse('follow_index'))
+        return list(response.context['page'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка добавляет старые посты автора в ленту, отписка убирает"""
+        self.client_reader.get(
+            reverse('profile_follow', kwargs={'username': 'writer'}))
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(self.follow_feed(), [new_post, self.old_post])
+        self.client_reader.get(
+            reverse('profile_unfollow', kwargs={'username': 'writer'}))
+        self.assertEqual(self.follow_feed(), [])
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+
+    def test_rebuild_timeline(self):
+        """Команда rebuild_timeline восстанавливает ленты по подпискам"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timeline', stdout=StringIO())
+        self.assertEqual(self.follow_feed(), [self.old_post])
@@ -0,0 +1,120 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import KVStoreBase
+from sorl.thumbnail.shortcuts import get_thumbnail
+
+logger = logging.getLogger(__name__)
+
+# размер и параметры миниатюры в карточке поста
+POST_GEOMETRY = '960x339'
+POST_OPTIONS = {'crop': 'center', 'upscale': True}
+
+_lock = threading.Lock()
+_pending = set()
+_executor = None
+
+
+class CacheKVStore(KVStoreBase):
+    """KV-хранилище sorl в кеше THUMBNAIL_CACHE без обращений к базе
+    данных: фоновые потоки пула не конкурируют с запросами за блокировки
+    SQLite.
+
+    Кеш должен быть общим для процессов и не вытеснять записи (в
+    настройках - файл SQLite без предела числа записей). Иначе готовая
+    миниатюра снова показывается заглушкой и ставится в очередь."""
+
+    @property
+    def cache(self):
+        return caches[sorl_settings.THUMBNAIL_CACHE]
+
+    def _get_raw(self, key):
+        return self.cache.get(key)
+
+    def _set_raw(self, key, value):
+        self.cache.set(key, value, None)
+
+    def _delete_raw(self, *keys):
+        self.cache.delete_many(keys)
+
+    def _find_keys_raw(self, prefix):
+        # кеш не умеет перечислять ключи; очистка - через cache.clear()
+        return []
+
+
+def lookup(file_, geometry=POST_GEOMETRY, **options):
+    """Готовая миниатюра из KV-хранилища sorl или None.
+
+    Имя файла миниатюры вычисляется так же, как в
+    ThumbnailBackend.get_thumbnail, но само изображение не открывается."""
+    options = dict(POST_OPTIONS if not options else options)
+    backend = default.backend
+    source = ImageFile(file_)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return default.kvstore.get(ImageFile(name, default.storage))
+
+
+def _pool():
+    global _executor
+    with _lock:
+        if _executor is None:
+            workers = getattr(settings, 'THUMBNAIL_WORKERS', 2)
+            _executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix='thumbnails')
+    return _executor
+
+
+def _generate(name):
+    try:
+        get_thumbnail(name, POST_GEOMETRY, **POST_OPTIONS)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру для %s', name)
+    finally:
+        close_old_connections()
+        with _lock:
+            _pending.discard(name)
+
+
+def _submit(name):
+    executor = _pool()
+    with _lock:
+        if name in _pending:
+            return
+        # очередь ограничена: при переполнении задача отбрасывается и
+        # будет поставлена снова при следующем показе поста
+        if len(_pending) >= getattr(settings, 'THUMBNAIL_QUEUE_SIZE', 100):
+            logger.warning('Очередь миниатюр переполнена, пропущен %s', name)
+            return
+        _pending.add(name)
+    executor.submit(_generate, name)
+
+
+def schedule(image):
+    """Ставит создание миниатюры в очередь фонового пула после коммита
+    текущей транзакции"""
+    name = getattr(image, 'name', image)
+    try:
+        if not name or not default_storage.exists(name):
+            return
+    except (SuspiciousFileOperation, OSError):
+        logger.warning('Изображение %s недоступно в хранилище', name)
+        return
+    transaction.on_commit(lambda: _submit(name))
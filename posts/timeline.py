@@ -0,0 +1,56 @@
+from django.db import connection
+
+from .models import Follow, Post, TimelineEntry
+
+BATCH_SIZE = 500
+
+
+def fan_out(post):
+    """Раскладывает новый пост в ленты всех подписчиков автора"""
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=post.pk,
+                       author_id=post.author_id, pub_date=post.pub_date)
+         for user_id in followers.distinct()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора"""
+    posts = Post.objects.filter(
+        author_id=author_id).values_list('pk', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=pk,
+                       author_id=author_id, pub_date=pub_date)
+         for pk, pub_date in posts.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя"""
+    if Follow.objects.filter(user_id=user_id, author_id=author_id).exists():
+        return
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild():
+    """Заново строит ленты всех пользователей по таблице подписок одним
+    INSERT ... SELECT"""
+    TimelineEntry.objects.all().delete()
+    sql = f"""
+        INSERT INTO {TimelineEntry._meta.db_table}
+            (user_id, post_id, author_id, pub_date)
+        SELECT DISTINCT follow.user_id, post.id, post.author_id,
+            post.pub_date
+        FROM {Follow._meta.db_table} AS follow
+        JOIN {Post._meta.db_table} AS post
+            ON post.author_id = follow.author_id
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
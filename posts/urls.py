@@ -17,6 +17,7 @@ urlpatterns = [
     ),
     path("group/<slug:slug>/", views.group_posts, name="group_posts"),
     path("new/", views.new_post, name="new_post"),
+    path("search/", views.search, name="search"),
     # Профайл пользователя
     path('<str:username>/', views.profile, name='profile'),
     # Просмотр записи
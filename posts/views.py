@@ -1,40 +1,75 @@
-from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.db import models, router
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
 
+from . import feed_cache, following, fragments, sharding
+from .natural_keys import groups, users
+from .conditional import (
+    conditional, feed_etag, feed_last_modified, post_etag, post_last_modified)
 from .forms import PostForm, CommentForm
-from .models import Post, Group, Follow
+from .models import AuthorStats, Post, Follow, TimelineEntry
+from .pagination import paginate
+from .search import search as search_posts
+from .sqlite import immediate, retry_on_locked
 
-User = get_user_model()
 
+def save_form(form, **fields):
+    """form.save() с полями fields под блокировкой записи базы.
 
+    Загруженные файлы записываются в хранилище заранее, чтобы другие
+    запросы не ждали базу, пока пишется картинка. Запись в шард поста
+    идет в его собственной транзакции внутри повторяемого блока: при
+    повторе после блокировки в шарде не остается строк первой попытки."""
+    instance = form.instance
+    for name, value in fields.items():
+        setattr(instance, name, value)
+    for field in instance._meta.concrete_fields:
+        if isinstance(field, models.FileField):
+            file = getattr(instance, field.attname)
+            if file and not file._committed:
+                file.save(file.name, file.file, save=False)
+    alias = router.db_for_write(type(instance), instance=instance)
+
+    def save():
+        with immediate(alias):
+            return form.save()
+
+    return retry_on_locked(save)()
+
+
+@conditional(feed_etag, feed_last_modified)
 def index(request):
     """"Представление главной страницы постов"""
-    post_list = Post.objects.order_by('-pub_date')
-    # Если порядок сортировки определен в классе Meta модели,
-    # запрос будет выглядить так:
-    # post_list = Post.objects.all()
-    # Показывать по 10 записей на странице.
-    paginator = Paginator(post_list, 10)
-    # Из URL извлекаем номер запрошенной страницы - это значение параметра page
-    page_number = request.GET.get('page')
-    # Получаем набор записей для страницы с запрошенным номером
-    page = paginator.get_page(page_number)
+    # Из URL извлекаем номер страницы (?page=) или курсор (?cursor=)
+    # и получаем набор записей для запрошенной страницы
+    page = feed_cache.get_page('index', request, sharding.feed(
+        Post.objects.select_related('author', 'group')))
+    fragments.attach_cards(page.object_list, request)
     return render(request, 'index.html', {'page': page})
 
 
+@conditional(feed_etag, feed_last_modified)
 def group_posts(request, slug):
     """"Представление страницы сообщества"""
-    group = get_object_or_404(Group, slug=slug)
-    paginator = Paginator(
-        Post.objects.filter(group=group).order_by('-pub_date'), 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    group = groups.get_or_404(slug)
+    posts = sharding.feed(Post.objects.filter(
+        group=group).select_related('author', 'group'))
+    page = feed_cache.get_page(f'group:{group.pk}', request, posts)
+    fragments.attach_cards(page.object_list, request)
     return render(request, "group.html", {
         "group": group, "page": page})
 
 
+def search(request):
+    """"Представление страницы поиска по постам"""
+    query = request.GET.get('q', '').strip()
+    page = search_posts(
+        Post.objects.select_related('author', 'group'),
+        query, request.GET.get('cursor'))
+    fragments.attach_cards(page.object_list, request)
+    return render(request, 'search.html', {'query': query, 'page': page})
+
+
 @login_required
 def new_post(request):
     """Представление формы новой записи"""
@@ -42,40 +77,44 @@ def new_post(request):
     if request.method == 'POST':
         form = PostForm(request.POST, files=request.FILES or None)
         if form.is_valid():
-            post = form.save(commit=False)
-            post.author = request.user
-            form.save()
+            save_form(form, author=request.user)
             return redirect("index")
     return render(request, "post_new.html", {
         'form': form, "post": None})
 
 
+@conditional(feed_etag, feed_last_modified)
 def profile(request, username):
     """"Представление страницы профайла"""
-    user = get_object_or_404(User, username=username)
-    posts = Post.objects.filter(author=user)
-    paginator = Paginator(posts.order_by('-pub_date'), 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    number_of_posts = posts.count()
-    following = Follow.objects.filter(
-        user=request.user,
-        author=user).exists() if request.user.is_authenticated else False
+    user = users.get_or_404(username)
+    # автор берется из кеша, счетчики боковой панели - одним запросом
+    stats = AuthorStats.objects.filter(author=user).first() \
+        or AuthorStats(author=user)
+    page = feed_cache.get_page(
+        f'profile:{user.pk}', request,
+        Post.objects.for_author(user).select_related('author', 'group'),
+        count=lambda: stats.post_count)
+    fragments.attach_cards(page.object_list, request)
     context = {
         'author': user,
-        'number_of_posts': number_of_posts,
+        'number_of_posts': stats.post_count,
+        'stats': stats,
         'page': page,
-        'following': following,
+        'following': following.is_following(request.user, user.pk),
         'profile': user
     }
     return render(request, 'profile.html', context)
 
 
+@conditional(post_etag, post_last_modified)
 def post_view(request, username, post_id):
     """"Представление страницы отдельного поста"""
-    post = get_object_or_404(Post, pk=post_id, author__username=username)
+    author = users.get_or_404(username)
+    post = get_object_or_404(
+        Post.objects.for_author(author).select_related('group'), pk=post_id)
+    post.author = author
     form = CommentForm(request.POST or None)
-    comments = post.comments.select_related('author').all()
+    comments = sharding.shard_safe(post.comments.select_related('author'))
     context = {
         'form': form,
         'post': post,
@@ -88,8 +127,8 @@ def post_view(request, username, post_id):
 @login_required
 def post_edit(request, username, post_id):
     """"Представление страницы редактирования поста"""
-    profile = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post, pk=post_id, author=profile)
+    profile = users.get_or_404(username)
+    post = get_object_or_404(Post.objects.for_author(profile), pk=post_id)
     if request.user != profile:
         return redirect('post', username=username, post_id=post_id)
     # добавим в form свойство files
@@ -99,7 +138,7 @@ def post_edit(request, username, post_id):
         instance=post)
     if request.method == 'POST':
         if form.is_valid():
-            form.save()
+            save_form(form)
             return redirect(
                 "post",
                 username=request.user.username,
@@ -127,40 +166,54 @@ def server_error(request):
 @login_required
 def add_comment(request, username, post_id):
     """"Функция для сохранения комментарий"""
-    post = get_object_or_404(Post, pk=post_id, author__username=username)
+    author = users.get_or_404(username)
+    post = get_object_or_404(Post.objects.for_author(author), pk=post_id)
     form = CommentForm(request.POST or None, )
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = post
-        comment.save()
+        save_form(form, author=request.user, post=post)
     return redirect('post', username=username, post_id=post_id)
 
 
 @login_required
+@conditional(feed_etag, feed_last_modified)
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list.order_by('-pub_date'), 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    """"Представление ленты подписок"""
+    author_ids = following.following_ids(request.user)
+    if sharding.enabled():
+        # посты авторов собираются со всех их шардов
+        page = paginate(request, sharding.authors_feed(
+            Post.objects.select_related('author', 'group'), author_ids))
+    else:
+        # лента заранее разложена по подписчикам в TimelineEntry, поэтому
+        # страница - это один диапазон индекса (user, pub_date, post)
+        entries = TimelineEntry.objects.filter(
+            user=request.user).select_related('post__author', 'post__group')
+        if not author_ids:
+            # без подписок лента пуста, запросы к базе не нужны
+            entries = entries.none()
+        page = paginate(request, entries, key=('pub_date', 'post_id'))
+        page.object_list = [entry.post for entry in page.object_list]
+    fragments.attach_cards(page.object_list, request)
     context = {
         "page": page,
-        'paginator': paginator
+        'paginator': page.paginator
     }
     return render(request, "follow.html", context)
 
 
 @login_required
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = users.get_or_404(username)
     if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        retry_on_locked(Follow.objects.get_or_create)(
+            user=request.user, author=author)
     return redirect("profile", username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
+    author = users.get_or_404(username)
     if author != request.user:
-        Follow.objects.filter(user=request.user, author=author).delete()
+        retry_on_locked(Follow.objects.filter(
+            user=request.user, author=author).delete)()
     return redirect("profile", username=username)
@@ -1,5 +1,7 @@
+from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model
+from django.urls import Resolver404, resolve, reverse
 
 
 User = get_user_model()
@@ -13,3 +15,19 @@ class CreationForm(UserCreationForm):
         model = User
         # укажем, какие поля должны быть видны в форме и в каком порядке
         fields = ("first_name", "last_name", "username", "email")
+
+    def clean_username(self):
+        # имена вроде search или new совпадают с адресами других
+        # страниц, и профиль такого пользователя был бы недоступен
+        username = self.cleaned_data['username']
+        for name, args in (('profile', [username]),
+                           ('post', [username, 1]),
+                           ('profile_follow', [username])):
+            try:
+                match = resolve(reverse(name, args=args))
+            except Resolver404:
+                match = None
+            if match is None or match.url_name != name:
+                raise forms.ValidationError(
+                    'Это имя занято адресом страницы сайта.')
+        return username
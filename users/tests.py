@@ -0,0 +1,22 @@
+from django.test import TestCase
+
+from users.forms import CreationForm
+
+
+class CreationFormTests(TestCase):
+    def form(self, username):
+        return CreationForm({
+            'username': username,
+            'password1': 'Yatube-password-1',
+            'password2': 'Yatube-password-1',
+        })
+
+    def test_page_addresses_reserved(self):
+        """Имена, совпадающие с адресами страниц, недоступны: профиль
+        такого пользователя не открылся бы"""
+        for username in ('search', 'new', 'follow', 'group', 'admin'):
+            with self.subTest(username=username):
+                self.assertIn('username', self.form(username).errors)
+
+    def test_regular_username(self):
+        self.assertTrue(self.form('searcher').is_valid())
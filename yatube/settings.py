@@ -43,6 +43,9 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'posts.replicas.ReplicaMiddleware',
+    'posts.query_budget.QueryBudgetMiddleware',
+    'posts.page_cache.PageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -52,8 +55,11 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -65,6 +71,20 @@ TEMPLATES = [
     },
 ]
 
+# В продакшене шаблоны компилируются один раз на процесс: карточки
+# постов и их include не читаются и не разбираются заново на каждой
+# странице. При разработке правки шаблонов видны без перезапуска.
+if not DEBUG or os.environ.get('YATUBE_CACHED_TEMPLATES'):
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('posts.template_cache.Loader',
+         TEMPLATES[0]['OPTIONS']['loaders']),
+    ]
+# Скомпилированные шаблоны для быстрого старта процессов, создается
+# командой warm_templates при деплое
+TEMPLATE_CACHE_FILE = os.environ.get(
+    'YATUBE_TEMPLATE_CACHE',
+    os.path.join(BASE_DIR, 'compiled_templates.pickle'))
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
@@ -78,6 +98,45 @@ DATABASES = {
     }
 }
 
+DATABASE_ROUTERS = []
+
+# Реплика для чтения лент и постов (posts.replicas) включается переменной
+# окружения YATUBE_READ_REPLICA с путем к файлу копии. Копию обновляет
+# manage.py snapshot_replica --interval; интервал должен быть меньше
+# REPLICA_STICKY_SECONDS, а кеш - общим (YATUBE_SHARED_CACHE), чтобы
+# смена поколений после копирования дошла до всех процессов.
+if os.environ.get('YATUBE_READ_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['YATUBE_READ_REPLICA'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS.append('posts.replicas.ReplicaRouter')
+
+# Сколько секунд после записи пользователь читает из основной базы
+REPLICA_STICKY_SECONDS = 10
+
+# Шардирование постов и комментариев по автору (posts.sharding):
+# основная база - шард 0, файлы остальных шардов перечисляются через
+# запятую в переменной окружения YATUBE_POST_SHARDS. Таблицы шардов
+# создает migrate --database shard_N, посты по шардам раскладывает
+# manage.py rebalance_shards.
+POST_SHARDS = ['default']
+if os.environ.get('YATUBE_POST_SHARDS'):
+    for number, path in enumerate(
+            os.environ['YATUBE_POST_SHARDS'].split(','), 1):
+        DATABASES[f'shard_{number}'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path,
+            # пользователи и группы, на которые ссылаются посты, - в
+            # основной базе
+            'PRAGMAS': {'foreign_keys': 'OFF'},
+        }
+        POST_SHARDS.append(f'shard_{number}')
+    DATABASE_ROUTERS.insert(0, 'posts.sharding.ShardRouter')
+# Потоки для параллельных запросов лент к шардам
+SHARD_QUERY_WORKERS = 8
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -138,5 +197,67 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    # KV-хранилище миниатюр sorl (posts.thumbnails.CacheKVStore): общий
+    # для процессов файл без вытеснения записей
+    'thumbnails': {
+        'BACKEND': 'yatube.sqlite_cache.SQLiteCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_THUMBNAIL_CACHE',
+            os.path.join(BASE_DIR, 'thumbnails.sqlite3')),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': None},
+    },
 }
+
+# Общий для всех рабочих процессов кеш в файле SQLite (yatube.sqlite_cache)
+# включается переменной окружения YATUBE_SHARED_CACHE с путем к файлу.
+# Без нее у каждого процесса свой LocMemCache.
+if os.environ.get('YATUBE_SHARED_CACHE'):
+    CACHES['default'] = {
+        'BACKEND': 'yatube.sqlite_cache.SQLiteCache',
+        'LOCATION': os.environ['YATUBE_SHARED_CACHE'],
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
+    }
+
+# Время жизни страниц лент в кеше. Устаревание отслеживается поколением
+# данных (posts.feed_cache), поэтому срок может быть большим.
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Пагинация лент по курсору (pub_date, id) вместо LIMIT/OFFSET.
+# Параметр ?page= продолжает работать в любом режиме.
+POSTS_CURSOR_PAGINATION = False
+
+# Время жизни HTML карточек постов (posts.fragments). Ключ содержит версию
+# содержимого поста, поэтому измененный пост получает новую карточку.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+# Срок свежести страниц в кеше целых страниц (posts.page_cache). Посты,
+# комментарии и подписки сбрасывают страницы сразу, срок ограничивает
+# задержку для остальных изменений, например названия группы.
+PAGE_CACHE_TIMEOUT = 60 * 5
+
+# Кеш групп по slug и пользователей по username (posts.natural_keys):
+# найденные объекты сбрасываются сигналами, отсутствующие хранятся
+# недолго.
+NATURAL_KEY_CACHE_TIMEOUT = 60 * 60
+NATURAL_KEY_MISSING_TIMEOUT = 30
+
+# Время жизни набора подписок пользователя (posts.following). Набор
+# сбрасывается при каждой подписке и отписке.
+FOLLOWING_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Фоновое создание миниатюр постов (posts.thumbnails): число потоков
+# и максимальная длина очереди.
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_QUEUE_SIZE = 100
+THUMBNAIL_KVSTORE = 'posts.thumbnails.CacheKVStore'
+THUMBNAIL_CACHE = 'thumbnails'
+
+# Подсчет SQL-запросов представлений и проверка бюджетов из
+# posts/query_budgets.py. В строгом режиме превышение бюджета - ошибка.
+QUERY_BUDGET_ENABLED = False
+QUERY_BUDGET_STRICT = False
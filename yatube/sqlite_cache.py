@@ -0,0 +1,325 @@
+"""Кеш Django в файле SQLite, общий для всех процессов на одной машине.
+
+В отличие от LocMemCache данные и инвалидация видны всем рабочим
+процессам gunicorn, а память не растет с их числом. Размер ограничен
+числом записей (MAX_ENTRIES) и объемом значений в байтах (MAX_SIZE):
+при превышении сначала удаляются просроченные записи, затем давно не
+читанные (LRU)."""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# сколько обращений копить в процессе перед записью счетчиков в файл
+STATS_FLUSH_EVERY = 100
+# время последнего чтения обновляется не чаще раза в столько секунд:
+# LRU остается приблизительным, зато чтение почти всегда без записи
+ACCESS_RESOLUTION = 1.0
+# при вытеснении кеш ужимается до этой доли от предела
+LOW_WATER = 0.9
+# ограничение SQLite на число параметров запроса
+MAX_VARIABLES = 500
+
+STATS = ('hits', 'misses', 'evictions', 'entries', 'bytes')
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires REAL,
+        accessed REAL NOT NULL
+    ) WITHOUT ROWID''',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    '''CREATE TABLE IF NOT EXISTS cache_stats (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    ) WITHOUT ROWID''',
+    'INSERT OR IGNORE INTO cache_stats VALUES ' + ', '.join(
+        f"('{name}', 0)" for name in STATS),
+    # число записей и объем значений поддерживаются триггерами, чтобы
+    # не считать COUNT(*) при каждой записи
+    '''CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+        UPDATE cache_stats SET value = value + 1 WHERE name = 'entries';
+        UPDATE cache_stats SET value = value + length(new.value)
+            WHERE name = 'bytes';
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF value
+    ON cache BEGIN
+        UPDATE cache_stats
+            SET value = value + length(new.value) - length(old.value)
+            WHERE name = 'bytes';
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+        UPDATE cache_stats SET value = value - 1 WHERE name = 'entries';
+        UPDATE cache_stats SET value = value - length(old.value)
+            WHERE name = 'bytes';
+    END''',
+)
+
+_UPSERT = '''
+    INSERT INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)
+    ON CONFLICT (key) DO UPDATE SET
+        value = excluded.value,
+        expires = excluded.expires,
+        accessed = excluded.accessed
+'''
+
+_ALIVE = '(expires IS NULL OR expires > ?)'
+
+
+def _encode(value):
+    # целые числа (счетчики, поколения кеша) хранятся как есть: их видно
+    # в базе и они не требуют pickle при incr
+    if type(value) is int:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _decode(value):
+    if isinstance(value, int):
+        return value
+    return pickle.loads(value)
+
+
+def _chunks(items, size=MAX_VARIABLES):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SQLiteCache(BaseCache):
+    """Бэкенд кеша: LOCATION - путь к файлу базы.
+
+    OPTIONS: MAX_ENTRIES - предел числа записей (как у LocMemCache,
+    None - без предела), MAX_SIZE - предел суммарного размера значений в
+    байтах."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._max_size = options.get('MAX_SIZE')
+        # BaseCache заменяет None пределом по умолчанию
+        self._max_entries = options.get('MAX_ENTRIES', self._max_entries)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._pending = Counter()
+
+    @property
+    def _connection(self):
+        # своя база на поток; после fork соединение открывается заново
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            with self._write(connection):
+                for sql in SCHEMA:
+                    connection.execute(sql)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def _write(self, connection=None):
+        """Транзакция, сразу берущая блокировку записи: чтение и запись
+        внутри нее атомарны относительно других процессов"""
+        connection = connection or self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._pending[name] += amount
+            if sum(self._pending.values()) < STATS_FLUSH_EVERY:
+                return
+            pending, self._pending = self._pending, Counter()
+        self._flush_stats(pending)
+
+    def _flush_stats(self, pending):
+        if not pending:
+            return
+        self._connection.executemany(
+            'UPDATE cache_stats SET value = value + ? WHERE name = ?',
+            [(amount, name) for name, amount in pending.items()])
+
+    def _touch_accessed(self, keys, now):
+        with self._write() as connection:
+            for chunk in _chunks(keys):
+                connection.execute(
+                    'UPDATE cache SET accessed = ? WHERE key IN (%s)'
+                    % ', '.join('?' * len(chunk)), [now, *chunk])
+
+    def _read(self, keys):
+        """Живые значения по ключам базы; обновляет время чтения"""
+        now = time.time()
+        found, stale = {}, []
+        for chunk in _chunks(keys):
+            rows = self._connection.execute(
+                'SELECT key, value, accessed FROM cache '
+                'WHERE key IN (%s) AND %s' % (', '.join('?' * len(chunk)),
+                                              _ALIVE),
+                [*chunk, now])
+            for key, value, accessed in rows:
+                found[key] = value
+                if now - accessed > ACCESS_RESOLUTION:
+                    stale.append(key)
+        if stale:
+            self._touch_accessed(stale, now)
+        self._count('hits', len(found))
+        self._count('misses', len(keys) - len(found))
+        return found
+
+    def _size(self, connection):
+        return dict(connection.execute(
+            "SELECT name, value FROM cache_stats "
+            "WHERE name IN ('entries', 'bytes')"))
+
+    def _excess(self, size, share):
+        """Сколько записей удалить, чтобы уложиться в долю share от
+        пределов; для объема - по среднему размеру записи"""
+        excess = 0
+        if self._max_entries is not None:
+            excess = size['entries'] - int(self._max_entries * share)
+        if self._max_size is not None:
+            extra = size['bytes'] - self._max_size * share
+            if extra > 0:
+                average = size['bytes'] / max(size['entries'], 1)
+                excess = max(excess, int(extra / max(average, 1)) + 1)
+        return excess
+
+    def _evict(self, connection):
+        if self._excess(self._size(connection), 1) <= 0:
+            return
+        evicted = connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', [time.time()]).rowcount
+        while True:
+            size = self._size(connection)
+            excess = self._excess(size, LOW_WATER)
+            if excess <= 0 or not size['entries']:
+                break
+            evicted += connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY accessed LIMIT ?)', [excess]).rowcount
+        if evicted:
+            self._count('evictions', evicted)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        with self._write() as connection:
+            # существующая живая запись не перезаписывается
+            added = connection.execute(
+                _UPSERT + ' WHERE NOT ' + _ALIVE,
+                [key, _encode(value), expires, now, now]).rowcount
+            if added:
+                self._evict(connection)
+        return bool(added)
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        found = self._read([key])
+        return _decode(found[key]) if key in found else default
+
+    def get_many(self, keys, version=None):
+        keys_map = {self._key(key, version): key for key in keys}
+        found = self._read(list(keys_map))
+        return {
+            keys_map[key]: _decode(value) for key, value in found.items()
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        expires = self.get_backend_timeout(timeout)
+        with self._write() as connection:
+            connection.execute(
+                _UPSERT, [key, _encode(value), expires, time.time()])
+            self._evict(connection)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        rows = [
+            (self._key(key, version), _encode(value), expires, now)
+            for key, value in data.items()
+        ]
+        with self._write() as connection:
+            connection.executemany(_UPSERT, rows)
+            self._evict(connection)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as connection:
+            return bool(connection.execute(
+                'UPDATE cache SET expires = ?, accessed = ? '
+                'WHERE key = ? AND ' + _ALIVE,
+                [self.get_backend_timeout(timeout), now, key, now]).rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as connection:
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? AND ' + _ALIVE,
+                [key, now]).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = _decode(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ?, accessed = ? WHERE key = ?',
+                [_encode(value), now, key])
+        return value
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._connection.execute(
+            'SELECT 1 FROM cache WHERE key = ? AND ' + _ALIVE,
+            [key, time.time()]).fetchone() is not None
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        with self._write() as connection:
+            connection.execute('DELETE FROM cache WHERE key = ?', [key])
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        with self._write() as connection:
+            for chunk in _chunks(keys):
+                connection.execute(
+                    'DELETE FROM cache WHERE key IN (%s)'
+                    % ', '.join('?' * len(chunk)), chunk)
+
+    def clear(self):
+        with self._write() as connection:
+            connection.execute('DELETE FROM cache')
+
+    def stats(self):
+        """Счетчики попаданий, промахов и вытеснений всех процессов,
+        число записей и объем значений в байтах"""
+        with self._stats_lock:
+            pending, self._pending = self._pending, Counter()
+        self._flush_stats(pending)
+        return dict(self._connection.execute(
+            'SELECT name, value FROM cache_stats'))
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# шаблоны, скомпилированные командой warm_templates, загружаются при
+# запуске процесса, а не при первом запросе
+from posts import template_cache  # noqa: E402
+
+template_cache.preload()